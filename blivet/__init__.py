@@ -71,29 +71,44 @@ logging.captureWarnings(True)
 # XXX: respect the level? Need to translate between C and Python log levels.
 log_bd_message = lambda level, msg: program_log.info(msg)
 
-import gi
-gi.require_version("GLib", "2.0")
-gi.require_version("BlockDev", "1.0")
-
-# initialize the libblockdev library
-from gi.repository import GLib
-from gi.repository import BlockDev as blockdev
 if arch.isS390():
     _REQUESTED_PLUGIN_NAMES = set(("lvm", "btrfs", "swap", "crypto", "loop", "mdraid", "mpath", "dm", "s390"))
 else:
     _REQUESTED_PLUGIN_NAMES = set(("lvm", "btrfs", "swap", "crypto", "loop", "mdraid", "mpath", "dm"))
 
-_requested_plugins = blockdev.plugin_specs_from_names(_REQUESTED_PLUGIN_NAMES)
-try:
-    succ_, avail_plugs = blockdev.try_reinit(require_plugins=_requested_plugins, reload=False, log_func=log_bd_message)
-except GLib.GError as err:
-    raise RuntimeError("Failed to intialize the libblockdev library: %s" % err)
-else:
-    avail_plugs = set(avail_plugs)
+avail_plugs = None
+missing_plugs = None
+
+def initialize_blockdev():
+    """ Initialize the libblockdev library and load its plugins.
+
+        Loading the plugins is expensive, so it is not done when the blivet
+        package is imported but by the modules that use libblockdev, when they
+        are imported or first need it. Calling this again does nothing.
+    """
+    global avail_plugs
+    global missing_plugs
+
+    if avail_plugs is not None:
+        return
+
+    import gi
+    gi.require_version("GLib", "2.0")
+    gi.require_version("BlockDev", "1.0")
+
+    from gi.repository import GLib
+    from gi.repository import BlockDev as blockdev
+
+    _requested_plugins = blockdev.plugin_specs_from_names(_REQUESTED_PLUGIN_NAMES)
+    try:
+        succ_, plugs = blockdev.try_reinit(require_plugins=_requested_plugins, reload=False, log_func=log_bd_message)
+    except GLib.GError as err:
+        raise RuntimeError("Failed to intialize the libblockdev library: %s" % err)
 
-missing_plugs =  _REQUESTED_PLUGIN_NAMES - avail_plugs
-for p in missing_plugs:
-    log.info("Failed to load plugin %s", p)
+    avail_plugs = set(plugs)
+    missing_plugs = _REQUESTED_PLUGIN_NAMES - avail_plugs
+    for p in missing_plugs:
+        log.info("Failed to load plugin %s", p)
 
 def enable_installer_mode():
     """ Configure the module for use by anaconda (OS installer). """
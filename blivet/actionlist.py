@@ -21,11 +21,17 @@
 #
 
 import copy
+from multiprocessing.pool import ThreadPool
+from threading import Lock
 
+from six.moves import queue
+
+from .callbacks import create_new_callbacks_register
 from .deviceaction import ActionCreateDevice
 from .deviceaction import action_type_from_string, action_object_from_string
 from .devicelibs import lvm
-from .devices import PartitionDevice
+from .devices import LVMLogicalVolumeDevice, PartitionDevice
+from .devices.device import _overridesDependsOn
 from .errors import DiskLabelCommitError, StorageError
 from .flags import flags
 from . import tsort
@@ -38,6 +44,9 @@ class ActionList(object):
         self._actions = []
         self._completed_actions = []
 
+        # actions each sorted action has to wait for, set by sort()
+        self._requirements = {}
+
     def __iter__(self):
         return iter(self._actions)
 
@@ -99,21 +108,110 @@ class ActionList(object):
 
     def prune(self):
         """ Remove redundant/obsolete actions from the action list. """
-        for action in reversed(self._actions[:]):
-            if action not in self._actions:
+        # An action can only obsolete actions on the same device or, when it
+        # destroys a container, actions that add members to that container.
+        # Candidates are looked up by device/container id and checked in the
+        # order of the action list.
+        by_device = {}
+        by_container = {}
+        for (idx, action) in enumerate(self._actions):
+            by_device.setdefault(action.device.id, []).append(idx)
+            if action.isContainer and action.container is not None:
+                by_container.setdefault(action.container.id, []).append(idx)
+
+        pruned = set()
+        for idx in reversed(range(len(self._actions))):
+            action = self._actions[idx]
+            if idx in pruned:
                 log.debug("action %d already pruned", action.id)
                 continue
 
-            for obsolete in self._actions[:]:
+            candidates = set(by_device[action.device.id])
+            candidates.update(by_container.get(action.device.id, []))
+            for obsolete_idx in sorted(candidates - pruned):
+                obsolete = self._actions[obsolete_idx]
+                if obsolete_idx in pruned:
+                    continue
+
                 if action.obsoletes(obsolete):
                     log.info("removing obsolete action %d (%d)",
                              obsolete.id, action.id)
-                    self._actions.remove(obsolete)
+                    pruned.add(obsolete_idx)
 
-                    if obsolete.obsoletes(action) and action in self._actions:
+                    if obsolete.obsoletes(action) and idx not in pruned:
                         log.info("removing mutually-obsolete action %d (%d)",
                                  action.id, obsolete.id)
-                        self._actions.remove(action)
+                        pruned.add(idx)
+
+        self._actions = [a for (idx, a) in enumerate(self._actions)
+                         if idx not in pruned]
+
+    def _candidatePairs(self):
+        """ Return pairs of actions that may depend on each other.
+
+            :returns: pairs of indices into the action list
+            :rtype: set of (int, int) tuples, lower index first
+
+            Apart from the ordering by action type (see
+            :meth:`~.deviceaction.DeviceAction.requires`), which :meth:`sort`
+            handles via ranks, actions can only depend on each other if they
+            act on the same device or on devices that depend on each other,
+            create or destroy partitions on the same disk, create lvs in the
+            same vg or involve the same container.
+
+            Devices whose class extends :meth:`~.devices.Device.dependsOn`
+            (eg: snapshots, which depend on their origin) and the devices on
+            top of them can also depend on devices that are not their
+            ancestors. Those are paired with all actions on devices sharing a
+            parent with them.
+        """
+        by_device = {}
+        by_parent = {}
+        by_disk = {}
+        by_vg = {}
+        by_container = {}
+        for (idx, action) in enumerate(self._actions):
+            by_device.setdefault(action.device.id, []).append(idx)
+            for parent in action.device.parents:
+                by_parent.setdefault(parent.id, []).append(idx)
+
+            if action.isDevice and isinstance(action.device, PartitionDevice):
+                by_disk.setdefault(action.device.disk, []).append(idx)
+
+            if action.isCreate and action.isDevice and \
+               isinstance(action.device, LVMLogicalVolumeDevice):
+                by_vg.setdefault(action.device.vg, []).append(idx)
+
+            containers = set([action.container,
+                              getattr(action.device, "container", None)])
+            for container in containers:
+                if container is not None:
+                    by_container.setdefault(container, []).append(idx)
+
+        pairs = set()
+        def add_pairs(indices, others):
+            for i in indices:
+                pairs.update((min(i, j), max(i, j)) for j in others if j != i)
+
+        for (idx, action) in enumerate(self._actions):
+            for ancestor in action.device.ancestors:
+                add_pairs([idx], by_device.get(ancestor.id, []))
+                if _overridesDependsOn(ancestor):
+                    for parent in ancestor.parents:
+                        add_pairs([idx], by_parent.get(parent.id, []))
+
+        for indices in by_disk.values():
+            add_pairs(indices, indices)
+
+        for indices in by_vg.values():
+            add_pairs([i for i in indices if self._actions[i].device.cached],
+                      indices)
+
+        for indices in by_container.values():
+            add_pairs([i for i in indices if self._actions[i].isContainer],
+                      indices)
+
+        return pairs
 
     def sort(self):
         """ Sort actions based on dependencies. """
@@ -123,27 +221,34 @@ class ActionList(object):
         edges = []
 
         # collect all ordering requirements for the actions
-        for action in self._actions:
-            action_idx = self._actions.index(action)
-            children = []
-            for _action in self._actions:
-                if _action == action:
-                    continue
+        for (i, j) in self._candidatePairs():
+            # create edges based on both action type and dependencies.
+            if self._actions[j].requires(self._actions[i]):
+                edges.append((i, j))
 
-                # create edges based on both action type and dependencies.
-                if _action.requires(action):
-                    children.append(_action)
+            if self._actions[i].requires(self._actions[j]):
+                edges.append((j, i))
 
-            for child in children:
-                child_idx = self._actions.index(child)
-                edges.append((action_idx, child_idx))
+        edges.sort()
+
+        # all non-container actions require all actions of higher type
+        ranks = dict((idx, action.type)
+                     for (idx, action) in enumerate(self._actions)
+                     if not action.isContainer)
 
         # create a graph reflecting the ordering information we have
-        graph = tsort.create_graph(list(range(len(self._actions))), edges)
+        graph = tsort.create_graph(list(range(len(self._actions))), edges,
+                                   ranks=ranks)
 
         # perform a topological sort based on the graph's contents
         order = tsort.tsort(graph)
 
+        # keep the explicit ordering requirements for concurrent execution
+        self._requirements = dict((a, []) for a in self._actions)
+        for (parent, children) in graph['outgoing'].items():
+            for child in children:
+                self._requirements[self._actions[child]].append(self._actions[parent])
+
         # now replace self._actions with a sorted version of the same list
         actions = []
         for idx in order:
@@ -261,6 +366,216 @@ class ActionList(object):
         devices = [a.name for a in active if any(d in disks for d in a.disks)]
         return devices
 
+    @staticmethod
+    def _actionDisk(action):
+        """ Return the disk whose partition table an action may change.
+
+            :param action: an action
+            :type action: :class:`~.deviceaction.DeviceAction`
+            :returns: the disk or None
+            :rtype: :class:`~.devices.StorageDevice` or NoneType
+        """
+        if isinstance(action.device, PartitionDevice):
+            return action.device.disk
+
+        if action.device.partitioned or \
+           (action.isFormat and action.format.type == "disklabel"):
+            return action.device
+
+        return None
+
+    def _teardownDiskUsers(self, action, devices=None):
+        """ Tear down the devices using the disk an action failed to commit.
+
+            It's likely that a previous action triggered setup of an lvm or
+            md device. Devices no longer in the tree due to pending removal
+            are included.
+        """
+        devs = (devices or []) + [a.device for a in self._actions]
+        for dep in set(devs):
+            if dep.exists and dep.dependsOn(action.device.disk):
+                dep.teardown(recursive=True)
+
+    def _executeAction(self, action, callbacks=None, devices=None):
+        """ Execute an action, retrying after a failed disklabel commit. """
+        log.info("executing action: %s", action)
+        try:
+            action.execute(callbacks)
+        except DiskLabelCommitError:
+            self._teardownDiskUsers(action, devices)
+            action.execute(callbacks)
+
+    def _updatePartitionNames(self, devices=None, disk=None):
+        """ Update the names of partitions after parted renumbered them.
+
+            :keyword devices: a list of all devices current in the devicetree
+            :keyword disk: only update the partitions on this disk
+        """
+        for device in (devices or []):
+            # make sure we catch any renumbering parted does
+            if device.exists and isinstance(device, PartitionDevice) and \
+               (disk is None or device.disk == disk):
+                device.updateName()
+                device.format.device = device.path
+
+    def _concurrentRequirements(self):
+        """ Return the actions each sorted action has to wait for when run
+            concurrently.
+
+            :returns: a dict mapping each action to the actions it requires
+            :rtype: dict
+
+            Actions are only known to be independent if their devices sit on
+            different disks, so on top of the requirements found by
+            :meth:`sort` each action waits for the preceding actions on any
+            of its device's disks. Actions on devices without disks wait for
+            all preceding actions and are waited for by all following ones.
+        """
+        requirements = dict((a, set(r)) for (a, r) in self._requirements.items())
+        last = {}
+        barrier = None
+        since_barrier = []
+        for action in self._actions:
+            required = requirements.setdefault(action, set())
+            if barrier is not None:
+                required.add(barrier)
+
+            disks = action.device.disks
+            if not disks:
+                required.update(since_barrier)
+                barrier = action
+                since_barrier = []
+                last = {}
+                continue
+
+            for disk in disks:
+                if disk in last:
+                    required.add(last[disk])
+                last[disk] = action
+
+            since_barrier.append(action)
+
+        return requirements
+
+    def _processConcurrently(self, callbacks=None, devices=None):
+        """ Execute the sorted actions using a pool of worker threads.
+
+            :param callbacks: callbacks to be invoked when actions are executed
+            :param devices: a list of all devices current in the devicetree
+
+            An action is started once all actions it requires (see
+            :meth:`_concurrentRequirements`) are done. As in the sorted order,
+            non-container actions also wait for all non-container actions of
+            higher type. Callbacks are invoked one at a time.
+
+            An action whose disklabel commit fails is retried once all other
+            running actions are done and no new ones are started until then,
+            since the devices torn down for the retry may be used by them.
+        """
+        if callbacks is not None:
+            callback_lock = Lock()
+            def serialized(func):
+                if func is None:
+                    return None
+
+                def run(data):
+                    with callback_lock:
+                        return func(data)
+                return run
+
+            callbacks = create_new_callbacks_register(
+                **dict((f, serialized(getattr(callbacks, f)))
+                       for f in callbacks._fields))
+
+        def run(action, retry=False):
+            try:
+                if retry:
+                    self._teardownDiskUsers(action, devices)
+
+                log.info("executing action: %s", action)
+                action.execute(callbacks)
+                disk = self._actionDisk(action)
+                if disk is not None:
+                    self._updatePartitionNames(devices, disk=disk)
+            except Exception as e: # pylint: disable=broad-except
+                return (action, e)
+
+            return (action, None)
+
+        requirements = self._concurrentRequirements()
+        position = dict((a, idx) for (idx, a) in enumerate(self._actions))
+        blockers = dict((a, len(requirements[a])) for a in self._actions)
+        dependents = dict((a, []) for a in self._actions)
+        for (action, required) in requirements.items():
+            for other in required:
+                dependents[other].append(action)
+
+        # non-container actions of each type that have not finished yet
+        remaining = {}
+        for action in self._actions:
+            if not action.isContainer:
+                remaining[action.type] = remaining.get(action.type, 0) + 1
+
+        def blocked(action):
+            return (not action.isContainer and
+                    any(n for (t, n) in remaining.items() if t > action.type))
+
+        ready = [a for a in self._actions if blockers[a] == 0]
+        done = queue.Queue()
+        running = 0
+        error = None
+        retry = []
+        retried = set()
+        pool = ThreadPool(min(flags.action_workers, len(self._actions)))
+        try:
+            while ready or running or retry:
+                if error is None and not retry:
+                    waiting = []
+                    for action in sorted(ready, key=position.get):
+                        if blocked(action):
+                            waiting.append(action)
+                        else:
+                            pool.apply_async(run, (action,), callback=done.put)
+                            running += 1
+                    ready = waiting
+
+                if not running:
+                    if error is not None or not retry:
+                        break
+
+                    # nothing else is running, so the retry can safely tear
+                    # down the devices using the disk
+                    action = retry.pop(0)
+                    retried.add(action)
+                    done.put(run(action, retry=True))
+                    running += 1
+
+                (action, e) = done.get()
+                running -= 1
+                if isinstance(e, DiskLabelCommitError) and action not in retried:
+                    retry.append(action)
+                    continue
+
+                if e is not None:
+                    error = error or e
+                    continue
+
+                self._actions.remove(action)
+                self._completed_actions.append(action)
+                if not action.isContainer:
+                    remaining[action.type] -= 1
+
+                for other in dependents[action]:
+                    blockers[other] -= 1
+                    if blockers[other] == 0:
+                        ready.append(other)
+        finally:
+            pool.close()
+            pool.join()
+
+        if error is not None:
+            raise error
+
     def process(self, callbacks=None, devices=None, dryRun=None):
         """
         Execute all registered actions.
@@ -269,32 +584,23 @@ class ActionList(object):
         :param devices: a list of all devices current in the devicetree
         :type callbacks: :class:`~.callbacks.DoItCallbacks`
 
+        Independent actions are executed concurrently if
+        :attr:`~.flags.Flags.action_workers` allows more than one thread.
         """
         devices = devices or []
         self._preProcess(devices=devices)
 
-        for action in self._actions[:]:
-            log.info("executing action: %s", action)
-            if not dryRun:
-                try:
-                    action.execute(callbacks)
-                except DiskLabelCommitError:
-                    # it's likely that a previous action
-                    # triggered setup of an lvm or md device.
-                    # include deps no longer in the tree due to pending removal
-                    devs = devices + [a.device for a in self._actions]
-                    for dep in set(devs):
-                        if dep.exists and dep.dependsOn(action.device.disk):
-                            dep.teardown(recursive=True)
-
-                    action.execute(callbacks)
-
-                for device in devices:
-                    # make sure we catch any renumbering parted does
-                    if device.exists and isinstance(device, PartitionDevice):
-                        device.updateName()
-                        device.format.device = device.path
+        if not dryRun and flags.action_workers > 1 and len(self._actions) > 1:
+            self._processConcurrently(callbacks=callbacks, devices=devices)
+            self._postProcess(devices=devices)
+            return
 
+        for action in self._actions[:]:
+            if dryRun:
+                log.info("executing action: %s", action)
+            else:
+                self._executeAction(action, callbacks, devices)
+                self._updatePartitionNames(devices)
                 self._completed_actions.append(self._actions.pop(0))
 
         self._postProcess(devices=devices)
@@ -25,7 +25,6 @@ import re
 import shelve
 import contextlib
 import time
-import parted
 import functools
 
 
@@ -48,9 +47,6 @@ from .platform import platform as _platform
 from .formats import getFormat
 from .osinstall import FSSet, findExistingInstallations
 from . import arch
-from . import iscsi
-from . import fcoe
-from . import zfcp
 from . import devicefactory
 from . import get_bootloader, getSysroot, shortProductName, __version__
 from .util import open  # pylint: disable=redefined-builtin
@@ -131,21 +127,20 @@ class Blivet(object):
 
         self.__luksDevs = {}
         self.size_sets = []
+
+        # (device tree revision, getFreeSpace results computed at it)
+        self._freeSpaceCache = (None, {})
         self.setDefaultFSType(get_default_filesystem_type())
         self._defaultBootFSType = None
 
-        self.iscsi = iscsi.iscsi()
-        self.fcoe = fcoe.fcoe()
-        self.zfcp = zfcp.ZFCP()
-
         self._nextID = 0
         self._dumpFile = "%s/storage.state" % tempfile.gettempdir()
 
-        # these will both be empty until our reset method gets called
+        # these will both be empty until our reset method gets called; the
+        # iscsi control object is only handed to the tree then
         self.devicetree = DeviceTree(conf=self.config,
                                      passphrase=self.encryptionPassphrase,
                                      luksDict=self.__luksDevs,
-                                     iscsi=self.iscsi,
                                      dasd=self.dasd)
         self.fsset = FSSet(self.devicetree)
         self.roots = []
@@ -165,6 +160,8 @@ class Blivet(object):
         if not flags.installer_mode:
             return
 
+        import parted
+
         # now set the boot partition's flag
         if self.bootloader and not self.bootloader.skip_bootloader:
             if self.bootloader.stage2_bootable:
@@ -221,6 +218,25 @@ class Blivet(object):
         if flags.installer_mode:
             self.dumpState("final")
 
+    # the iscsi, fcoe and zfcp modules are only imported once they are needed
+    @property
+    def iscsi(self):
+        """ The iSCSI control object. """
+        from . import iscsi
+        return iscsi.iscsi()
+
+    @property
+    def fcoe(self):
+        """ The FCoE control object. """
+        from . import fcoe
+        return fcoe.fcoe()
+
+    @property
+    def zfcp(self):
+        """ The zFCP control object. """
+        from . import zfcp
+        return zfcp.ZFCP()
+
     @property
     def nextID(self):
         """ Used for creating unique placeholder names. """
@@ -518,6 +534,8 @@ class Blivet(object):
             :returns: whether or not clearPartitions should remove this device
             :rtype: bool
         """
+        import parted
+
         clearPartType = kwargs.get("clearPartType", self.config.clearPartType)
         clearPartDisks = kwargs.get("clearPartDisks",
                                     self.config.clearPartDisks)
@@ -720,6 +738,13 @@ class Blivet(object):
 
                 The free space values are :class:`~.size.Size` instances.
 
+            .. note::
+
+                Filesystems on inactive devices whose size is not known yet
+                have no free space. Use
+                :meth:`~.devicetree.DeviceTree.prefetchSizeInfo` to gather
+                their size first.
+
         """
         if disks is None:
             disks = self.disks
@@ -727,37 +752,55 @@ class Blivet(object):
         if clearPartType is None:
             clearPartType = self.config.clearPartType
 
-        free = {}
-        for disk in disks:
-            should_clear = self.shouldClear(disk, clearPartType=clearPartType,
-                                            clearPartDisks=[disk.name])
-            if should_clear:
-                free[disk.name] = (disk.size, Size(0))
-                continue
-
-            disk_free = Size(0)
-            fs_free = Size(0)
-            if disk.partitioned:
-                disk_free = disk.format.free
-                for partition in [p for p in self.partitions if p.disk == disk]:
-                    # only check actual filesystems since lvm &c require a bunch of
-                    # operations to translate free filesystem space into free disk
-                    # space
-                    should_clear = self.shouldClear(partition,
-                                                    clearPartType=clearPartType,
-                                                    clearPartDisks=[disk.name])
-                    if should_clear:
-                        disk_free += partition.size
-                    elif hasattr(partition.format, "free"):
-                        fs_free += partition.format.free
-            elif hasattr(disk.format, "free"):
-                fs_free = disk.format.free
-            elif disk.format.type is None:
-                disk_free = disk.size
-
-            free[disk.name] = (disk_free, fs_free)
+        # the result only changes with the devices, the filesystems whose
+        # size is known and the clearpart settings
+        key = (tuple(d.id for d in disks), clearPartType,
+               tuple(self.config.clearPartDisks or []),
+               tuple(self.config.clearPartDevices or []),
+               self.config.clearNonExistent, self.config.initializeDisks,
+               tuple(d.id for d in self.devicetree.devices
+                     if getattr(d.format, "sizeInfoPending", False)))
+        (revision, cache) = self._freeSpaceCache
+        if revision != self.devicetree.revision:
+            cache = {}
+            self._freeSpaceCache = (self.devicetree.revision, cache)
+        elif key in cache:
+            return dict(cache[key])
+
+        # this only reports what is known, devices are not set up for it
+        with self.devicetree.noSizeInfoSetup():
+            free = {}
+            for disk in disks:
+                should_clear = self.shouldClear(disk, clearPartType=clearPartType,
+                                                clearPartDisks=[disk.name])
+                if should_clear:
+                    free[disk.name] = (disk.size, Size(0))
+                    continue
 
-        return free
+                disk_free = Size(0)
+                fs_free = Size(0)
+                if disk.partitioned:
+                    disk_free = disk.format.free
+                    for partition in self.devicetree.getPartitionsByDisk(disk):
+                        # only check actual filesystems since lvm &c require a bunch of
+                        # operations to translate free filesystem space into free disk
+                        # space
+                        should_clear = self.shouldClear(partition,
+                                                        clearPartType=clearPartType,
+                                                        clearPartDisks=[disk.name])
+                        if should_clear:
+                            disk_free += partition.size
+                        elif hasattr(partition.format, "free"):
+                            fs_free += partition.format.free
+                elif hasattr(disk.format, "free"):
+                    fs_free = disk.format.free
+                elif disk.format.type is None:
+                    disk_free = disk.size
+
+                free[disk.name] = (disk_free, fs_free)
+
+        cache[key] = free
+        return dict(free)
 
     @property
     def names(self):
@@ -1143,6 +1186,8 @@ class Blivet(object):
         if device.protected:
             raise ValueError("cannot modify protected device")
 
+        self.devicetree.prefetchSizeInfo([device])
+
         classes = []
         if device.resizable:
             classes.append(ActionResizeDevice)
@@ -1334,23 +1379,24 @@ class Blivet(object):
         mountpoints = ["/", "/usr"]
         free = Size(0)
         btrfs_volumes = []
-        for mountpoint in mountpoints:
-            device = self.mountpoints.get(mountpoint)
-            if not device:
-                continue
-
-            # don't count the size of btrfs volumes repeatedly when multiple
-            # subvolumes are present
-            if isinstance(device, BTRFSSubVolumeDevice):
-                if device.volume in btrfs_volumes:
+        with self.devicetree.noSizeInfoSetup():
+            for mountpoint in mountpoints:
+                device = self.mountpoints.get(mountpoint)
+                if not device:
                     continue
-                else:
-                    btrfs_volumes.append(device.volume)
 
-            if device.format.exists:
-                free += device.format.free
-            else:
-                free += device.format.freeSpaceEstimate(device.size)
+                # don't count the size of btrfs volumes repeatedly when multiple
+                # subvolumes are present
+                if isinstance(device, BTRFSSubVolumeDevice):
+                    if device.volume in btrfs_volumes:
+                        continue
+                    else:
+                        btrfs_volumes.append(device.volume)
+
+                if device.format.exists:
+                    free += device.format.free
+                else:
+                    free += device.format.freeSpaceEstimate(device.size)
 
         return free
 
@@ -1722,6 +1768,30 @@ class Blivet(object):
         log.debug("finished Blivet copy")
         return new
 
+    def snapshot(self):
+        """ Save the current state of the device tree and the installations.
+
+            :returns: a snapshot to pass to :meth:`restore`
+            :rtype: :class:`~.util.StateSnapshot`
+
+            This is a cheap alternative to :meth:`copy` for rolling back
+            changes to the devices. See :meth:`.DeviceTree.snapshot`.
+        """
+        snapshot = self.devicetree.snapshot()
+        snapshot.save(self, attrs=("roots",))
+        for root in self.roots:
+            snapshot.save(root, recursive=True)
+
+        return snapshot
+
+    def restore(self, snapshot):
+        """ Restore the state saved in a snapshot.
+
+            :param snapshot: a snapshot returned by :meth:`snapshot`
+            :type snapshot: :class:`~.util.StateSnapshot`
+        """
+        self.devicetree.restore(snapshot)
+
     def updateKSData(self):
         """ Update ksdata to reflect the settings of this Blivet instance. """
         if not self.ksdata or not self.mountpoints:
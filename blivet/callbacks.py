@@ -24,6 +24,7 @@ arguments.
 
 """
 
+import weakref
 from collections import namedtuple
 
 # A private namedtuple class with self-descriptive fields for passing callbacks
@@ -78,3 +79,47 @@ WaitForEntropyData = namedtuple("WaitForEntropyData",
                                 ["msg", "min_entropy"])
 ReportProgressData = namedtuple("ReportProgressData",
                                  ["msg"])
+
+class CallbackList(object):
+    """
+    A list of callbacks that are all run, in order of registration, with the
+    same arguments. Only bound methods can be registered and their owners are
+    only weakly referenced, so registering a callback does not keep its owner
+    alive.
+
+    """
+
+    def __init__(self):
+        self._cb_list = []
+
+    def add(self, cb):
+        """ Register a bound method as a callback. """
+        self._cb_list.append((weakref.ref(cb.__self__), cb.__func__))
+
+    def remove(self, cb):
+        """ Unregister a previously registered callback. """
+        self._cb_list = [(ref, func) for (ref, func) in self._cb_list
+                         if not (ref() is cb.__self__ and func is cb.__func__)]
+
+    def __call__(self, *args, **kwargs):
+        dead = False
+        for (ref, func) in self._cb_list:
+            obj = ref()
+            if obj is None:
+                dead = True
+                continue
+
+            func(obj, *args, **kwargs)
+
+        if dead:
+            self._cb_list = [(ref, func) for (ref, func) in self._cb_list
+                             if ref() is not None]
+
+# Run with the changed object (a device or a format) and the name of the
+# changed attribute whenever an attribute other objects index devices by
+# (eg: name, uuid, label, kids) changes.
+attribute_changed = CallbackList()
+
+# Run with a filesystem whose size information is needed while its device
+# node does not exist, so that the owner of the device can set it up.
+size_info_needed = CallbackList()
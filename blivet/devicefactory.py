@@ -336,10 +336,7 @@ class DeviceFactory(object):
         self.min_luks_entropy = min_luks_entropy
 
         # used for error recovery
-        self.__devices = []
-        self.__actions = []
-        self.__names = []
-        self.__roots = []
+        self.__snapshot = None
 
     @property
     def raid_level(self):
@@ -873,17 +870,10 @@ class DeviceFactory(object):
     # methods for error recovery
     #
     def _save_devicetree(self):
-        _blivet_copy = self.storage.copy()
-        self.__devices = _blivet_copy.devicetree._devices
-        self.__actions = _blivet_copy.devicetree._actions
-        self.__names = _blivet_copy.devicetree.names
-        self.__roots = _blivet_copy.roots
+        self.__snapshot = self.storage.snapshot()
 
     def _revert_devicetree(self):
-        self.storage.devicetree._devices = self.__devices
-        self.storage.devicetree._actions = self.__actions
-        self.storage.devicetree.names = self.__names
-        self.storage.roots = self.__roots
+        self.storage.restore(self.__snapshot)
 
 class PartitionFactory(DeviceFactory):
     """ Factory class for creating a partition. """
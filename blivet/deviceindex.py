@@ -0,0 +1,364 @@
+# deviceindex.py
+# Hash indexes for device lookups in the device tree.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+from threading import RLock
+
+from . import callbacks
+from . import util
+from .devices import BTRFSDevice
+
+def _deviceKeys(device, attr):
+    """ Return the keys a device should be indexed under for an attribute.
+
+        :param device: the device
+        :type device: :class:`~.devices.Device`
+        :param str attr: the indexed attribute
+        :returns: the non-empty values of the attribute
+        :rtype: tuple
+    """
+    fmt = getattr(device, "format", None)
+    if attr == "uuid":
+        # a device can be found by either its own or its format's UUID
+        keys = (getattr(device, "uuid", None), getattr(fmt, "uuid", None))
+    elif attr == "label":
+        keys = (getattr(fmt, "label", None),)
+    else:
+        keys = (getattr(device, attr, None),)
+
+    return tuple(k for k in keys if k)
+
+def _viewKeys(device, attr):
+    """ Return the keys a device appears under in a view of an attribute.
+
+        This is :func:`_deviceKeys` except that btrfs member devices do not
+        appear in the view of labels, only the btrfs volume does.
+    """
+    if attr == "label" and getattr(device.format, "type", None) == "btrfs" and \
+       not isinstance(device, BTRFSDevice):
+        return ()
+
+    return _deviceKeys(device, attr)
+
+class DeviceIndex(object):
+    """ Hash indexes over the visible and hidden devices of a device tree.
+
+        The index maps device names, paths, sysfs paths, UUIDs (both device
+        and format), format labels and device ids to the devices carrying
+        them, so that lookups do not have to walk the whole device list.
+
+        Devices and formats report changes to indexed attributes via
+        :data:`~.callbacks.attribute_changed`. Changed devices are reindexed
+        lazily, right before the next lookup. Since several attributes
+        (eg: an LV's name and path) are derived from an ancestor's name,
+        renaming a device also reindexes all devices that depend on it.
+
+        Lookups return devices in the order in which the device tree lists
+        them: visible devices first, each group in the order the devices were
+        added.
+
+        The index also maintains the device tree's views of UUIDs and labels
+        (see :meth:`view`) and the set of devices without children, which
+        are the only ones that can be leaves (see :meth:`leaves`).
+
+        Changes can be reported from any thread (eg: by actions executed
+        concurrently), so the index is guarded by a lock.
+    """
+
+    _attrs = ("name", "path", "sysfsPath", "uuid", "label")
+    _viewAttrs = ("uuid", "label")
+
+    def __init__(self):
+        self._devices = {}
+        """ device id -> device """
+
+        self._hidden = set()
+        """ ids of the hidden devices """
+
+        self._positions = {}
+        """ device id -> position in the device tree's lists """
+
+        self._nextPosition = 0
+
+        self._formats = {}
+        """ format id -> device with that format at the time of indexing """
+
+        self._formatIDs = {}
+        """ device id -> id of the device's format at the time of indexing """
+
+        self._keys = {}
+        """ device id -> (attribute -> keys the device is indexed under) """
+
+        self._maps = dict((attr, {}) for attr in self._attrs)
+        """ attribute -> (key -> set of device ids) """
+
+        self._dirty = set()
+        """ ids of devices whose indexed attributes have changed """
+
+        self._renamed = set()
+        """ ids of renamed devices whose dependents must be reindexed """
+
+        self._views = dict((attr, {}) for attr in self._viewAttrs)
+        """ attribute -> (key -> the visible device listed last with that key) """
+
+        self._staleKeys = dict((attr, set()) for attr in self._viewAttrs)
+        """ attribute -> keys whose entries in the view are out of date """
+
+        self._childless = set()
+        """ ids of the devices without children """
+
+        self._lock = RLock()
+
+        callbacks.attribute_changed.add(self._attributeChanged)
+
+    def __deepcopy__(self, memo):
+        with self._lock:
+            new = util.variable_copy(self, memo, omit=("_lock",))
+        new._lock = RLock()
+        callbacks.attribute_changed.add(new._attributeChanged)
+        return new
+
+    def __contains__(self, device):
+        """ Is the device indexed as a visible device? """
+        return (self._devices.get(device.id) is device and
+                device.id not in self._hidden)
+
+    def __len__(self):
+        return len(self._devices)
+
+    def isHidden(self, device):
+        """ Is the device indexed as a hidden device? """
+        return self._devices.get(device.id) is device and device.id in self._hidden
+
+    def add(self, device, hidden=False):
+        """ Add a device to the index.
+
+            :param device: the device to add
+            :type device: :class:`~.devices.Device`
+            :keyword bool hidden: whether the device is hidden
+
+            The device is placed after all previously added devices.
+        """
+        with self._lock:
+            if device.id in self._devices:
+                self._unindex(device.id)
+                del self._devices[device.id]
+
+            self._devices[device.id] = device
+            if hidden:
+                self._hidden.add(device.id)
+            else:
+                self._hidden.discard(device.id)
+
+            self._positions[device.id] = self._nextPosition
+            self._nextPosition += 1
+            self._index(device)
+
+    def remove(self, device):
+        """ Remove a device from the index.
+
+            :param device: the device to remove
+            :type device: :class:`~.devices.Device`
+        """
+        with self._lock:
+            if self._devices.get(device.id) is not device:
+                return
+
+            self._unindex(device.id)
+            del self._devices[device.id]
+            del self._positions[device.id]
+            self._hidden.discard(device.id)
+            self._childless.discard(device.id)
+            self._dirty.discard(device.id)
+            self._renamed.discard(device.id)
+
+    def sort(self, devices):
+        """ Return the devices sorted in device tree order. """
+        with self._lock:
+            return sorted(devices, key=lambda d: (d.id in self._hidden,
+                                                  self._positions[d.id]))
+
+    def find(self, attr, key, incomplete=False, hidden=False):
+        """ Return all indexed devices whose attribute matches a key.
+
+            :param str attr: "id" or one of the indexed attributes
+            :param key: the value to match
+            :keyword bool incomplete: include incomplete devices in result
+            :keyword bool hidden: include hidden devices in result
+            :returns: the matching devices in device tree order
+            :rtype: list of :class:`~.devices.Device`
+        """
+        with self._lock:
+            if attr == "id":
+                device = self._devices.get(key)
+                candidates = [device] if device is not None else []
+            else:
+                self._flush()
+                candidates = []
+                for dev_id in self._maps[attr].get(key, ()):
+                    device = self._devices[dev_id]
+                    if key not in _deviceKeys(device, attr):
+                        # an unreported change; pick it up on the next lookup
+                        self._dirty.add(dev_id)
+                        continue
+
+                    candidates.append(device)
+
+            if not hidden:
+                candidates = [d for d in candidates if d.id not in self._hidden]
+
+            if not incomplete:
+                candidates = [d for d in candidates if getattr(d, "complete", True)]
+
+            return self.sort(candidates)
+
+    def view(self, attr):
+        """ Return a view of the visible devices by one of their attributes.
+
+            :param str attr: "uuid" or "label"
+            :returns: a dict mapping each key to the visible device listed
+                      last among those carrying it
+            :rtype: dict
+
+            Only the entries whose devices were added, removed or changed
+            since the last call are brought up to date. The dict is owned by
+            the index and must not be modified.
+        """
+        with self._lock:
+            self._flush()
+            view = self._views[attr]
+            for key in self._staleKeys[attr]:
+                device = None
+                for dev_id in self._maps[attr].get(key, ()):
+                    candidate = self._devices[dev_id]
+                    if dev_id in self._hidden or \
+                       key not in _viewKeys(candidate, attr):
+                        if key not in _deviceKeys(candidate, attr):
+                            # an unreported change; pick it up on the next lookup
+                            self._dirty.add(dev_id)
+                        continue
+
+                    if device is None or \
+                       self._positions[dev_id] > self._positions[device.id]:
+                        device = candidate
+
+                if device is None:
+                    view.pop(key, None)
+                else:
+                    view[key] = device
+
+            self._staleKeys[attr].clear()
+            return view
+
+    def leaves(self):
+        """ Return the visible leaf devices in device tree order. """
+        with self._lock:
+            return self.sort(d for d in (self._devices[i] for i in self._childless
+                                         if i not in self._hidden)
+                             if d.isleaf)
+
+    def _index(self, device):
+        keys = {}
+        for attr in self._attrs:
+            keys[attr] = _deviceKeys(device, attr)
+            for key in keys[attr]:
+                self._maps[attr].setdefault(key, set()).add(device.id)
+
+            if attr in self._staleKeys:
+                self._staleKeys[attr].update(keys[attr])
+
+        self._keys[device.id] = keys
+        self._updateChildless(device)
+
+        fmt = getattr(device, "format", None)
+        if fmt is not None:
+            self._formats[fmt.id] = device
+            self._formatIDs[device.id] = fmt.id
+
+    def _unindex(self, dev_id):
+        for (attr, keys) in self._keys.pop(dev_id, {}).items():
+            if attr in self._staleKeys:
+                self._staleKeys[attr].update(keys)
+
+            for key in keys:
+                ids = self._maps[attr].get(key)
+                if ids is None:
+                    continue
+
+                ids.discard(dev_id)
+                if not ids:
+                    del self._maps[attr][key]
+
+        fmt_id = self._formatIDs.pop(dev_id, None)
+        if fmt_id is not None and self._formats.get(fmt_id) is self._devices[dev_id]:
+            del self._formats[fmt_id]
+
+    def _flush(self):
+        """ Reindex all devices with changed attributes. """
+        # derived names only ever come from ancestors, so it is enough to
+        # reindex the descendants of the renamed devices
+        stack = [self._devices[i] for i in self._renamed]
+        seen = set()
+        while stack:
+            device = stack.pop()
+            for child in device.children:
+                if child in seen:
+                    continue
+
+                seen.add(child)
+                stack.append(child)
+                if self._devices.get(child.id) is child:
+                    self._dirty.add(child.id)
+
+        self._renamed.clear()
+
+        for dev_id in self._dirty:
+            device = self._devices[dev_id]
+            self._unindex(dev_id)
+            self._index(device)
+
+        self._dirty.clear()
+
+    def _updateChildless(self, device):
+        # every device type's isleaf requires the device to have no children
+        if getattr(device, "kids", 0) == 0:
+            self._childless.add(device.id)
+        else:
+            self._childless.discard(device.id)
+
+    def _attributeChanged(self, obj, attr):
+        """ Record a change to one of an object's indexed attributes.
+
+            :param obj: the changed device or format
+            :param str attr: the name of the changed attribute
+        """
+        with self._lock:
+            device = self._devices.get(obj.id)
+            if device is not obj:
+                device = self._formats.get(obj.id)
+                if device is None or getattr(device, "format", None) is not obj:
+                    return
+
+            if attr == "kids":
+                self._updateChildless(device)
+                return
+
+            self._dirty.add(device.id)
+            if attr == "name":
+                self._renamed.add(device.id)
@@ -29,6 +29,8 @@ import os
 import re
 import struct
 import copy
+import threading
+import time
 
 from .. import util
 
@@ -62,6 +64,12 @@ re_interface_unknown = re.compile(r'^(\S*)\s*unknown: (\S*) (\S*)\s*$')
 
 fsroot = ""
 
+# seconds to wait for a disk to return its MBR signature before giving up on it
+mbr_read_timeout = 5
+
+# (key, edd_dict) of the last get_edd_dict() call
+_edd_cache = (None, None)
+
 class EddEntry(object):
     """ This object merely collects what the /sys/firmware/edd/* entries can
         provide.
@@ -541,33 +549,94 @@ def collect_edd_data():
         edd_data_dict[biosdev] = EddEntry(path[len(fsroot):])
     return edd_data_dict
 
+def _read_mbrsig(path):
+    """ Return the four bytes at offset 440 (the MBR signature) of path. """
+    fd = util.eintr_retry_call(os.open, path, os.O_RDONLY)
+    try:
+        if hasattr(os, "pread"):
+            return util.eintr_retry_call(os.pread, fd, 4, 440)
+        else:
+            os.lseek(fd, 440, 0)
+            return util.eintr_retry_call(os.read, fd, 4)
+    finally:
+        util.eintr_ignore(os.close, fd)
+
+def _read_mbrsigs(paths, timeout):
+    """ Read MBR signatures from all paths concurrently.
+
+        :param paths: device node paths
+        :type paths: list of str
+        :param timeout: seconds to wait for the reads to finish
+        :type timeout: int or float
+        :returns: a dict mapping each path to its data or the raised OSError;
+                  paths that did not answer in time are left out
+        :rtype: dict
+
+        A read that hangs cannot be interrupted, so its (daemon) thread is
+        left behind and the result is discarded if it ever arrives.
+    """
+    results = {}
+    lock = threading.Lock()
+
+    def read(path):
+        try:
+            result = _read_mbrsig(path)
+        except OSError as e:
+            result = e
+        with lock:
+            results[path] = result
+
+    threads = []
+    for path in paths:
+        thread = threading.Thread(target=read, args=(path,),
+                                  name="blivet-mbrsig")
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    deadline = time.time() + timeout
+    for thread in threads:
+        thread.join(max(deadline - time.time(), 0))
+
+    with lock:
+        return dict((path, results[path]) for path in paths if path in results)
+
 def collect_mbrs(devices):
     """ Read MBR signatures from devices.
 
         Returns a dict mapping device names to their MBR signatures. It is not
         guaranteed this will succeed, with a new disk for instance.
+
+        The disks are read concurrently and any disk that does not answer
+        within :data:`mbr_read_timeout` seconds is skipped.
     """
-    mbr_dict = {}
+    paths = []
     for dev in devices:
-        try:
-            path = dev.name.split('/')
-            path = os.path.join("dev", *path)
-            path = "%s/%s" % (fsroot, path)
-            fd = util.eintr_retry_call(os.open, path, os.O_RDONLY)
-            # The signature is the unsigned integer at byte 440:
-            os.lseek(fd, 440, 0)
-            data = util.eintr_retry_call(os.read, fd, 4)
-            mbrsig = struct.unpack('I', data)
-            sdata = struct.unpack("BBBB", data)
-            sdata = "".join(["%02x" % (x,) for x in sdata])
-            util.eintr_ignore(os.close, fd)
-            testdata_log.debug("device %s data[440:443] = %s", path, sdata)
-        except OSError as e:
-            testdata_log.debug("device %s data[440:443] raised %s", path, e)
+        path = dev.name.split('/')
+        path = os.path.join("dev", *path)
+        paths.append("%s/%s" % (fsroot, path))
+
+    data_dict = _read_mbrsigs(paths, mbr_read_timeout)
+
+    mbr_dict = {}
+    for (dev, path) in zip(devices, paths):
+        data = data_dict.get(path)
+        if data is None:
+            testdata_log.debug("device %s data[440:443] timed out", path)
+            log.error("edd: timed out reading mbrsig from disk %s", dev.name)
+            continue
+        elif isinstance(data, OSError):
+            testdata_log.debug("device %s data[440:443] raised %s", path, data)
             log.error("edd: could not read mbrsig from disk %s: %s",
-                      dev.name, str(e))
+                      dev.name, str(data))
             continue
 
+        # The signature is the unsigned integer at byte 440:
+        mbrsig = struct.unpack('I', data)
+        sdata = struct.unpack("BBBB", data)
+        sdata = "".join(["%02x" % (x,) for x in sdata])
+        testdata_log.debug("device %s data[440:443] = %s", path, sdata)
+
         mbrsig_str = "0x%08x" % mbrsig
         # sanity check
         if mbrsig_str == '0x00000000':
@@ -586,6 +655,25 @@ def collect_mbrs(devices):
     log.info("edd: collected mbr signatures: %s", mbr_dict)
     return mbr_dict
 
+def _disk_identity(name):
+    """ Return something that changes when the disk called name is replaced.
+
+        This is the sysfs path the /sys/block entry resolves to together with
+        the inode of that directory, which the kernel recreates whenever the
+        device is removed and added again.
+    """
+    path = os.path.realpath("%s/sys/block/%s" % (fsroot, name.replace('/', '!')))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (name, None, None)
+    return (name, path[len(fsroot):], (st.st_dev, st.st_ino))
+
+def invalidate_cache():
+    """ Forget the EDD mapping computed by the last :func:`get_edd_dict`. """
+    global _edd_cache
+    _edd_cache = (None, None)
+
 def get_edd_dict(devices):
     """ Generates the 'device name' -> 'edd number' mapping.
 
@@ -599,7 +687,23 @@ def get_edd_dict(devices):
         name (e.g 'sda') from there. Should this fail we try to match contents
         of 'mbr_signature' to a real MBR signature found on the existing block
         devices.
+
+        The result is remembered and reused as long as the set of disks and
+        their sysfs identity do not change. Use :func:`invalidate_cache` to
+        force the data to be collected again.
     """
+    global _edd_cache
+    key = (fsroot, frozenset(_disk_identity(dev.name) for dev in devices))
+    (cached_key, cached_dict) = _edd_cache
+    if cached_key == key:
+        log.debug("edd: disks unchanged, reusing mapping %s", cached_dict)
+        return dict(cached_dict)
+
+    edd_dict = _get_edd_dict(devices)
+    _edd_cache = (key, dict(edd_dict))
+    return edd_dict
+
+def _get_edd_dict(devices):
     mbr_dict = collect_mbrs(devices)
     edd_entries_dict = collect_edd_data()
     edd_dict = {}
@@ -33,11 +33,15 @@ from gi.repository import BlockDev as blockdev
 import logging
 log = logging.getLogger("blivet")
 
+from .. import initialize_blockdev
+initialize_blockdev()
+
 from . import raid
 from ..size import Size
 from ..i18n import N_
 from ..flags import flags
 from ..tasks import availability
+from .. import util
 
 # some of lvm's defaults that we have no way to ask it for
 LVM_PE_START = Size("1 MiB")
@@ -67,7 +71,7 @@ LVMETAD_SOCKET_PATH = "/run/lvm/lvmetad.socket"
 config_args_data = { "filterRejects": [],    # regular expressions to reject.
                      "filterAccepts": [] }   # regexp to accept
 
-def _set_global_config():
+def _global_config():
     """lvm command accepts lvm.conf type arguments preceded by --config. """
 
     filter_string = ""
@@ -93,7 +97,10 @@ def _set_global_config():
     if flags.debug:
         config_string += "log {level=7 file=/tmp/lvm.log}"
 
-    blockdev.lvm.set_global_config(config_string)
+    return config_string
+
+def _set_global_config():
+    blockdev.lvm.set_global_config(_global_config())
 
 def needs_config_refresh(fn):
     if not availability.BLOCKDEV_LVM_PLUGIN.available:
@@ -127,14 +134,150 @@ def lvm_cc_resetFilter():
     config_args_data["filterRejects"] = []
     config_args_data["filterAccepts"] = []
 
-def determine_parent_lv(vg_name, internal_lv, lvs):
+class LVMReport(object):
+    """ Information about all PVs and LVs, gathered in bulk.
+
+        The PVs (which include the data of their VGs) and the LVs (including
+        the internal ones) are each reported by a single lvm call, the first
+        time they are needed. Relations between LVs are taken from the LV
+        report if libblockdev provides them there. Otherwise they are all
+        read by a single run of lvs the first time one of them is needed.
+
+        To get up-to-date information, drop the report and create a new one.
+    """
+
+    _relationFields = ("origin", "pool_lv", "data_lv", "metadata_lv")
+
+    def __init__(self):
+        self._pvs = None
+        self._lvs = None
+        self._vg_lvs = None
+        self._relations = None
+
+    @property
+    def pvs(self):
+        """ PV data hashed by PV path """
+        if self._pvs is None:
+            self._pvs = dict((pv.pv_name, pv) for pv in blockdev.lvm.pvs())
+
+        return self._pvs
+
+    @property
+    def lvs(self):
+        """ LV data hashed by full name ("vg-lv") """
+        if self._lvs is None:
+            lvs = blockdev.lvm.lvs()
+            self._lvs = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in lvs)
+
+        return self._lvs
+
+    def vgLVs(self, vg_name):
+        """ Return the LVs of a VG.
+
+            :param str vg_name: name of the VG
+            :returns: LV data hashed by full name ("vg-lv")
+            :rtype: dict
+        """
+        if self._vg_lvs is None:
+            self._vg_lvs = {}
+            for (name, lv) in self.lvs.items():
+                self._vg_lvs.setdefault(lv.vg_name, {})[name] = lv
+
+        return self._vg_lvs.get(vg_name, {})
+
+    def _readRelations(self):
+        """ Read the relations between all LVs with a single run of lvs.
+
+            :returns: (vg name, lv name) -> (field -> value)
+            :rtype: dict
+            :raises: :class:`blockdev.LVMError` if lvs failed
+        """
+        fields = ("vg_name", "lv_name") + self._relationFields
+        argv = ["lvm", "lvs", "--noheadings", "--all", "--separator", "|",
+                "--config", _global_config(), "-o", ",".join(fields)]
+        try:
+            (rc, out) = util.run_program_and_capture_output(argv)
+        except OSError as e:
+            raise blockdev.LVMError("failed to run lvs: %s" % e)
+
+        if rc != 0:
+            raise blockdev.LVMError("lvs failed with exit status %d" % rc)
+
+        relations = {}
+        for line in out.splitlines():
+            values = [v.strip() for v in line.split("|")]
+            if len(values) != len(fields):
+                continue
+
+            (vg_name, lv_name) = (values[0], values[1].strip("[]"))
+            relations[(vg_name, lv_name)] = dict(zip(self._relationFields, values[2:]))
+
+        return relations
+
+    def _lvRelation(self, vg_name, lv_name, field, strip=True):
+        """ Return the name of an LV related to the given LV.
+
+            :param str vg_name: name of the VG
+            :param str lv_name: name of the LV
+            :param str field: name of the field in the LV report
+            :keyword bool strip: strip the brackets of internal LVs' names
+            :returns: the related LV's name or None
+            :raises: :class:`blockdev.LVMError` if lvs had to be run and
+                     failed
+        """
+        lv = self.lvs.get("%s-%s" % (vg_name, lv_name))
+        if lv is not None and hasattr(lv, field):
+            value = getattr(lv, field)
+        else:
+            if self._relations is None:
+                try:
+                    self._relations = (self._readRelations(), None)
+                except blockdev.LVMError as e:
+                    self._relations = (None, e)
+
+            (relations, error) = self._relations
+            if error is not None:
+                raise error
+
+            value = relations.get((vg_name, lv_name.strip("[]")), {}).get(field)
+
+        value = value or None
+        if value and strip:
+            value = value.strip("[]")
+        return value
+
+    def origin(self, vg_name, lv_name):
+        """ Return the name of a snapshot's origin LV. """
+        return self._lvRelation(vg_name, lv_name, "origin", strip=False)
+
+    def poolLV(self, vg_name, lv_name):
+        """ Return the name of a thin LV's pool. """
+        return self._lvRelation(vg_name, lv_name, "pool_lv")
+
+    def cachePoolLV(self, vg_name, lv_name):
+        """ Return the name of a cached LV's cache pool. """
+        return self._lvRelation(vg_name, lv_name, "pool_lv")
+
+    def dataLV(self, vg_name, lv_name):
+        """ Return the name of a pool's internal data LV. """
+        return self._lvRelation(vg_name, lv_name, "data_lv")
+
+    def metadataLV(self, vg_name, lv_name):
+        """ Return the name of a pool's internal metadata LV. """
+        return self._lvRelation(vg_name, lv_name, "metadata_lv")
+
+def determine_parent_lv(vg_name, internal_lv, lvs, report=None):
     """Try to determine which of the lvs is the parent of the internal_lv
 
     :param str vg_name: name of the VG the internal_lv and lvs belong to
     :type internal_lv: :class:`~.devices.lvm.LMVInternalLogicalVolumeDevice`
     :type lvs: :class:`~.devices.lvm.LMVLogicalVolumeDevice`
+    :keyword report: LVM report to look the relations between LVs up in
+    :type report: :class:`LVMReport`
 
     """
+    report = report or LVMReport()
+
     # try name matching first (fast, cheap, often works)
     for lv in lvs:
         if internal_lv.lvname == lv.lvname:
@@ -150,7 +293,7 @@ def determine_parent_lv(vg_name, internal_lv, lvs):
     for lv in lvs:
         # cache pools are internal LVs of cached LVs
         try:
-            pool_name = blockdev.lvm.cache_pool_name(vg_name, lv.lvname)
+            pool_name = report.cachePoolLV(vg_name, lv.lvname)
         except blockdev.LVMError:
             # cannot determine, just go on
             pass
@@ -160,7 +303,7 @@ def determine_parent_lv(vg_name, internal_lv, lvs):
 
         # pools have internal data and metadata LVs
         try:
-            data_lv_name = blockdev.lvm.data_lv_name(vg_name, lv.lvname)
+            data_lv_name = report.dataLV(vg_name, lv.lvname)
         except blockdev.LVMError:
             # cannot determine, just go on
             pass
@@ -168,7 +311,7 @@ def determine_parent_lv(vg_name, internal_lv, lvs):
             if data_lv_name == internal_lv.lvname:
                 return lv
         try:
-            metadata_lv_name = blockdev.lvm.metadata_lv_name(vg_name, lv.lvname)
+            metadata_lv_name = report.metadataLV(vg_name, lv.lvname)
         except blockdev.LVMError:
             # cannot determine, just go on
             pass
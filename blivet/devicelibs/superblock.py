@@ -0,0 +1,110 @@
+#
+# superblock.py
+# Cheap identification of filesystem superblocks
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+#
+
+import binascii
+import os
+import struct
+import zlib
+
+from .. import util
+
+import logging
+log = logging.getLogger("blivet")
+
+EXT_SUPERBLOCK_OFFSET = 1024
+EXT_MAGIC = 0xEF53
+XFS_MAGIC = b"XFSB"
+BTRFS_SUPERBLOCK_OFFSET = 0x10000
+BTRFS_MAGIC = b"_BHRfS_M"
+
+def _read(fd, offset, length):
+    if hasattr(os, "pread"):
+        return util.eintr_retry_call(os.pread, fd, length, offset)
+    else:
+        os.lseek(fd, offset, 0)
+        return util.eintr_retry_call(os.read, fd, length)
+
+def _ext_fingerprint(fd):
+    sb = _read(fd, EXT_SUPERBLOCK_OFFSET, 120)
+    if len(sb) < 120:
+        return None
+
+    (mtime, wtime, mnt_count, _max_mnt_count, magic) = \
+        struct.unpack("<IIHhH", sb[44:58])
+    if magic != EXT_MAGIC:
+        return None
+
+    return ("ext", binascii.hexlify(sb[104:120]).decode(), mnt_count, mtime, wtime)
+
+def _xfs_fingerprint(fd):
+    # the superblock has no timestamps, but its counters (and, on v5, its
+    # checksum) change whenever it is written
+    sb = _read(fd, 0, 512)
+    if len(sb) < 512 or sb[0:4] != XFS_MAGIC:
+        return None
+
+    return ("xfs", binascii.hexlify(sb[32:48]).decode(), zlib.crc32(sb) & 0xffffffff)
+
+def _btrfs_fingerprint(fd):
+    sb = _read(fd, BTRFS_SUPERBLOCK_OFFSET, 0x50)
+    if len(sb) < 0x50 or sb[0x40:0x48] != BTRFS_MAGIC:
+        return None
+
+    (generation,) = struct.unpack("<Q", sb[0x48:0x50])
+    return ("btrfs", binascii.hexlify(sb[0x20:0x30]).decode(), generation)
+
+_fingerprinters = {"ext2": _ext_fingerprint,
+                   "ext3": _ext_fingerprint,
+                   "ext4": _ext_fingerprint,
+                   "xfs": _xfs_fingerprint,
+                   "btrfs": _btrfs_fingerprint}
+
+def fingerprint(path, fstype):
+    """ Return a value that changes whenever a filesystem is written to.
+
+        :param str path: path of the device containing the filesystem
+        :param str fstype: the filesystem's type (eg: "ext4")
+        :returns: the filesystem's UUID, mount count and last mount and write
+                  times (ext2/3/4), its UUID and superblock checksum (xfs) or
+                  its UUID and generation (btrfs); None if the filesystem is
+                  of another type or its superblock cannot be read
+        :rtype: tuple or NoneType
+
+        Only the superblock is read, so this is much cheaper than any of the
+        filesystem tools.
+    """
+    func = _fingerprinters.get(fstype)
+    if func is None:
+        return None
+
+    try:
+        fd = util.eintr_retry_call(os.open, path, os.O_RDONLY)
+    except OSError as e:
+        log.debug("cannot read superblock of %s: %s", path, e)
+        return None
+
+    try:
+        return func(fd)
+    except OSError as e:
+        log.debug("cannot read superblock of %s: %s", path, e)
+        return None
+    finally:
+        util.eintr_ignore(os.close, fd)
@@ -19,6 +19,9 @@
 # Red Hat Author(s): David Lehman <dlehman@redhat.com>
 #
 
+from .. import initialize_blockdev
+initialize_blockdev()
+
 from .lib import get_device_majors, devicePathToName, deviceNameToDiskByPath, ParentList
 from .device import Device
 from .storage import StorageDevice
@@ -21,8 +21,11 @@
 #
 
 import pprint
+import six
+import weakref
 
 from .. import util
+from .. import callbacks
 from ..storage_log import log_method_call
 
 import logging
@@ -30,6 +33,11 @@ log = logging.getLogger("blivet")
 
 from .lib import ParentList
 
+def _overridesDependsOn(device):
+    """ Does the device's class extend :meth:`Device.dependsOn`? """
+    return (six.get_unbound_function(type(device).dependsOn) is not
+            six.get_unbound_function(Device.dependsOn))
+
 class Device(util.ObjectID):
     """ A generic device.
 
@@ -83,6 +91,14 @@ class Device(util.ObjectID):
             raise ValueError("%s is not a valid name for this device" % name)
         self._name = name
 
+        self._children = weakref.WeakSet()
+        """ devices that have this device as a parent """
+
+        self._ancestorCache = None
+        """ (ancestors by id, ancestors with their own dependsOn method),
+            dropped whenever the parents of this device or of any of its
+            ancestors change """
+
         if parents is not None and not isinstance(parents, list):
             raise ValueError("parents must be a list of Device instances")
 
@@ -94,10 +110,23 @@ class Device(util.ObjectID):
             We can't do copy.deepcopy on parted objects, which is okay.
             For these parted objects, we just do a shallow copy.
         """
-        return util.variable_copy(self, memo,
-           omit=('node',),
+        new = util.variable_copy(self, memo,
+           omit=('node', '_children'),
            shallow=('_partedPartition',))
 
+        # Link the copy with its copied children and parents. Each link is
+        # made by whichever of the two devices is copied last; a parent that
+        # is still being copied still shares its children with the original.
+        new._children = weakref.WeakSet(memo[id(c)] for c in self._children
+                                        if id(c) in memo)
+        new._ancestorCache = None
+        for (orig, parent) in zip(self.parents, new.parents):
+            children = getattr(parent, "_children", None)
+            if children is not None and children is not orig._children:
+                children.add(new)
+
+        return new
+
     def __repr__(self):
         s = ("%(type)s instance (%(id)s) --\n"
              "  name = %(name)s  status = %(status)s"
@@ -126,6 +155,8 @@ class Device(util.ObjectID):
             See :attr:`~.ParentList.appendfunc`.
         """
         parent.addChild()
+        parent._children.add(self)
+        self._invalidateAncestorCache()
 
     def _removeParent(self, parent):
         """ Called before removing a parent from this device.
@@ -133,13 +164,25 @@ class Device(util.ObjectID):
             See :attr:`~.ParentList.removefunc`.
         """
         parent.removeChild()
+        parent._children.discard(self)
+        self._invalidateAncestorCache()
+
+    def _replaceParent(self, old, new):
+        """ Called after replacing a parent of this device.
+
+            See :attr:`~.ParentList.replacefunc`.
+        """
+        old._children.discard(self)
+        new._children.add(self)
+        self._invalidateAncestorCache()
 
     def _initParentList(self):
         """ Initialize this instance's parent list. """
         if not hasattr(self, "_parents"):
             # pylint: disable=attribute-defined-outside-init
             self._parents = ParentList(appendfunc=self._addParent,
-                                       removefunc=self._removeParent)
+                                       removefunc=self._removeParent,
+                                       replacefunc=self._replaceParent)
 
         # iterate over a copy of the parent list because we are altering it in
         # the for-cycle
@@ -158,6 +201,17 @@ class Device(util.ObjectID):
     parents = property(_getParentList, _setParentList,
                        doc="devices upon which this device is built")
 
+    @property
+    def children(self):
+        """ Devices that have this device as a parent.
+
+            .. note::
+
+                This includes devices that are not (or no longer) in a device
+                tree.
+        """
+        return list(self._children)
+
     @property
     def dict(self):
         d =  {"type": self.type, "name": self.name,
@@ -168,11 +222,13 @@ class Device(util.ObjectID):
         """ Decrement the child counter for this device. """
         log_method_call(self, name=self.name, kids=self.kids)
         self.kids -= 1
+        callbacks.attribute_changed(self, "kids")
 
     def addChild(self):
         """ Increment the child counter for this device. """
         log_method_call(self, name=self.name, kids=self.kids)
         self.kids += 1
+        callbacks.attribute_changed(self, "kids")
 
     def setup(self, orig=False):
         """ Open, or set up, a device. """
@@ -209,6 +265,46 @@ class Device(util.ObjectID):
         for parent in self.parents:
             parent.teardown(recursive=recursive)
 
+    def _getAncestorCache(self):
+        """ Return this device's cached ancestors, refreshing them if needed.
+
+            :returns: ancestors (excluding this device) by id and the list of
+                      those ancestors that override :meth:`dependsOn`
+            :rtype: tuple of (dict, list)
+
+            The cache is valid until the parents of this device or of one of
+            its ancestors change, see :meth:`_invalidateAncestorCache`.
+        """
+        cache = getattr(self, "_ancestorCache", None)
+        if cache is not None:
+            return cache
+
+        ancestors = {}
+        special = []
+        for parent in self.parents:
+            (parent_ancestors, parent_special) = parent._getAncestorCache()
+            ancestors.update(parent_ancestors)
+            ancestors[parent.id] = parent
+            special.extend(a for a in parent_special if a not in special)
+            if _overridesDependsOn(parent) and parent not in special:
+                special.append(parent)
+
+        self._ancestorCache = (ancestors, special)
+        return (ancestors, special)
+
+    def _invalidateAncestorCache(self):
+        """ Drop the cached ancestors of this device and its descendants. """
+        # a device's cache is only ever computed along with those of its
+        # ancestors, so there is nothing to drop below a device without one
+        devices = [self]
+        while devices:
+            device = devices.pop()
+            if getattr(device, "_ancestorCache", None) is None:
+                continue
+
+            device._ancestorCache = None
+            devices.extend(device._children)
+
     def dependsOn(self, dep):
         """ Return True if this device depends on dep.
 
@@ -222,14 +318,12 @@ class Device(util.ObjectID):
             :rtype: bool
         """
         # XXX does a device depend on itself?
-        if dep in self.parents:
+        (ancestors, special) = self._getAncestorCache()
+        if ancestors.get(dep.id) is dep:
             return True
 
-        for parent in self.parents:
-            if parent.dependsOn(dep):
-                return True
-
-        return False
+        # some devices (eg: snapshots) have dependencies beyond their parents
+        return any(a.dependsOn(dep) for a in special)
 
     def dracutSetupArgs(self):
         return set()
@@ -247,8 +341,13 @@ class Device(util.ObjectID):
             raise ValueError("%s is not a valid name for this device" % value)
         self._name = value
 
+    def _setNameAndNotify(self, value):
+        # subclasses override _setName freely, so the notification lives here
+        self._setName(value)
+        callbacks.attribute_changed(self, "name")
+
     name = property(lambda s: s._getName(),
-                    lambda s, v: s._setName(v),
+                    lambda s, v: s._setNameAndNotify(v),
                     doc="This device's name")
 
     @property
@@ -269,10 +368,8 @@ class Device(util.ObjectID):
     @property
     def ancestors(self):
         """ A list of all of this device's ancestors, including itself. """
-        l = set([self])
-        for p in [d for d in self.parents if d not in l]:
-            l.update(set(p.ancestors))
-        return list(l)
+        (ancestors, _special) = self._getAncestorCache()
+        return list(ancestors.values()) + [self]
 
     @property
     def packages(self):
@@ -108,7 +108,9 @@ class ParentList(object):
             x in ml
             x = ml[i]   # not ml[i] = x
     """
-    def __init__(self, items=None, appendfunc=None, removefunc=None):
+
+    def __init__(self, items=None, appendfunc=None, removefunc=None,
+                 replacefunc=None):
         """
             :keyword items: initial contents
             :type items: any iterable
@@ -116,6 +118,8 @@ class ParentList(object):
             :type appendfunc: callable
             :keyword removefunc: a function to call before removing an item
             :type removefunc: callable
+            :keyword replacefunc: a function to call after replacing an item
+            :type replacefunc: callable
 
             appendfunc and removefunc should take the item to be added or
             removed and perform any checks or other processing. The appropriate
@@ -125,6 +129,9 @@ class ParentList(object):
             to the function. While this is not optimal for general-purpose use,
             it is ideal for the intended use as part of :class:`~.Device`. The
             functions themselves should not modify the :class:`~.ParentList`.
+
+            replacefunc takes the replaced item and its replacement. It is
+            called after the replacement and should not raise exceptions.
         """
         self.items = list()
         if items:
@@ -136,6 +143,9 @@ class ParentList(object):
         self.removefunc = removefunc or (lambda i: True)
         """ a function to call before removing an item """
 
+        self.replacefunc = replacefunc or (lambda x, y: True)
+        """ a function to call after replacing an item """
+
     def __iter__(self):
         return iter(self.items)
 
@@ -165,11 +175,13 @@ class ParentList(object):
         self.items.remove(y)
 
     def replace(self, x, y):
-        """ Replace the first instance of x with y, bypassing callbacks.
+        """ Replace the first instance of x with y, bypassing the append and
+            remove callbacks.
 
             .. note::
 
-                This method does update the child counts for the two devices.
+                This method does update the child counts for the two devices
+                and it does run the replace callback.
 
             .. note::
 
@@ -185,3 +197,4 @@ class ParentList(object):
         self.items[idx] = y
         x.removeChild()
         y.addChild()
+        self.replacefunc(x, y)
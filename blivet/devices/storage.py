@@ -26,8 +26,9 @@ import pyudev
 
 from .. import errors
 from .. import util
+from .. import callbacks
 from ..flags import flags
-from ..storage_log import log_method_call
+from ..storage_log import log_method_call, log_method_span
 from .. import udev
 from ..formats import getFormat, DeviceFormat
 from ..size import Size
@@ -159,6 +160,28 @@ class StorageDevice(Device):
         packages.extend(p for p in self.format.packages if p not in packages)
         return packages
 
+    def _getUUID(self):
+        return self._uuid
+
+    def _setUUID(self, value):
+        self._uuid = value
+        callbacks.attribute_changed(self, "uuid")
+
+    uuid = property(lambda s: s._getUUID(),
+                    lambda s, v: s._setUUID(v),
+                    doc="universally unique identifier (device -- not fs)")
+
+    def _getSysfsPath(self):
+        return self._sysfsPath
+
+    def _setSysfsPath(self, value):
+        self._sysfsPath = value
+        callbacks.attribute_changed(self, "sysfsPath")
+
+    sysfsPath = property(lambda s: s._getSysfsPath(),
+                         lambda s, v: s._setSysfsPath(v),
+                         doc="sysfs device path")
+
     @property
     def disks(self):
         """ A list of all disks this device depends on, including itself. """
@@ -376,6 +399,7 @@ class StorageDevice(Device):
         """ Perform device-specific setup operations. """
         pass
 
+    @log_method_span
     def setup(self, orig=False):
         """ Open, or set up, a device. """
         log_method_call(self, self.name, orig=orig, status=self.status,
@@ -419,6 +443,7 @@ class StorageDevice(Device):
         """ Perform device-specific teardown operations. """
         pass
 
+    @log_method_span
     def teardown(self, recursive=None):
         """ Close, or tear down, a device. """
         log_method_call(self, self.name, status=self.status,
@@ -450,6 +475,7 @@ class StorageDevice(Device):
         """ Perform device-specific create operations. """
         pass
 
+    @log_method_span
     def create(self):
         """ Create the device. """
         log_method_call(self, self.name, status=self.status)
@@ -486,6 +512,7 @@ class StorageDevice(Device):
         """ Perform device-specific destruction operations. """
         pass
 
+    @log_method_span
     def destroy(self):
         """ Destroy the device. """
         log_method_call(self, self.name, status=self.status)
@@ -706,6 +733,7 @@ class StorageDevice(Device):
         self._format = fmt
         self._format.device = self.path
         self._updateNetDevMountOption()
+        callbacks.attribute_changed(self, "format")
 
     def _updateNetDevMountOption(self):
         """ Fix mount options to include or exclude _netdev as appropriate. """
@@ -20,6 +20,9 @@
 # Red Hat Author(s): Dave Lehman <dlehman@redhat.com>
 #
 
+from contextlib import contextmanager
+import itertools
+from multiprocessing.pool import ThreadPool
 import os
 import re
 
@@ -31,8 +34,10 @@ from gi.repository import BlockDev as blockdev
 from .actionlist import ActionList
 from .errors import DeviceError, DeviceTreeError, StorageError
 from .deviceaction import ActionDestroyDevice, ActionDestroyFormat
-from .devices import BTRFSDevice, DASDDevice, NoDevice, PartitionDevice
+from .deviceindex import DeviceIndex
+from .devices import DASDDevice, NoDevice, PartitionDevice
 from .devices import LVMLogicalVolumeDevice, LVMVolumeGroupDevice
+from . import callbacks
 from . import formats, arch
 from .devicelibs import lvm
 from . import udev
@@ -40,13 +45,16 @@ from . import util
 from .util import open  # pylint: disable=redefined-builtin
 from .flags import flags
 from .populator import Populator
-from .storage_log import log_method_call, log_method_return
+from .storage_log import log_method_call, log_method_return, log_method_span
 
 import logging
 log = logging.getLogger("blivet")
 
 _LVM_DEVICE_CLASSES = (LVMLogicalVolumeDevice, LVMVolumeGroupDevice)
 
+# revisions of device trees, unique across all instances
+_revisions = itertools.count(1)
+
 class DeviceTree(object):
     """ A quasi-tree that represents the devices in the system.
 
@@ -84,6 +92,11 @@ class DeviceTree(object):
         """
         self.reset(conf, passphrase, luksDict, iscsi, dasd)
 
+        # whether filesystems may have their device set up when their size
+        # information is needed, see noSizeInfoSetup
+        self._sizeInfoSetup = True
+        callbacks.size_info_needed.add(self._sizeInfoNeeded)
+
     def reset(self, conf=None, passphrase=None, luksDict=None,
               iscsi=None, dasd=None):
         """ Reset the instance to its initial state. """
@@ -96,6 +109,15 @@ class DeviceTree(object):
 
         self._hidden = []
 
+        # hash indexes over _devices and _hidden for the getDeviceBy* methods
+        self._index = DeviceIndex()
+
+        # changes with every change of the devices or actions in the tree
+        self._revision = next(_revisions)
+
+        # ids of devices prefetchSizeInfo failed to set up
+        self._sizeInfoFailures = set()
+
         # initialize attributes that may later hold cached lvm info
         self.dropLVMCache()
 
@@ -114,6 +136,25 @@ class DeviceTree(object):
     def actions(self):
         return self._actions
 
+    @property
+    def revision(self):
+        """ A number that changes whenever the devices or actions change.
+
+            Results computed from the tree can be cached along with the
+            revision and used as long as the revision stays the same.
+        """
+        return self._revision
+
+    def bumpRevision(self):
+        """ Record a change of the devices in the tree.
+
+            Registering or canceling actions, adding or removing devices and
+            hiding or unhiding them does this automatically. Code changing
+            devices in any other way (eg: allocating partitions) has to call
+            this itself.
+        """
+        self._revision = next(_revisions)
+
     def setDiskImages(self, images):
         """ Set the disk images and reflect them in exclusiveDisks.
 
@@ -153,25 +194,27 @@ class DeviceTree(object):
         return self._populator.diskImages
 
     @property
-    def pvInfo(self):
-        if self._pvs_cache is None:
-            pvs = blockdev.lvm.pvs()
-            self._pvs_cache = dict((pv.pv_name, pv) for pv in pvs) # pylint: disable=attribute-defined-outside-init
+    def lvmReport(self):
+        """ Information about the system's PVs and LVs.
+
+            :rtype: :class:`~.devicelibs.lvm.LVMReport`
+        """
+        if self._lvm_report is None:
+            self._lvm_report = lvm.LVMReport() # pylint: disable=attribute-defined-outside-init
 
-        return self._pvs_cache
+        return self._lvm_report
 
     @property
-    def lvInfo(self):
-        if self._lvs_cache is None:
-            lvs = blockdev.lvm.lvs()
-            self._lvs_cache = dict(("%s-%s" % (lv.vg_name, lv.lv_name), lv) for lv in lvs) # pylint: disable=attribute-defined-outside-init
+    def pvInfo(self):
+        return self.lvmReport.pvs
 
-        return self._lvs_cache
+    @property
+    def lvInfo(self):
+        return self.lvmReport.lvs
 
     def dropLVMCache(self):
         """ Drop cached lvm information. """
-        self._pvs_cache = None # pylint: disable=attribute-defined-outside-init
-        self._lvs_cache = None # pylint: disable=attribute-defined-outside-init
+        self._lvm_report = None # pylint: disable=attribute-defined-outside-init
 
     def _addDevice(self, newdev, new=True):
         """ Add a device to the tree.
@@ -182,17 +225,20 @@ class DeviceTree(object):
             Raise ValueError if the device's identifier is already
             in the list.
         """
-        if newdev.uuid and newdev.uuid in [d.uuid for d in self._devices] and \
-           not isinstance(newdev, NoDevice):
+        if newdev.uuid and not isinstance(newdev, NoDevice) and \
+           any(d.uuid == newdev.uuid
+               for d in self._index.find("uuid", newdev.uuid, incomplete=True)):
             raise ValueError("device is already in tree")
 
         # make sure this device's parent devices are in the tree already
         for parent in newdev.parents:
-            if parent not in self._devices:
+            if parent not in self._index:
                 raise DeviceTreeError("parent device not in tree")
 
         newdev.addHook(new=new)
         self._devices.append(newdev)
+        self._index.add(newdev)
+        self.bumpRevision()
 
         # don't include "req%d" partition names
         if ((newdev.type != "partition" or
@@ -218,7 +264,7 @@ class DeviceTree(object):
 
                 Only leaves may be removed.
         """
-        if dev not in self._devices:
+        if dev not in self._index:
             raise ValueError("Device '%s' not in tree" % dev.name)
 
         if not dev.isleaf and not force:
@@ -232,12 +278,12 @@ class DeviceTree(object):
                 # adjust all other PartitionDevice instances belonging to the
                 # same disk so the device name matches the potentially altered
                 # name of the parted.Partition
-                for device in self._devices:
-                    if isinstance(device, PartitionDevice) and \
-                       device.disk == dev.disk:
-                        device.updateName()
+                for device in self.getPartitionsByDisk(dev.disk):
+                    device.updateName()
 
         self._devices.remove(dev)
+        self._index.remove(dev)
+        self.bumpRevision()
         if dev.name in self.names and getattr(dev, "complete", True):
             self.names.remove(dev.name)
         log.info("removed %s %s (id %d) from device tree", dev.type,
@@ -305,10 +351,10 @@ class DeviceTree(object):
             get here.
         """
         if not (action.isCreate and action.isDevice) and \
-           action.device not in self._devices:
+           action.device not in self._index:
             raise DeviceTreeError("device is not in the tree")
         elif (action.isCreate and action.isDevice):
-            if action.device in self._devices:
+            if action.device in self._index:
                 raise DeviceTreeError("device is already in the tree")
 
         if action.isCreate and action.isDevice:
@@ -324,6 +370,7 @@ class DeviceTree(object):
         action.apply()
         log.info("registered action: %s", action)
         self._actions.append(action)
+        self.bumpRevision()
 
     def cancelAction(self, action):
         """ Cancel a registered action.
@@ -347,6 +394,7 @@ class DeviceTree(object):
         action.cancel()
         self._actions.remove(action)
         log.info("canceled action %s", action)
+        self.bumpRevision()
 
     def findActions(self, device=None, action_type=None, object_type=None,
                     path=None, devid=None):
@@ -375,6 +423,61 @@ class DeviceTree(object):
                                   path=path,
                                   devid=devid)
 
+    def snapshot(self):
+        """ Save the current state of the device tree.
+
+            :returns: a snapshot to pass to :meth:`restore`
+            :rtype: :class:`~.util.StateSnapshot`
+
+            The snapshot holds the tree's devices, hidden devices, names and
+            actions along with the attributes of all devices, their formats,
+            the registered actions and everything below them that is part of
+            blivet (eg: parent lists and LVM cache requests). Partition tables
+            are duplicated, since they are changed in place. Everything else
+            is shared with the tree, which makes taking a snapshot much
+            cheaper than copying the tree.
+        """
+        snapshot = util.StateSnapshot()
+        snapshot.save(self, attrs=("_devices", "_hidden", "names", "_actions"))
+        snapshot.save(self._actions)
+
+        for obj in self._devices + self._hidden + list(self._actions):
+            snapshot.save(obj, duplicate=("_partedDisk",), recursive=True)
+
+        return snapshot
+
+    def restore(self, snapshot):
+        """ Restore the device tree to the state saved in a snapshot.
+
+            :param snapshot: a snapshot returned by :meth:`snapshot`
+            :type snapshot: :class:`~.util.StateSnapshot`
+
+            The saved state is restored in place, so all devices that were
+            in the tree when the snapshot was taken are in the tree again.
+        """
+        snapshot.restore()
+
+        # the parted partitions have to come from the restored partition tables
+        for device in self._devices + self._hidden:
+            if isinstance(device, PartitionDevice) and device.partedPartition:
+                disk = device.disk.format.partedDisk
+                device.partedPartition = disk.getPartitionByPath(device.path)
+
+        # restored parent lists may not match the devices' cached ancestors
+        for device in self._devices + self._hidden:
+            device._ancestorCache = None
+
+        callbacks.attribute_changed.remove(self._index._attributeChanged)
+        self._index = DeviceIndex()
+        for device in self._devices:
+            self._index.add(device)
+
+        for device in self._hidden:
+            self._index.add(device, hidden=True)
+
+        self.bumpRevision()
+
+    @log_method_span
     def processActions(self, callbacks=None, dryRun=False):
         self.actions.process(devices=self.devices,
                              dryRun=dryRun,
@@ -392,22 +495,34 @@ class DeviceTree(object):
         dependents = []
         log_method_call(self, dep=dep, hidden=hidden)
 
-        # don't bother looping looking for dependents if this is a leaf device
+        # don't bother looking for dependents if this is a leaf device
         # XXX all hidden devices are leaves
         if dep.isleaf and not hidden:
             log.debug("dep is a leaf")
             return dependents
 
-        devices = self._devices[:]
-        if hidden:
-            devices.extend(self._hidden)
+        # Besides its descendants, a device can have dependents that extend
+        # dependsOn (eg: snapshots of an LV, logical partitions of an extended
+        # partition). Those share a parent with the device they depend on.
+        roots = dep.children
+        roots.extend(s for p in dep.parents for s in p.children
+                     if s is not dep and s not in roots and s.dependsOn(dep))
+
+        found = set()
+        stack = roots
+        while stack:
+            device = stack.pop()
+            if device in found:
+                continue
 
-        for device in devices:
-            log.debug("checking if %s depends on %s", device.name, dep.name)
-            if device.dependsOn(dep):
+            found.add(device)
+            stack.extend(device.children)
+
+        for device in found:
+            if device in self._index or (hidden and self._index.isHidden(device)):
                 dependents.append(device)
 
-        return dependents
+        return self._index.sort(dependents)
 
     def getRelatedDisks(self, disk):
         """ Return disks related to disk by container membership.
@@ -460,7 +575,7 @@ class DeviceTree(object):
             Therefore, _removeDevice() is invoked with the force parameter
             set to True, to skip the isleaf check.
         """
-        if device in self._hidden:
+        if self._index.isHidden(device):
             return
 
         # cancel actions first thing so that we hide the correct set of devices
@@ -490,6 +605,7 @@ class DeviceTree(object):
         self._removeDevice(device, force=True, modparent=False)
 
         self._hidden.append(device)
+        self._index.add(device, hidden=True)
         lvm.lvm_cc_addFilterRejectRegexp(device.name)
 
         if isinstance(device, DASDDevice):
@@ -514,13 +630,15 @@ class DeviceTree(object):
         # the hidden list should be in leaves-first order
         for hidden in reversed(self._hidden):
             if hidden == device or hidden.dependsOn(device) and \
-               not any(parent in self._hidden for parent in hidden.parents):
+               not any(self._index.isHidden(parent) for parent in hidden.parents):
 
                 log.info("unhiding device %s %s (id %d)", hidden.type,
                                                           hidden.name,
                                                           hidden.id)
                 self._hidden.remove(hidden)
                 self._devices.append(hidden)
+                self._index.add(hidden)
+                self.bumpRevision()
                 hidden.addHook(new=False)
                 lvm.lvm_cc_removeFilterRejectRegexp(hidden.name)
                 if isinstance(device, DASDDevice):
@@ -561,6 +679,48 @@ class DeviceTree(object):
         if flags.installer_mode:
             self.teardownAll()
 
+    def updateDevices(self, sysfsPaths):
+        """ Update the tree for changes to the specified block devices.
+
+            :param sysfsPaths: sysfs paths of added, changed or removed devices
+            :type sysfsPaths: list of str
+
+            Only the specified devices, their dependents and newly appeared
+            devices are scanned. See :meth:`~.populator.Populator.update`.
+
+            .. note::
+
+                Updating is not possible while actions are scheduled.
+        """
+        udev.settle()
+        try:
+            self._populator.update(sysfsPaths)
+        finally:
+            self._hideIgnoredDisks()
+
+    def processUdevEvents(self, monitor, timeout=0):
+        """ Update the tree for the pending events of a udev monitor.
+
+            :param monitor: a started monitor (see :func:`~.udev.get_monitor`)
+            :type monitor: :class:`pyudev.Monitor`
+            :keyword timeout: seconds to wait for a first event (None: forever)
+            :type timeout: int or float or NoneType
+            :returns: the number of devices the events were about
+            :rtype: int
+        """
+        sysfs_paths = []
+        event = monitor.poll(timeout)
+        while event is not None:
+            if event.subsystem == "block" and event.sys_path not in sysfs_paths:
+                sysfs_paths.append(event.sys_path)
+
+            event = monitor.poll(0)
+
+        if sysfs_paths:
+            self.updateDevices(sysfs_paths)
+
+        return len(sysfs_paths)
+
     def _isIgnoredDisk(self, disk):
         return ((self.ignoredDisks and disk.name in self.ignoredDisks) or
                 (self.exclusiveDisks and
@@ -604,6 +764,95 @@ class DeviceTree(object):
             except DeviceError as e:
                 log.error("setup of %s failed: %s", device.name, e)
 
+    def prefetchSizeInfo(self, devices=None):
+        """ Gather the current and minimum size of existing filesystems.
+
+            :keyword devices: the devices whose filesystems to probe (default:
+                              all devices in the tree)
+            :type devices: list of :class:`~.devices.StorageDevice`
+
+            Filesystems gather this information (see
+            :meth:`~.formats.fs.FS.loadSizeInfo`) the first time it is
+            needed, one at a time. This sets up inactive devices first and
+            tears them down again afterwards. Devices that fail to set up are
+            not tried again. With :attr:`~.flags.Flags.size_info_workers`
+            allowing more than one thread the filesystems are probed
+            concurrently.
+        """
+        if devices is None:
+            devices = self.devices
+
+        devices = [d for d in devices
+                   if getattr(d.format, "sizeInfoPending", False) and
+                   d.id not in self._sizeInfoFailures]
+
+        activated = []
+        probed = []
+        for device in devices:
+            if not device.status:
+                if not device.controllable:
+                    continue
+
+                try:
+                    # the filesystems are probed below, possibly concurrently
+                    with device.format._deferSizeInfo(): # pylint: disable=protected-access
+                        device.setup()
+                except (StorageError, blockdev.BlockDevError) as e:
+                    log.info("setup of %s failed: %s", device.name, e)
+                    self._sizeInfoFailures.add(device.id)
+                    continue
+
+                activated.append(device)
+
+            probed.append(device.format)
+
+        try:
+            if flags.size_info_workers < 2 or len(probed) < 2:
+                for fmt in probed:
+                    fmt.loadSizeInfo()
+            else:
+                log.debug("gathering size info of %d filesystems in %d threads",
+                          len(probed), min(flags.size_info_workers, len(probed)))
+                pool = ThreadPool(min(flags.size_info_workers, len(probed)))
+                try:
+                    pool.map(lambda fmt: fmt.loadSizeInfo(), probed)
+                finally:
+                    pool.close()
+                    pool.join()
+        finally:
+            for device in activated:
+                try:
+                    device.teardown(recursive=True)
+                except (StorageError, blockdev.BlockDevError) as e:
+                    log.info("teardown of %s failed: %s", device.name, e)
+
+    def _sizeInfoNeeded(self, fmt):
+        """ Gather the size information of a filesystem of an inactive device.
+
+            Run via :data:`~.callbacks.size_info_needed`.
+        """
+        if not self._sizeInfoSetup:
+            return
+
+        device = self.getDeviceByPath(fmt.device)
+        if device is not None and device.format is fmt:
+            self.prefetchSizeInfo([device])
+
+    @contextmanager
+    def noSizeInfoSetup(self):
+        """ Do not set up devices to gather filesystem sizes in this context.
+
+            Filesystems on inactive devices report no current size and are
+            not resizable in this context, unless their size is known
+            already.
+        """
+        setup = self._sizeInfoSetup
+        self._sizeInfoSetup = False
+        try:
+            yield
+        finally:
+            self._sizeInfoSetup = setup
+
     def _filterDevices(self, incomplete=False, hidden=False):
         """ Return list of devices modified according to parameters.
 
@@ -658,6 +907,31 @@ class DeviceTree(object):
 
         return unformatted
 
+    def _findLVMAliased(self, attr, value, incomplete=False, hidden=False):
+        """ Return devices matching a name or path, allowing for lvm's "--".
+
+            :param str attr: "name" or "path"
+            :param str value: the name or path to match
+            :param bool incomplete: include incomplete devices in result
+            :param bool hidden: include hidden devices in result
+            :returns: the matching devices in device tree order
+            :rtype: list of :class:`~.devices.Device`
+
+            LVM devices also match if their name/path is equal to value with
+            each "--" replaced by "-".
+        """
+        devices = self._index.find(attr, value,
+                                   incomplete=incomplete, hidden=hidden)
+        alias = value.replace("--", "-")
+        if alias != value:
+            devices.extend(d for d in self._index.find(attr, alias,
+                                                       incomplete=incomplete,
+                                                       hidden=hidden)
+                           if isinstance(d, _LVM_DEVICE_CLASSES))
+            devices = self._index.sort(devices)
+
+        return devices
+
     def getDeviceBySysfsPath(self, path, incomplete=False, hidden=False):
         """ Return a list of devices with a matching sysfs path.
 
@@ -670,8 +944,9 @@ class DeviceTree(object):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.sysfsPath == path), None)
+            devices = self._index.find("sysfsPath", path,
+                                       incomplete=incomplete, hidden=hidden)
+            result = next(iter(devices), None)
         log_method_return(self, result)
         return result
 
@@ -687,8 +962,9 @@ class DeviceTree(object):
         log_method_call(self, uuid=uuid, incomplete=incomplete, hidden=hidden)
         result = None
         if uuid:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.uuid == uuid or d.format.uuid == uuid), None)
+            devices = self._index.find("uuid", uuid,
+                                       incomplete=incomplete, hidden=hidden)
+            result = next(iter(devices), None)
         log_method_return(self, result)
         return result
 
@@ -726,8 +1002,9 @@ class DeviceTree(object):
         log_method_call(self, label=label, incomplete=incomplete, hidden=hidden)
         result = None
         if label:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if getattr(d.format, "label", None) == label), None)
+            devices = self._index.find("label", label,
+                                       incomplete=incomplete, hidden=hidden)
+            result = next(iter(devices), None)
         log_method_return(self, result)
         return result
 
@@ -743,10 +1020,9 @@ class DeviceTree(object):
         log_method_call(self, name=name, incomplete=incomplete, hidden=hidden)
         result = None
         if name:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-            result = next((d for d in devices if d.name == name or \
-               (isinstance(d, _LVM_DEVICE_CLASSES) and d.name == name.replace("--","-"))),
-               None)
+            devices = self._findLVMAliased("name", name,
+                                           incomplete=incomplete, hidden=hidden)
+            result = next(iter(devices), None)
         log_method_return(self, result)
         return result
 
@@ -765,14 +1041,13 @@ class DeviceTree(object):
         log_method_call(self, path=path, incomplete=incomplete, hidden=hidden)
         result = None
         if path:
-            devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
+            devices = self._findLVMAliased("path", path,
+                                           incomplete=incomplete, hidden=hidden)
 
             # The usual order of the devices list is one where leaves are at
             # the end. So that the search can prefer leaves to interior nodes
             # the list that is searched is the reverse of the devices list.
-            result = next((d for d in reversed(list(devices)) if d.path == path or \
-               (isinstance(d, _LVM_DEVICE_CLASSES) and d.path == path.replace("--","-"))),
-               None)
+            result = next(reversed(devices), None)
 
         log_method_return(self, result)
         return result
@@ -819,26 +1094,17 @@ class DeviceTree(object):
             :rtype: :class:`~.devices.Device`
         """
         log_method_call(self, id_num=id_num, incomplete=incomplete, hidden=hidden)
-        devices = self._filterDevices(incomplete=incomplete, hidden=hidden)
-        result = next((d for d in devices if d.id == id_num), None)
+        devices = self._index.find("id", id_num,
+                                   incomplete=incomplete, hidden=hidden)
+        result = next(iter(devices), None)
         log_method_return(self, result)
         return result
 
     @property
     def devices(self):
         """ List of devices currently in the tree """
-        devices = []
-        for device in self._devices:
-            if not getattr(device, "complete", True):
-                continue
-
-            if device.uuid and device.uuid in [d.uuid for d in devices] and \
-               not isinstance(device, NoDevice):
-                raise DeviceTreeError("duplicate uuids in device tree")
-
-            devices.append(device)
-
-        return devices
+        # duplicate uuids are rejected by _addDevice
+        return [d for d in self._devices if getattr(d, "complete", True)]
 
     @property
     def filesystems(self):
@@ -854,25 +1120,7 @@ class DeviceTree(object):
     @property
     def uuids(self):
         """ Dict with uuid keys and :class:`~.devices.Device` values. """
-        uuids = {}
-        for dev in self._devices:
-            try:
-                uuid = dev.uuid
-            except AttributeError:
-                uuid = None
-
-            if uuid:
-                uuids[uuid] = dev
-
-            try:
-                uuid = dev.format.uuid
-            except AttributeError:
-                uuid = None
-
-            if uuid:
-                uuids[uuid] = dev
-
-        return uuids
+        return dict(self._index.view("uuid"))
 
     @property
     def labels(self):
@@ -880,31 +1128,93 @@ class DeviceTree(object):
 
             FIXME: duplicate labels are a possibility
         """
-        labels = {}
-        for dev in self._devices:
-            # don't include btrfs member devices
-            if getattr(dev.format, "label", None) and \
-               (dev.format.type != "btrfs" or isinstance(dev, BTRFSDevice)):
-                labels[dev.format.label] = dev
-
-        return labels
+        # btrfs member devices are not included
+        return dict(self._index.view("label"))
 
     @property
     def leaves(self):
         """ List of all devices upon which no other devices exist. """
-        leaves = [d for d in self._devices if d.isleaf]
-        return leaves
+        return self._index.leaves()
 
     def getChildren(self, device):
         """ Return a list of a device's children. """
-        return [c for c in self._devices if device in c.parents]
+        return self._index.sort(c for c in device.children if c in self._index)
+
+    def getPartitionsByDisk(self, disk):
+        """ Return a list of the partitions on a disk.
+
+            :param disk: the disk
+            :type disk: :class:`~.devices.StorageDevice`
+            :returns: the disk's partitions in the tree, in the tree's order
+            :rtype: list of :class:`~.devices.PartitionDevice`
+        """
+        return self._index.sort(c for c in disk.children
+                                if isinstance(c, PartitionDevice) and
+                                c.disk == disk and c in self._index)
+
+    def _canonicalNode(self, devspec):
+        """ Return the path a device node path should be looked up by. """
+        if devspec.startswith("/dev/disk/"):
+            devspec = os.path.realpath(devspec)
+
+        is_dm = devspec.startswith("/dev/dm-")
+        is_md = re.match(r'/dev/md\d+(p\d+)?$', devspec)
+        if is_dm or is_md:
+            # devices in the tree know their kernel names from sysfs
+            devices = self._index.find("sysfsPath",
+                                       "/sys/devices/virtual/block/" + devspec[5:])
+            if devices:
+                return devices[0].path
+
+        if is_dm:
+            try:
+                dm_name = blockdev.dm.name_from_node(devspec[5:])
+            except blockdev.DMError as e:
+                log.info("failed to resolve %s: %s", devspec, e)
+                dm_name = None
 
-    def resolveDevice(self, devspec, blkidTab=None, cryptTab=None, options=None):
+            if dm_name:
+                devspec = "/dev/mapper/" + dm_name
+
+        if is_md:
+            try:
+                md_name = blockdev.md.name_from_node(devspec[5:])
+            except blockdev.MDRaidError as e:
+                log.info("failed to resolve %s: %s", devspec, e)
+                md_name = None
+
+            if md_name:
+                devspec = "/dev/md/" + md_name
+
+        return devspec
+
+    def _resolveNode(self, devspec, nodeCache=None):
+        """ Return the path a device node path should be looked up by.
+
+            :param str devspec: a device node path
+            :keyword dict nodeCache: nodes resolved earlier in the same pass
+            :returns: the path of the device in the tree
+            :rtype: str
+
+            /dev/disk/ symlinks are followed and /dev/dm-N and /dev/mdN nodes
+            are translated to their /dev/mapper/ and /dev/md/ names.
+        """
+        if nodeCache is None:
+            return self._canonicalNode(devspec)
+
+        if devspec not in nodeCache:
+            nodeCache[devspec] = self._canonicalNode(devspec)
+
+        return nodeCache[devspec]
+
+    def resolveDevice(self, devspec, blkidTab=None, cryptTab=None, options=None,
+                      nodeCache=None):
         """ Return the device matching the provided device specification.
 
             The spec can be anything from a device name (eg: 'sda3') to a device
             node path (eg: '/dev/mapper/fedora-root' or '/dev/dm-2') to
-            something like 'UUID=xyz-tuv-qrs' or 'LABEL=rootfs'.
+            something like 'UUID=xyz-tuv-qrs', 'LABEL=rootfs' or
+            'PARTUUID=1234abcd-01'.
 
             :param devspec: a string describing a block device
             :type devspec: str
@@ -914,8 +1224,15 @@ class DeviceTree(object):
             :type cryptTab: :class:`~.CryptTab`
             :keyword options: mount options
             :type options: str
+            :keyword nodeCache: device node paths resolved earlier in the
+                                same pass over many specs (eg: the lines of
+                                an fstab), filled in as nodes are resolved
+            :type nodeCache: dict
             :returns: the device
             :rtype: :class:`~.devices.StorageDevice` or None
+
+            A nodeCache must not be kept across changes of the device nodes,
+            eg: setting up or tearing down devices.
         """
         # find device in the tree
         device = None
@@ -925,14 +1242,23 @@ class DeviceTree(object):
             if ((uuid.startswith('"') and uuid.endswith('"')) or
                 (uuid.startswith("'") and uuid.endswith("'"))):
                 uuid = uuid[1:-1]
-            device = self.uuids.get(uuid)
+            device = self._index.view("uuid").get(uuid)
         elif devspec.startswith("LABEL="):
             # device-by-label
             label = devspec.partition("=")[2]
             if ((label.startswith('"') and label.endswith('"')) or
                 (label.startswith("'") and label.endswith("'"))):
                 label = label[1:-1]
-            device = self.labels.get(label)
+            device = self._index.view("label").get(label)
+        elif devspec.startswith("PARTUUID="):
+            # device-by-partuuid
+            partuuid = devspec.partition("=")[2]
+            if ((partuuid.startswith('"') and partuuid.endswith('"')) or
+                (partuuid.startswith("'") and partuuid.endswith("'"))):
+                partuuid = partuuid[1:-1]
+            devspec = self._resolveNode("/dev/disk/by-partuuid/" + partuuid,
+                                        nodeCache)
+            device = self.getDeviceByPath(devspec)
         elif re.match(r'(0x)?[A-Fa-f0-9]{2}(p\d+)?$', devspec):
             # BIOS drive number
             (drive, _p, partnum) = devspec.partition("p")
@@ -952,30 +1278,8 @@ class DeviceTree(object):
                     devspec = "/dev/" + devspec
 
             if not device:
-                if devspec.startswith("/dev/disk/"):
-                    devspec = os.path.realpath(devspec)
-
-                if devspec.startswith("/dev/dm-"):
-                    try:
-                        dm_name = blockdev.dm.name_from_node(devspec[5:])
-                    except blockdev.DMError as e:
-                        log.info("failed to resolve %s: %s", devspec, e)
-                        dm_name = None
-
-                    if dm_name:
-                        devspec = "/dev/mapper/" + dm_name
-
-                if re.match(r'/dev/md\d+(p\d+)?$', devspec):
-                    try:
-                        md_name = blockdev.md.name_from_node(devspec[5:])
-                    except blockdev.MDRaidError as e:
-                        log.info("failed to resolve %s: %s", devspec, e)
-                        md_name = None
-
-                    if md_name:
-                        devspec = "/dev/md/" + md_name
-
                 # device path
+                devspec = self._resolveNode(devspec, nodeCache)
                 device = self.getDeviceByPath(devspec)
 
             if device is None:
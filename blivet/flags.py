@@ -67,6 +67,26 @@ class Flags(object):
         # meaningful when flags.installer_mode is False)
         self.include_nodev = False
 
+        # number of threads running the read-only device probes (sysfs reads,
+        # multipath/md/loop queries) concurrently while populating the device
+        # tree; 0 or 1 means every probe is run when its result is needed
+        self.populate_workers = 0
+
+        # number of threads executing independent actions (eg: creating
+        # formats on different disks) concurrently; 0 or 1 means the actions
+        # are executed one at a time in the sorted order
+        self.action_workers = 0
+
+        # number of threads mounting filesystems to look for existing
+        # installations concurrently, each at its own temporary mountpoint;
+        # 0 or 1 means they are mounted one at a time at the sysroot
+        self.installation_workers = 0
+
+        # number of threads gathering the current and minimum size of
+        # existing filesystems concurrently in DeviceTree.prefetchSizeInfo;
+        # 0 or 1 means the filesystems are probed one at a time
+        self.size_info_workers = 0
+
         self.boot_cmdline = {}
 
         self.update_from_boot_cmdline()
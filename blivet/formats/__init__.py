@@ -29,11 +29,15 @@ from gi.repository import BlockDev as blockdev
 import os
 import importlib
 
+from .. import initialize_blockdev
+initialize_blockdev()
+
 from ..util import notify_kernel
 from ..util import get_sysfs_path_by_name
 from ..util import run_program
 from ..util import ObjectID
-from ..storage_log import log_method_call
+from ..storage_log import log_method_call, log_method_span
+from .. import callbacks
 from ..errors import DeviceFormatError, FormatCreateError, FormatDestroyError, FormatSetupError
 from ..i18n import N_
 from ..size import Size
@@ -274,6 +278,7 @@ class DeviceFormat(ObjectID):
            This method is not intended to be overridden.
         """
         self._label = label
+        callbacks.attribute_changed(self, "label")
 
     def _getLabel(self):
         """The label for this filesystem.
@@ -334,6 +339,17 @@ class DeviceFormat(ObjectID):
                       lambda f,d: f._setDevice(d),
                       doc="Full path the device this format occupies")
 
+    def _setUUID(self, uuid):
+        self._uuid = uuid
+        callbacks.attribute_changed(self, "uuid")
+
+    def _getUUID(self):
+        return self._uuid
+
+    uuid = property(lambda f: f._getUUID(),
+                    lambda f,u: f._setUUID(u),
+                    doc="this formatting's UUID")
+
     @property
     def name(self):
         return self._name or self.type
@@ -369,6 +385,7 @@ class DeviceFormat(ObjectID):
         except (ValueError, IOError) as e:
             log.warning("failed to notify kernel of change: %s", e)
 
+    @log_method_span
     def create(self, **kwargs):
         """ Write the formatting to the specified block device.
 
@@ -414,6 +431,7 @@ class DeviceFormat(ObjectID):
         self.exists = True
         self.notifyKernel()
 
+    @log_method_span
     def destroy(self, **kwargs):
         """ Remove the formatting from the associated block device.
 
@@ -462,6 +480,7 @@ class DeviceFormat(ObjectID):
         # assumes wipefs is always available
         return True
 
+    @log_method_span
     def setup(self, **kwargs):
         """ Activate the formatting.
 
@@ -516,6 +535,7 @@ class DeviceFormat(ObjectID):
     def _postSetup(self, **kwargs):
         pass
 
+    @log_method_span
     def teardown(self, **kwargs):
         """ Deactivate the formatting. """
         log_method_call(self, device=self.device,
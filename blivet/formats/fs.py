@@ -22,6 +22,7 @@
 #
 
 """ Filesystem classes. """
+from contextlib import contextmanager
 from decimal import Decimal
 import os
 import tempfile
@@ -37,6 +38,7 @@ from ..tasks import fsresize
 from ..tasks import fssize
 from ..tasks import fssync
 from ..tasks import fswritelabel
+from ..tasks import probecache
 from ..errors import FormatCreateError, FSError, FSReadLabelError
 from ..errors import FSWriteLabelError, FSResizeError
 from . import DeviceFormat, register_device_format
@@ -46,6 +48,7 @@ from ..flags import flags
 from parted import fileSystemType
 from ..storage_log import log_exception_info, log_method_call
 from .. import arch
+from .. import callbacks
 from ..size import Size, ROUND_UP, ROUND_DOWN, unitStr
 from ..i18n import N_
 from .. import udev
@@ -133,13 +136,13 @@ class FS(DeviceFormat):
         # Resize operations are limited to error-free filesystems whose current
         # size is known.
         self._resizable = False
-        if flags.installer_mode and self._resize.available:
-            # if you want current/min size you have to call updateSizeInfo
-            try:
-                self.updateSizeInfo()
-            except FSError:
-                log.warning("%s filesystem on %s needs repair", self.type,
-                                                                self.device)
+
+        # in installer mode the current and minimum size are gathered when
+        # they are first needed, otherwise you have to call updateSizeInfo
+        self._sizeInfoPending = flags.installer_mode and self.exists and \
+                                self._resize.available
+        self._sizeInfoDeferred = False
+        self._sizeInfoWarned = False
 
         self._targetSize = self._size
 
@@ -149,7 +152,8 @@ class FS(DeviceFormat):
             self.loadModule()
 
     def __repr__(self):
-        s = DeviceFormat.__repr__(self)
+        with self._deferSizeInfo():
+            s = DeviceFormat.__repr__(self)
         s += ("  mountpoint = %(mountpoint)s  mountopts = %(mountopts)s\n"
               "  label = %(label)s  size = %(size)s"
               "  targetSize = %(targetSize)s\n" %
@@ -167,10 +171,12 @@ class FS(DeviceFormat):
 
     @property
     def dict(self):
-        d = super(FS, self).dict
-        d.update({"mountpoint": self.mountpoint, "size": self._size,
-                  "label": self.label, "targetSize": self.targetSize,
-                  "mountable": self.mountable})
+        with self._deferSizeInfo():
+            d = super(FS, self).dict
+            d.update({"mountpoint": self.mountpoint, "size": self._size,
+                      "label": self.label, "targetSize": self.targetSize,
+                      "mountable": self.mountable,
+                      "sizeInfoPending": self._sizeInfoPending})
         return d
 
     @classmethod
@@ -237,6 +243,7 @@ class FS(DeviceFormat):
 
     def _getTargetSize(self):
         """ Get this filesystem's target size. """
+        self.loadSizeInfo()
         return self._targetSize
 
     targetSize = property(_getTargetSize, _setTargetSize,
@@ -267,9 +274,16 @@ class FS(DeviceFormat):
         #     its unknown actual minimum size.
         #   * self._getMinSize() is only run if fsck succeeds and a current
         #     existing size can be obtained.
+        self._sizeInfoPending = False
         if not self.exists:
             return
 
+        # the tasks' results are cached by the filesystem's superblock
+        # fingerprint, which is then only read once if nothing has changed
+        with probecache.probing(self):
+            self._updateSizeInfo()
+
+    def _updateSizeInfo(self):
         self._current_info = None
         self._minInstanceSize = Size(0)
         self._resizable = self.__class__._resizable
@@ -312,8 +326,61 @@ class FS(DeviceFormat):
         except (FSError, NotImplementedError) as e:
             log.warning("Failed to obtain minimum size for device %s: %s", self.device, e)
 
+    @property
+    def sizeInfoPending(self):
+        """ Whether the current and minimum size have yet to be gathered. """
+        return self._sizeInfoPending
+
+    def loadSizeInfo(self):
+        """ Gather the current and minimum size if that is still pending.
+
+            This needs the device node. If it does not exist the device tree
+            holding the device is asked to set it up for the probe (see
+            :data:`~.callbacks.size_info_needed`); use
+            :meth:`~.devicetree.DeviceTree.prefetchSizeInfo` to gather the
+            information for many filesystems at once. If the device cannot
+            be set up the filesystem reports no current size and is not
+            resizable.
+        """
+        if not self._sizeInfoPending or self._sizeInfoDeferred:
+            return
+
+        # tmpfs mounts don't need an existing device node
+        if not self.device == "tmpfs" and not os.path.exists(self.device):
+            callbacks.size_info_needed(self)
+            if not self._sizeInfoPending:
+                return
+
+            if not self._sizeInfoWarned:
+                log.warning("size of %s filesystem on %s is not known until "
+                            "the device is set up", self.type, self.device)
+                self._sizeInfoWarned = True
+            return
+
+        try:
+            self.updateSizeInfo()
+        except FSError:
+            log.warning("%s filesystem on %s needs repair", self.type,
+                                                            self.device)
+
+        self._targetSize = self._size
+
+    @contextmanager
+    def _deferSizeInfo(self):
+        """ Do not gather the size information in this context.
+
+            Used to describe the filesystem without probing it.
+        """
+        deferred = self._sizeInfoDeferred
+        self._sizeInfoDeferred = True
+        try:
+            yield
+        finally:
+            self._sizeInfoDeferred = deferred
+
     @property
     def minSize(self):
+        self.loadSizeInfo()
         # If self._minInstanceSize is not 0, then it should be no less than
         # self._minSize, by definition, and since a non-zero value indicates
         # that it was obtained, it is the preferred value.
@@ -345,6 +412,7 @@ class FS(DeviceFormat):
     @property
     def currentSize(self):
         """ The filesystem's current actual size. """
+        self.loadSizeInfo()
         return self._size if self.exists else Size(0)
 
     @property
@@ -722,6 +790,7 @@ class FS(DeviceFormat):
     @property
     def resizable(self):
         """ Can formats of this filesystem type be resized? """
+        self.loadSizeInfo()
         return super(FS, self).resizable and self._resize.available
 
     def _getOptions(self):
@@ -20,74 +20,39 @@
 # Red Hat Author(s): Vojtech Trefny <vtrefny@redhat.com>
 #
 from collections import defaultdict
-from .udev import resolve_devspec
-from . import util
+import select
+from threading import RLock
+
+from .udev import DeviceSnapshot, resolve_devspec
 from .util import open  # pylint: disable=redefined-builtin
 from .devicelibs import btrfs
 
 import logging
 log = logging.getLogger("blivet")
 
-class _MountinfoCache(object):
-    """ Cache for info from /proc/self/mountinfo. Looks up the root of the
-        mount within the filesystem using a pair of mountpoint, mount
-        source as keys.
-
-        This is a very simple helper class for MountsCache, and would
-        have to be altered for general purpose use.
+class MountsCache(object):
+    """ Cache object for system mountpoints; parses /proc/self/mountinfo
+        again only after the kernel reports a change of the mount table.
 
-        Note that only info for fstype btrfs is stored within the cache,
-        as MountsCache methods only require information for btrfs.
+        The cache is shared by all threads. A change of the mount table is
+        reported only once, to whichever thread polls first, so checking for
+        changes and reading the cache happen under a lock.
     """
 
     def __init__(self):
-        self._cache = None
-
-    def _getCache(self):
-        """ Reads lines in /proc/self/mountinfo and builds a table. """
-        cache = {}
-
-        with open("/proc/self/mountinfo") as mountinfos:
-            for line in mountinfos:
-                fields = line.split()
-                separator_index = fields.index("-")
-                fstype = fields[separator_index + 1]
-                if not fstype.startswith("btrfs"):
-                    continue
-
-                root = fields[3]
-                mountpoint = fields[4]
-                # store the canonical device path
-                devspec = resolve_devspec(fields[separator_index + 2],
-                                          sysname=True)
-                cache[(devspec, mountpoint)] = root
-
-        return cache
-
-    def getRoot(self, devspec, mountpoint):
-        """ Retrieves the root of the mount within the filesystem
-            that corresponds to devspec and mountpoint.
+        self.mountpoints = defaultdict(list)
 
-            :param str devspec: device specification
-            :param str mountpoint: mountpoint
-            :rtype: str or NoneType
-            :returns: the root of the mount within the filesystem, if available
-        """
-        if self._cache is None:
-            self._cache = self._getCache()
+        # mountpoint -> number of mounts on it, for isMountpoint
+        self._mounted = {}
 
-        # get the canonical device path
-        devspec = resolve_devspec(devspec, sysname=True)
-        return self._cache.get((devspec, mountpoint))
+        # udev devices the mount sources were resolved with
+        self._snapshot = None
 
-class MountsCache(object):
-    """ Cache object for system mountpoints; checks /proc/mounts and
-        /proc/self/mountinfo for up-to-date information.
-    """
+        # /proc/self/mountinfo, kept open to be polled for changes
+        self._mountinfo = None
+        self._poller = None
 
-    def __init__(self):
-        self.mountsHash = 0
-        self.mountpoints = defaultdict(list)
+        self._lock = RLock()
 
     def getMountpoints(self, devspec, subvolspec=None):
         """ Get mountpoints for selected device
@@ -103,15 +68,24 @@ class MountsCache(object):
                 Devices can be mounted on multiple paths, and paths can have multiple
                 devices mounted to them (hiding previous mounts). Callers should take this into account.
         """
-        self._cacheCheck()
+        with self._lock:
+            self._cacheCheck()
+            mountpoints = self.mountpoints
+            snapshot = self._snapshot
 
         if subvolspec is not None:
             subvolspec = str(subvolspec)
 
         # devspec == None means "get 'nodev' mount points"
         if devspec is not None:
-            # use the canonical device path (if available)
-            canon_devspec = resolve_devspec(devspec, sysname=True)
+            # use the canonical device path (if available); a device that is
+            # mounted was known to udev when the mount table was last parsed
+            canon_devspec = None
+            if snapshot is not None:
+                canon_devspec = snapshot.resolve_devspec(devspec, sysname=True)
+            if canon_devspec is None:
+                canon_devspec = resolve_devspec(devspec, sysname=True)
+
             if canon_devspec is not None:
                 devspec = canon_devspec
             else:
@@ -119,55 +93,85 @@ class MountsCache(object):
                 # mounted
                 return []
 
-        return self.mountpoints[(devspec, subvolspec)]
+        return mountpoints.get((devspec, subvolspec), [])
 
     def isMountpoint(self, path):
         """ Check to see if a path is already mounted
 
             :param str path: Path to check
         """
-        self._cacheCheck()
-
-        return any(path in p for p in self.mountpoints.values())
+        with self._lock:
+            self._cacheCheck()
+            return path in self._mounted
 
     def _getActiveMounts(self):
-        """ Get information about mounted devices from /proc/mounts and
-            /proc/self/mountinfo
+        """ Get information about mounted devices from /proc/self/mountinfo
 
             Refreshes self.mountpoints with current mountpoint information
         """
-        self.mountpoints = defaultdict(list)
-        mountinfo = _MountinfoCache()
-
-        with open("/proc/mounts") as mounts:
-            for line in mounts:
-                try:
-                    (devspec, mountpoint, fstype, _rest) = line.split(None, 3)
-                except ValueError:
-                    log.error("failed to parse /proc/mounts line: %s", line)
-                    continue
-
-                # use the canonical device path (if available)
-                devspec = resolve_devspec(devspec, sysname=True) or devspec
-
-                if fstype == "btrfs":
-                    root = mountinfo.getRoot(devspec, mountpoint)
-                    if root is not None:
-                        subvolspec = root[1:] or str(btrfs.MAIN_VOLUME_ID)
-                        self.mountpoints[(devspec, subvolspec)].append(mountpoint)
-                    else:
-                        log.error("failed to obtain subvolspec for btrfs device %s at mountpoint %s", devspec, mountpoint)
-                else:
-                    self.mountpoints[(devspec, None)].append(mountpoint)
+        mountpoints = defaultdict(list)
+        mounted = {}
+        snapshot = DeviceSnapshot()
+
+        if self._mountinfo is not None:
+            self._mountinfo.seek(0)
+            lines = self._mountinfo.readlines()
+        else:
+            with open("/proc/self/mountinfo") as mountinfo:
+                lines = mountinfo.readlines()
+
+        for line in lines:
+            # id parent major:minor root mountpoint options [optional...] -
+            # fstype source superoptions
+            fields = line.split()
+            try:
+                separator_index = fields.index("-", 6)
+                root = fields[3]
+                mountpoint = fields[4]
+                fstype = fields[separator_index + 1]
+                devspec = fields[separator_index + 2]
+            except (ValueError, IndexError):
+                log.error("failed to parse /proc/self/mountinfo line: %s", line)
+                continue
+
+            # use the canonical device path (if available)
+            devspec = snapshot.resolve_devspec(devspec, sysname=True) or devspec
+
+            if fstype == "btrfs":
+                subvolspec = root[1:] or str(btrfs.MAIN_VOLUME_ID)
+            else:
+                subvolspec = None
+
+            mountpoints[(devspec, subvolspec)].append(mountpoint)
+            mounted[mountpoint] = mounted.get(mountpoint, 0) + 1
+
+        # readers holding on to the previous dicts keep a consistent view
+        (self.mountpoints, self._mounted, self._snapshot) = (mountpoints, mounted, snapshot)
 
     def _cacheCheck(self):
-        """ Computes the MD5 hash on /proc/mounts and updates the cache on change
-        """
+        """ Updates the cache if the mount table changed since the last check
+
+            The kernel flags /proc/self/mountinfo with POLLPRI and POLLERR
+            whenever something gets mounted or unmounted.
 
-        md5hash = util.md5_file("/proc/mounts")
+            Call this holding the lock.
+        """
+        if self._poller is None:
+            try:
+                self._mountinfo = open("/proc/self/mountinfo")
+                self._poller = select.poll()
+                self._poller.register(self._mountinfo, select.POLLPRI | select.POLLERR)
+            except (IOError, OSError, AttributeError) as e:
+                log.debug("cannot watch /proc/self/mountinfo for changes: %s", e)
+                if self._mountinfo is not None:
+                    self._mountinfo.close()
+                    self._mountinfo = None
+                self._poller = None
+                self._getActiveMounts()
+                return
 
-        if md5hash != self.mountsHash:
-            self.mountsHash = md5hash
+            self._getActiveMounts()
+        elif self._poller.poll(0):
             self._getActiveMounts()
 
 mountsCache = MountsCache()
@@ -22,8 +22,11 @@
 
 import shlex
 import os
+import shutil
 import stat
+import tempfile
 import time
+from multiprocessing.pool import ThreadPool
 
 import gi
 gi.require_version("BlockDev", "1.0")
@@ -35,6 +38,7 @@ from . import getSysroot, getTargetPhysicalRoot, errorHandler, ERROR_RAISE
 from .util import open  # pylint: disable=redefined-builtin
 
 from .storage_log import log_exception_info
+from .devicelibs import superblock
 from .devices import FileDevice, NFSDevice, NoDevice, OpticalDevice, NetworkStorageDevice, DirectoryDevice
 from .errors import FSTabTypeMismatchError, UnrecognizedFSTabEntryError, StorageError, FSResizeError, UnknownSourceDeviceError
 from .formats import get_device_format_class
@@ -112,39 +116,48 @@ def releaseFromOsRelease(fn):
 
     return (relName, relVer)
 
-def getReleaseString():
+def getReleaseString(chroot=None):
     """
     Attempt to identify the installation of a Linux distribution by checking
     a previously mounted filesystem for several files.  The filesystem must
     be mounted under the target physical root.
 
+    :keyword str chroot: where the filesystem is mounted (default: sysroot)
     :returns: The machine's arch, distribution name, and distribution version
     or None for any parts that cannot be determined
     :rtype: (string, string, string)
     """
     relName = None
     relVer = None
+    chroot = chroot or getSysroot()
 
     try:
-        relArch = util.capture_output(["arch"], root=getSysroot()).strip()
+        relArch = util.capture_output(["arch"], root=chroot).strip()
     except OSError:
         relArch = None
 
-    filename = "%s/etc/redhat-release" % getSysroot()
+    filename = "%s/etc/redhat-release" % chroot
     if os.access(filename, os.R_OK):
         (relName, relVer) = releaseFromRedhatRelease(filename)
     else:
-        filename = "%s/etc/os-release" % getSysroot()
+        filename = "%s/etc/os-release" % chroot
         if os.access(filename, os.R_OK):
             (relName, relVer) = releaseFromOsRelease(filename)
 
     return (relArch, relName, relVer)
 
-def parseFSTab(devicetree, chroot=None):
-    """ parse /etc/fstab and return a tuple of a mount dict and swap list """
+def parseFSTab(devicetree, chroot=None, nodeCache=None):
+    """ parse /etc/fstab and return a tuple of a mount dict and swap list
+
+        :keyword dict nodeCache: device nodes resolved earlier in the same pass
+                                 (see :meth:`~.devicetree.DeviceTree.resolveDevice`)
+    """
     if not chroot or not os.path.isdir(chroot):
         chroot = getSysroot()
 
+    if nodeCache is None:
+        nodeCache = {}
+
     mounts = {}
     swaps = []
     path = "%s/etc/fstab" % chroot
@@ -163,7 +176,7 @@ def parseFSTab(devicetree, chroot=None):
 
     cryptTab = CryptTab(devicetree, blkidTab=blkidTab, chroot=chroot)
     try:
-        cryptTab.parse(chroot=chroot)
+        cryptTab.parse(chroot=chroot, nodeCache=nodeCache)
         log.debug("crypttab maps: %s", list(cryptTab.mappings.keys()))
     except Exception: # pylint: disable=broad-except
         log_exception_info(log.info, "error parsing crypttab")
@@ -185,7 +198,8 @@ def parseFSTab(devicetree, chroot=None):
             device = devicetree.resolveDevice(devspec,
                                               cryptTab=cryptTab,
                                               blkidTab=blkidTab,
-                                              options=options)
+                                              options=options,
+                                              nodeCache=nodeCache)
 
             if device is None:
                 continue
@@ -218,11 +232,174 @@ def findExistingInstallations(devicetree, teardown_all=True):
 
     return []
 
-def _findExistingInstallations(devicetree):
-    if not os.path.exists(getTargetPhysicalRoot()):
-        util.makedirs(getTargetPhysicalRoot())
+# files describing the storage of an installation, read by parseFSTab
+_INSTALLATION_FILES = ("etc/fstab", "etc/crypttab", "etc/blkid/blkid.tab")
 
-    roots = []
+# whether to keep what _probeInstallation found on a filesystem for later
+# calls, so that unchanged filesystems are not mounted again
+CACHE_INSTALLATIONS = False
+
+# (format UUID, superblock fingerprint) -> what _probeInstallation found on
+# the filesystem
+_installations = {}
+
+def invalidate_cache():
+    """ Drop all cached results of probing filesystems for installations. """
+    _installations.clear()
+
+def _installationKey(device):
+    """ Return the key of a filesystem in _installations or None.
+
+        Filesystems that are mounted are not cached, as their superblock
+        fingerprint does not change while they are written to.
+    """
+    if not CACHE_INSTALLATIONS or not device.format.uuid or \
+       device.format.systemMountpoint is not None:
+        return None
+
+    fingerprint = superblock.fingerprint(device.path, device.format.type)
+    if fingerprint is None:
+        return None
+
+    return (device.format.uuid, fingerprint)
+
+def _installationName(device, release):
+    if release is None:
+        return _("Linux on %s") % device.name
+
+    (architecture, product, version) = release
+    # I'd like to make this finer grained, but it'd be very difficult
+    # to translate.
+    if not product or not version or not architecture:
+        name = _("Unknown Linux")
+    elif "linux" in product.lower():
+        name = _("%(product)s %(version)s for %(arch)s") % \
+                {"product": product, "version": version, "arch": architecture}
+    else:
+        name = _("%(product)s Linux %(version)s for %(arch)s") % \
+                {"product": product, "version": version, "arch": architecture}
+
+    return name
+
+def _probeInstallation(device, mountpoint):
+    """ Look for an installation on a filesystem.
+
+        :param device: the device containing the filesystem
+        :type device: :class:`~.devices.StorageDevice`
+        :param str mountpoint: where to mount the filesystem
+        :returns: whether the filesystem could be mounted and, if it contains
+                  an /etc/fstab, a tuple of the release string (or None if it
+                  cannot be determined) and a dict mapping the paths in
+                  _INSTALLATION_FILES to their contents (or None)
+        :rtype: tuple
+    """
+    options = device.format.options + ",ro"
+    try:
+        device.format.mount(options=options, mountpoint=mountpoint)
+    except Exception: # pylint: disable=broad-except
+        log_exception_info(log.warning, "mount of %s as %s failed", [device.name, device.format.type])
+        util.umount(mountpoint=mountpoint)
+        return (False, None)
+
+    try:
+        if not os.access(mountpoint + "/etc/fstab", os.R_OK):
+            return (True, None)
+
+        try:
+            release = getReleaseString(chroot=mountpoint)
+        except ValueError:
+            release = None
+
+        files = {}
+        for path in _INSTALLATION_FILES:
+            try:
+                with open(os.path.join(mountpoint, path)) as f:
+                    files[path] = f.read()
+            except IOError:
+                files[path] = None
+
+        return (True, (release, files))
+    finally:
+        util.umount(mountpoint=mountpoint)
+
+def _probeInTemporaryMountpoint(device):
+    mountpoint = tempfile.mkdtemp(prefix="blivet-%s." % device.name.replace("/", "-"))
+    result = _probeInstallation(device, mountpoint)
+    try:
+        os.rmdir(mountpoint)
+    except OSError as e:
+        log.warning("failed to remove temporary mountpoint %s: %s", mountpoint, e)
+
+    return result
+
+def _findInstallation(device, mountpoint):
+    """ Run _probeInstallation for a device unless its result is cached. """
+    key = _installationKey(device)
+    if key in _installations:
+        log.debug("%s has not changed since it was last probed", device.name)
+        return (True, _installations[key])
+
+    (mounted, info) = _probeInstallation(device, mountpoint)
+    if mounted and key is not None:
+        _installations[key] = info
+
+    return (mounted, info)
+
+def _findInstallations(devices):
+    """ Run _findInstallation for each device concurrently.
+
+        Each filesystem is mounted at its own temporary mountpoint, with at
+        most :attr:`~.flags.Flags.installation_workers` of them at a time.
+
+        :returns: a (device, result) pair for each device
+        :rtype: list of tuple
+    """
+    results = {}
+    keys = {}
+    for device in devices:
+        keys[device.id] = _installationKey(device)
+        if keys[device.id] in _installations:
+            log.debug("%s has not changed since it was last probed", device.name)
+            results[device.id] = (True, _installations[keys[device.id]])
+
+    probed = [d for d in devices if d.id not in results]
+    if probed:
+        workers = min(flags.installation_workers, len(probed))
+        log.debug("probing %d filesystems for installations in %d threads",
+                  len(probed), workers)
+        pool = ThreadPool(workers)
+        try:
+            probes = pool.map(_probeInTemporaryMountpoint, probed)
+        finally:
+            pool.close()
+            pool.join()
+
+        for (device, (mounted, info)) in zip(probed, probes):
+            results[device.id] = (mounted, info)
+            if mounted and keys[device.id] is not None:
+                _installations[keys[device.id]] = info
+
+    return [(device, results[device.id]) for device in devices]
+
+def _parseInstallation(devicetree, files, nodeCache):
+    """ Run parseFSTab on a copy of an installation's files. """
+    chroot = tempfile.mkdtemp(prefix="blivet-installation.")
+    try:
+        for (path, contents) in files.items():
+            if contents is None:
+                continue
+
+            path = os.path.join(chroot, path)
+            util.makedirs(os.path.dirname(path))
+            with open(path, "w") as f:
+                f.write(contents)
+
+        return parseFSTab(devicetree, chroot=chroot, nodeCache=nodeCache)
+    finally:
+        shutil.rmtree(chroot)
+
+def _setupCandidates(devicetree):
+    """ Set up the devices that may contain an installation, one at a time. """
     for device in devicetree.leaves:
         if not device.format.linuxNative or not device.format.mountable or \
            not device.controllable:
@@ -234,41 +411,41 @@ def _findExistingInstallations(devicetree):
             log_exception_info(log.warning, "setup of %s failed", [device.name])
             continue
 
-        options = device.format.options + ",ro"
-        try:
-            device.format.mount(options=options, mountpoint=getSysroot())
-        except Exception: # pylint: disable=broad-except
-            log_exception_info(log.warning, "mount of %s as %s failed", [device.name, device.format.type])
-            util.umount(mountpoint=getSysroot())
-            continue
+        yield device
 
-        if not os.access(getSysroot() + "/etc/fstab", os.R_OK):
-            util.umount(mountpoint=getSysroot())
+def _findExistingInstallations(devicetree):
+    if not os.path.exists(getTargetPhysicalRoot()):
+        util.makedirs(getTargetPhysicalRoot())
+
+    if flags.installation_workers < 2:
+        # set up, probe and tear down one device after another
+        found = ((device, _findInstallation(device, getSysroot()))
+                 for device in _setupCandidates(devicetree))
+    else:
+        # device setup changes the tree, so only the probes run concurrently
+        found = _findInstallations(list(_setupCandidates(devicetree)))
+
+    installations = []
+    for (device, (mounted, info)) in found:
+        if not mounted:
+            continue
+        elif info is None:
             device.teardown(recursive=True)
             continue
 
-        try:
-            (architecture, product, version) = getReleaseString()
-        except ValueError:
-            name = _("Linux on %s") % device.name
-        else:
-            # I'd like to make this finer grained, but it'd be very difficult
-            # to translate.
-            if not product or not version or not architecture:
-                name = _("Unknown Linux")
-            elif "linux" in product.lower():
-                name = _("%(product)s %(version)s for %(arch)s") % \
-                        {"product": product, "version": version, "arch": architecture}
-            else:
-                name = _("%(product)s Linux %(version)s for %(arch)s") % \
-                        {"product": product, "version": version, "arch": architecture}
+        installations.append((device, info))
 
-        (mounts, swaps) = parseFSTab(devicetree, chroot=getSysroot())
-        util.umount(mountpoint=getSysroot())
+    # no devices are set up or torn down from here on, so the device nodes
+    # can be resolved once for all the installations
+    nodeCache = {}
+    roots = []
+    for (device, (release, files)) in installations:
+        (mounts, swaps) = _parseInstallation(devicetree, files, nodeCache)
         if not mounts and not swaps:
             # empty /etc/fstab. weird, but I've seen it happen.
             continue
-        roots.append(Root(mounts=mounts, swaps=swaps, name=name))
+        roots.append(Root(mounts=mounts, swaps=swaps,
+                          name=_installationName(device, release)))
 
     return roots
 
@@ -364,11 +541,13 @@ class FSSet(object):
                 filesystems[device.format.mountpoint] = device
         return filesystems
 
-    def _parseOneLine(self, devspec, mountpoint, fstype, options, _dump="0", _passno="0"):
+    def _parseOneLine(self, devspec, mountpoint, fstype, options, _dump="0", _passno="0",
+                      nodeCache=None):
         """Parse an fstab entry for a device, return the corresponding device.
 
            The parameters correspond to the items in a single entry in the
-           order in which they occur in the entry.
+           order in which they occur in the entry, nodeCache holds the device
+           nodes resolved for earlier entries.
 
            :returns: the device corresponding to the entry
            :rtype: :class:`devices.Device`
@@ -383,7 +562,8 @@ class FSSet(object):
         device = self.devicetree.resolveDevice(devspec,
                                                cryptTab=self.cryptTab,
                                                blkidTab=self.blkidTab,
-                                               options=options)
+                                               options=options,
+                                               nodeCache=nodeCache)
 
         if device:
             # fall through to the bottom of this block
@@ -488,6 +668,9 @@ class FSSet(object):
             log.info("cannot open %s for read", path)
             return
 
+        # device nodes resolved while parsing this fstab and crypttab
+        nodeCache = {}
+
         blkidTab = BlkidTab(chroot=chroot)
         try:
             blkidTab.parse()
@@ -498,7 +681,7 @@ class FSSet(object):
 
         cryptTab = CryptTab(self.devicetree, blkidTab=blkidTab, chroot=chroot)
         try:
-            cryptTab.parse(chroot=chroot)
+            cryptTab.parse(chroot=chroot, nodeCache=nodeCache)
             log.debug("crypttab maps: %s", list(cryptTab.mappings.keys()))
         except Exception: # pylint: disable=broad-except
             log_exception_info(log.info, "error parsing crypttab")
@@ -524,7 +707,7 @@ class FSSet(object):
                     continue
 
                 try:
-                    device = self._parseOneLine(*fields)
+                    device = self._parseOneLine(*fields, nodeCache=nodeCache)
                 except UnrecognizedFSTabEntryError:
                     # just write the line back out as-is after upgrade
                     self.preserveLines.append(line)
@@ -976,8 +1159,12 @@ class CryptTab(object):
         self.chroot = chroot
         self.mappings = {}
 
-    def parse(self, chroot=""):
-        """ Parse /etc/crypttab from an existing installation. """
+    def parse(self, chroot="", nodeCache=None):
+        """ Parse /etc/crypttab from an existing installation.
+
+            :keyword dict nodeCache: device nodes resolved earlier in the same
+                                     pass (see :meth:`~.devicetree.DeviceTree.resolveDevice`)
+        """
         if not chroot or not os.path.isdir(chroot):
             chroot = ""
 
@@ -1006,7 +1193,8 @@ class CryptTab(object):
 
                 # resolve devspec to a device in the tree
                 device = self.devicetree.resolveDevice(devspec,
-                                                       blkidTab=self.blkidTab)
+                                                       blkidTab=self.blkidTab,
+                                                       nodeCache=nodeCache)
                 if device:
                     self.mappings[name] = {"device": device,
                                            "keyfile": keyfile,
@@ -584,6 +584,9 @@ def doPartitioning(storage):
         # these are only valid for one allocation run
         storage.size_sets = []
 
+        # the partitions' sizes and the disks' free space have changed
+        storage.devicetree.bumpRevision()
+
         # The number and thus the name of partitions may have changed now,
         # allocatePartitions() takes care of this for new partitions, but not
         # for pre-existing ones, so we update the name of all partitions here
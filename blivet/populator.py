@@ -26,6 +26,7 @@ import shutil
 import pprint
 import copy
 import parted
+from multiprocessing.pool import ThreadPool
 
 import gi
 gi.require_version("BlockDev", "1.0")
@@ -52,7 +53,7 @@ from . import udev
 from . import util
 from .util import open  # pylint: disable=redefined-builtin
 from .flags import flags
-from .storage_log import log_exception_info, log_method_call
+from .storage_log import log_exception_info, log_method_call, log_method_span
 from .i18n import _
 from .size import Size
 
@@ -71,6 +72,87 @@ def parted_exn_handler(exn_type, exn_options, exn_msg):
         ret = parted.EXCEPTION_RESOLVE_YES
     return ret
 
+# Read-only queries run while adding devices to the tree. Each of them only
+# depends on its arguments, so they can be run ahead of time and concurrently.
+#
+# Format detection itself uses the blkid results in the udev database and
+# needs no probe. Disklabels are still read serially by pyparted, which holds
+# the GIL and is not thread-safe. Filesystem size information is no longer
+# gathered while populating (see FS.loadSizeInfo).
+_PROBES = {
+    "sysfs_attr": lambda path, attr: util.get_sysfs_attr(path, attr),
+    "loop_backing_file": lambda name: blockdev.loop.get_backing_file(name),
+    "mpath_member": lambda path: blockdev.mpath.is_mpath_member(path),
+    "md_examine": lambda path: blockdev.md.examine(path),
+    "dmraid_sets": lambda uuid, name, major, minor:
+        blockdev.dm.get_member_raid_sets(uuid, name, major, minor),
+}
+
+def _plannedProbes(info):
+    """ Return the probes that adding a udev device is expected to run.
+
+        :param :class:`pyudev.Device` info: udev info for the device
+        :returns: (probe name, arguments) pairs
+        :rtype: list of tuple
+    """
+    name = udev.device_get_name(info)
+    sysfs_path = udev.device_get_sysfs_path(info)
+    devname = udev.device_get_devname(info)
+    is_disk = udev.device_is_disk(info)
+
+    probes = []
+    if name.startswith("loop"):
+        probes.append(("loop_backing_file", (name,)))
+
+    if sysfs_path:
+        probes.append(("sysfs_attr", (sysfs_path, "ro")))
+        if is_disk:
+            probes.append(("sysfs_attr", (sysfs_path, "device/vendor")))
+            probes.append(("sysfs_attr", (sysfs_path, "device/model")))
+
+    if devname:
+        if is_disk:
+            probes.append(("mpath_member", (devname,)))
+        if udev.device_get_format(info) in formats.mdraid.MDRaidMember._udevTypes:
+            probes.append(("md_examine", (devname,)))
+
+    if flags.dmraid and \
+       udev.device_get_format(info) in formats.dmraid.DMRaidMember._udevTypes:
+        probes.append(("dmraid_sets", (udev.device_get_uuid(info), name,
+                                       udev.device_get_major(info),
+                                       udev.device_get_minor(info))))
+
+    return probes
+
+def _relatedSysfsPaths(sysfs_path):
+    """ Return the sysfs paths of a block device's partitions and holders.
+
+        :param str sysfs_path: the block device's sysfs path
+        :rtype: list of str
+    """
+    paths = []
+    for subdir in ("", "holders"):
+        try:
+            names = os.listdir(os.path.join(sysfs_path, subdir))
+        except OSError:
+            continue
+
+        for name in sorted(names):
+            path = os.path.realpath(os.path.join(sysfs_path, subdir, name))
+            # only block devices have a dev attribute
+            if path != sysfs_path and os.path.exists(os.path.join(path, "dev")):
+                paths.append(path)
+
+    return paths
+
+def _runProbe(probe):
+    """ Run a probe, returning its result and the exception it raised. """
+    (name, args) = probe
+    try:
+        return (_PROBES[name](*args), None)
+    except Exception as e: # pylint: disable=broad-except
+        return (None, e)
+
 class Populator(object):
     def __init__(self, devicetree=None, conf=None, passphrase=None,
                  luksDict=None, iscsi=None, dasd=None):
@@ -80,7 +162,7 @@ class Populator(object):
             :keyword passphrase: default LUKS passphrase
             :keyword luksDict: a dict with UUID keys and passphrase values
             :type luksDict: dict
-            :keyword iscsi: ISCSI control object
+            :keyword iscsi: ISCSI control object, default is the global one
             :type iscsi: :class:`~.iscsi.iscsi`
             :keyword dasd: DASD control object
             :type dasd: :class:`~.dasd.DASD`
@@ -93,7 +175,7 @@ class Populator(object):
 
         self.exclusiveDisks = getattr(conf, "exclusiveDisks", [])
         self.ignoredDisks = getattr(conf, "ignoredDisks", [])
-        self.iscsi = iscsi
+        self._iscsi = iscsi
         self.dasd = dasd
 
         self.diskImages = {}
@@ -122,6 +204,18 @@ class Populator(object):
 
         self._cleanup = False
 
+        self._probed = {}
+        """ results of the probes run ahead of the devices being added """
+
+    @property
+    def iscsi(self):
+        """ The ISCSI control object, imported when an iscsi disk is found. """
+        if self._iscsi is None:
+            from . import iscsi
+            self._iscsi = iscsi.iscsi()
+
+        return self._iscsi
+
     def setDiskImages(self, images):
         """ Set the disk images and reflect them in exclusiveDisks.
 
@@ -138,6 +232,53 @@ class Populator(object):
         # disk image files are automatically exclusive
         self.exclusiveDisks = list(self.diskImages.keys())
 
+    def _probe(self, name, *args):
+        """ Return the result of a device probe.
+
+            :param str name: the name of the probe (a key of _PROBES)
+            :param args: the probe's arguments
+
+            A result obtained by :meth:`_prefetchProbes` is used if there is
+            one, otherwise the probe is run.
+        """
+        try:
+            (result, error) = self._probed[(name, args)]
+        except KeyError:
+            return _PROBES[name](*args)
+
+        if error is not None:
+            raise error
+
+        return result
+
+    def _prefetchProbes(self, devices):
+        """ Run the probes for a batch of udev devices concurrently.
+
+            :param devices: udev info for the devices about to be added
+            :type devices: list of :class:`pyudev.Device`
+
+            This only runs the read-only probes, and only if
+            :attr:`~.flags.Flags.populate_workers` allows more than one thread.
+            The devices themselves are still added one at a time, in order.
+        """
+        if flags.populate_workers < 2:
+            return
+
+        probes = list(set(p for info in devices for p in _plannedProbes(info)))
+        if not probes:
+            return
+
+        log.debug("running %d device probes in %d threads", len(probes),
+                  min(flags.populate_workers, len(probes)))
+        pool = ThreadPool(min(flags.populate_workers, len(probes)))
+        try:
+            results = pool.map(_runProbe, probes)
+        finally:
+            pool.close()
+            pool.join()
+
+        self._probed.update(zip(probes, results))
+
     def addIgnoredDisk(self, disk):
         self.ignoredDisks.append(disk)
         lvm.lvm_cc_addFilterRejectRegexp(disk)
@@ -195,7 +336,7 @@ class Populator(object):
 
         if name.startswith("loop"):
             # ignore loop devices unless they're backed by a file
-            return (not blockdev.loop.get_backing_file(name))
+            return (not self._probe("loop_backing_file", name))
 
         # FIXME: check for virtual devices whose slaves are on the ignore list
 
@@ -482,8 +623,8 @@ class Populator(object):
         serial = udev.device_get_serial(info)
         bus = udev.device_get_bus(info)
 
-        vendor = util.get_sysfs_attr(sysfs_path, "device/vendor")
-        model = util.get_sysfs_attr(sysfs_path, "device/model")
+        vendor = self._probe("sysfs_attr", sysfs_path, "device/vendor")
+        model = self._probe("sysfs_attr", sysfs_path, "device/model")
 
         kwargs = { "serial": serial, "vendor": vendor, "model": model, "bus": bus }
         if udev.device_is_iscsi(info) and not self._cleanup:
@@ -610,6 +751,7 @@ class Populator(object):
         self.devicetree._addDevice(device)
         return device
 
+    @log_method_span
     def addUdevDevice(self, info, updateOrigFmt=False):
         """
             :param :class:`pyudev.Device` info: udev info for the device
@@ -621,7 +763,8 @@ class Populator(object):
             will not be updated unless updateOrigFmt is True.
         """
         name = udev.device_get_name(info)
-        log_method_call(self, name=name, info=pprint.pformat(dict(info)))
+        if log.isEnabledFor(logging.DEBUG):
+            log_method_call(self, name=name, info=pprint.pformat(dict(info)))
         uuid = udev.device_get_uuid(info)
         sysfs_path = udev.device_get_sysfs_path(info)
 
@@ -683,7 +826,7 @@ class Populator(object):
                 device = None
 
         if device and device.isDisk and \
-           blockdev.mpath.is_mpath_member(device.path):
+           self._probe("mpath_member", device.path):
             # newly added device (eg iSCSI) could make this one a multipath member
             if device.format and device.format.type != "multipath_member":
                 log.debug("%s newly detected as multipath member, dropping old format and removing kids", device.name)
@@ -733,7 +876,7 @@ class Populator(object):
 
         # If this device is read-only, mark it as such now.
         if self.udevDeviceIsDisk(info) and \
-                util.get_sysfs_attr(udev.device_get_sysfs_path(info), 'ro') == '1':
+                self._probe("sysfs_attr", udev.device_get_sysfs_path(info), "ro") == '1':
             device.readonly = True
 
         # If this device is protected, mark it as such now. Once the tree
@@ -872,8 +1015,8 @@ class Populator(object):
     def handleVgLvs(self, vg_device):
         """ Handle setup of the LV's in the vg_device. """
         vg_name = vg_device.name
-        lv_info = dict((k, v) for (k, v) in iter(self.devicetree.lvInfo.items())
-                                if v.vg_name == vg_name)
+        lvm_report = self.devicetree.lvmReport
+        lv_info = lvm_report.vgLVs(vg_name)
 
         self.names.extend(n for n in lv_info.keys() if n not in self.names)
 
@@ -933,7 +1076,7 @@ class Populator(object):
 
             if lv_attr[0] in 'Ss':
                 log.info("found lvm snapshot volume '%s'", name)
-                origin_name = blockdev.lvm.lvorigin(vg_name, lv_name)
+                origin_name = lvm_report.origin(vg_name, lv_name)
                 if not origin_name:
                     log.error("lvm snapshot '%s-%s' has unknown origin",
                                 vg_name, lv_name)
@@ -964,11 +1107,11 @@ class Populator(object):
                 lv_class = LVMThinPoolDevice
             elif lv_attr[0] == 'V':
                 # thin volume
-                pool_name = blockdev.lvm.thlvpoolname(vg_name, lv_name)
+                pool_name = lvm_report.poolLV(vg_name, lv_name)
                 pool_device_name = "%s-%s" % (vg_name, pool_name)
                 addRequiredLV(pool_device_name, "failed to look up thin pool")
 
-                origin_name = blockdev.lvm.lvorigin(vg_name, lv_name)
+                origin_name = lvm_report.origin(vg_name, lv_name)
                 if origin_name:
                     origin_device_name = "%s-%s" % (vg_name, origin_name)
                     addRequiredLV(origin_device_name, "failed to locate origin lv")
@@ -1076,7 +1219,8 @@ class Populator(object):
         # assign parents to internal LVs (and vice versa, see
         # :class:`~.devices.lvm.LVMInternalLogicalVolumeDevice`)
         for lv in orphan_lvs.values():
-            parent_lv = lvm.determine_parent_lv(vg_name, lv, all_lvs)
+            parent_lv = lvm.determine_parent_lv(vg_name, lv, all_lvs,
+                                                report=lvm_report)
             if parent_lv:
                 lv.parent_lv = parent_lv
             else:
@@ -1133,7 +1277,7 @@ class Populator(object):
     def handleUdevMDMemberFormat(self, info, device):
         # pylint: disable=unused-argument
         log_method_call(self, name=device.name, type=device.format.type)
-        md_info = blockdev.md.examine(device.path)
+        md_info = self._probe("md_examine", device.path)
 
         # Use mdadm info if udev info is missing
         md_uuid = md_info.uuid
@@ -1242,7 +1386,7 @@ class Populator(object):
         minor = udev.device_get_minor(info)
 
         # Have we already created the DMRaidArrayDevice?
-        rs_names = blockdev.dm.get_member_raid_sets(uuid, name, major, minor)
+        rs_names = self._probe("dmraid_sets", uuid, name, major, minor)
         if len(rs_names) == 0:
             log.warning("dmraid member %s does not appear to belong to any "
                         "array", device.name)
@@ -1357,7 +1501,7 @@ class Populator(object):
         serial = udev.device_get_serial(info)
 
         is_multipath_member = (device.isDisk and
-                               blockdev.mpath_is_mpath_member(device.path))
+                               self._probe("mpath_member", device.path))
         if is_multipath_member:
             format_type = "multipath_member"
 
@@ -1607,6 +1751,7 @@ class Populator(object):
             self.__luksDevs[device.format.uuid] = passphrase
             self.__passphrases.append(passphrase)
 
+    @log_method_span
     def populate(self, cleanupOnly=False):
         """ Locate all storage devices.
 
@@ -1630,6 +1775,101 @@ class Populator(object):
             parted.clear_exn_handler()
             self.restoreConfigs()
 
+    def update(self, sysfsPaths):
+        """ Update the tree for changes to the specified block devices.
+
+            :param sysfsPaths: sysfs paths of added, changed or removed devices
+            :type sysfsPaths: list of str
+
+            Devices that no longer exist are removed from the tree along with
+            their dependents. Devices that changed lose their dependents and
+            have their formatting detected again. New devices are added, as is
+            partitions and holders of the updated devices that have appeared
+            since (eg: the partitions on a changed disk). Nothing else is
+            scanned.
+        """
+        if list(self.devicetree.actions):
+            raise DeviceTreeError("cannot update devices while actions are scheduled")
+
+        self.backupConfigs()
+        parted.register_exn_handler(parted_exn_handler)
+        try:
+            self._update(sysfsPaths)
+        finally:
+            parted.clear_exn_handler()
+            self.restoreConfigs()
+
+    def _dropDevice(self, device):
+        """ Remove a device and its dependents from the tree, without actions. """
+        self.devicetree.recursiveRemove(device, actions=False)
+        if self.devicetree.getDeviceByID(device.id, incomplete=True) is device:
+            # recursiveRemove only strips disks of their formatting
+            self.devicetree._removeDevice(device, force=True)
+
+    def _update(self, sysfsPaths):
+        self.devicetree.dropLVMCache()
+        scanned = set()
+        for sysfs_path in sysfsPaths:
+            info = udev.get_device(sysfs_path)
+            device = self.devicetree.getDeviceBySysfsPath(sysfs_path,
+                                                          incomplete=True)
+            if info is None:
+                if device is not None:
+                    log.info("%s is gone, removing it", device.name)
+                    self._dropDevice(device)
+                continue
+
+            scanned.add(udev.device_get_name(info))
+            if device is None:
+                self.addUdevDevice(info)
+                continue
+
+            log.info("rescanning %s", device.name)
+            # reversed, so logical partitions go before the extended partition
+            for child in reversed(self.devicetree.getChildren(device)):
+                if self.devicetree.getDeviceByID(child.id, incomplete=True) is child:
+                    self._dropDevice(child)
+
+            # the device itself may have changed too (eg: a resized disk)
+            sysfs_path = udev.device_get_sysfs_path(info)
+            if device.sysfsPath != sysfs_path:
+                device.sysfsPath = sysfs_path
+            device.updateSize()
+
+            if not device.formatImmutable:
+                device.format = None
+
+            self.addUdevDevice(info, updateOrigFmt=True)
+
+        # add any devices that appeared below the updated ones
+        updated = [p for p in sysfsPaths if udev.get_device(p) is not None]
+        while updated:
+            devices = []
+            for path in (r for p in updated for r in _relatedSysfsPaths(p)):
+                info = udev.get_device(path)
+                if info is None:
+                    continue
+
+                name = udev.device_get_name(info)
+                if name not in self.names and name not in scanned:
+                    scanned.add(name)
+                    devices.append(info)
+
+            if not devices:
+                break
+
+            updated = [udev.device_get_sysfs_path(d) for d in devices]
+
+            log.info("devices to scan: %s", [udev.device_get_name(d) for d in devices])
+            self._prefetchProbes(devices)
+            try:
+                for dev in devices:
+                    self.addUdevDevice(dev)
+            finally:
+                self._probed.clear()
+
+        self._handleInconsistencies()
+
     def _populate(self):
         log.info("DeviceTree.populate: ignoredDisks is %s ; exclusiveDisks is %s",
                     self.ignoredDisks, self.exclusiveDisks)
@@ -1646,8 +1886,9 @@ class Populator(object):
         self.populated = False
 
         # resolve the protected device specs to device names
+        snapshot = udev.DeviceSnapshot()
         for spec in self.protectedDevSpecs:
-            name = udev.resolve_devspec(spec)
+            name = snapshot.resolve_devspec(spec)
             log.debug("protected device spec %s resolved to %s", spec, name)
             if name:
                 self.protectedDevNames.append(name)
@@ -1685,8 +1926,13 @@ class Populator(object):
                 break
 
             log.info("devices to scan: %s", [udev.device_get_name(d) for d in devices])
-            for dev in devices:
-                self.addUdevDevice(dev)
+            self._prefetchProbes(devices)
+            try:
+                for dev in devices:
+                    self.addUdevDevice(dev)
+            finally:
+                # the results are only good for the devices they were run for
+                self._probed.clear()
 
         self.populated = True
 
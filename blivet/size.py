@@ -142,6 +142,9 @@ def parseUnits(spec, xlate):
         spec = spec.lower()
     else:
         spec = _lowerASCII(spec)
+        unit = _ENGLISH_UNITS.get(spec)
+        if unit is not None:
+            return unit
 
     # Search for complete matches
     for unit in [_EMPTY_PREFIX] + _BINARY_PREFIXES + _DECIMAL_PREFIXES:
@@ -156,6 +159,43 @@ def parseUnits(spec, xlate):
 
     return None
 
+
+# The purpose of this regular expression is to distinguish
+# between the numeric part and the part that specifies the units.
+# The regular expression that matches the numeric part of the spec
+# should recognize all valid numbers and should not include any part
+# of the unit specifier in the string that it recognizes. It may
+# recognize strings that are not valid numbers as well, if it does
+# some other part of the implementation is expected to recognize that
+# the number is invalid and raise an exception.
+# Specifically, the string "0.9.9 KiB" will be matched, and the numeric
+# part will match "0.9.9". This is not a valid number, but that will
+# be detected when an exception is raised during conversion of the numeric
+# part to a numeric value.
+_SPEC_RE = re.compile(
+   r"""(?P<numeric> # the numeric part consists of three parts, below
+       (-|\+)? # optional sign character
+       (?P<base>([0-9\.]+)) # the base
+       (?P<exp>(e|E)(-|\+)[0-9]+)?) # optional exponent
+       \s* # whitespace
+       (?P<rest>[^\s]*$) # the units specification
+    """,
+    re.VERBOSE
+)
+
+# English unit specifiers (lowercase) -> unit, for exact matches in parseUnits
+_ENGLISH_UNITS = {}
+for _unit in [_EMPTY_PREFIX] + _BINARY_PREFIXES + _DECIMAL_PREFIXES:
+    for _word in (_makeSpec(_unit.abbr, _BYTES_SYMBOL, False),
+                  _makeSpec(_unit.prefix, _BYTES_WORDS[0], False),
+                  _makeSpec(_unit.prefix, _BYTES_WORDS[1], False)):
+        _ENGLISH_UNITS.setdefault(_word, _unit)
+del _unit, _word
+
+# (spec, radix) -> value of the English size specifications parsed so far
+_SPEC_CACHE = {}
+_SPEC_CACHE_SIZE = 1024
+
 def parseSpec(spec):
     """ Parse string representation of size.
 
@@ -168,39 +208,26 @@ def parseSpec(spec):
 
         Tries to parse the spec first as English, if that fails, as
         a locale specific string.
+
+        Results of specs parsed as English do not depend on the language
+        and are cached, since the same constant specs are parsed over and
+        over again.
     """
 
     if not spec:
         raise ValueError("invalid size specification", spec)
 
-    # Replace the localized radix character with a .
     radix = locale.nl_langinfo(locale.RADIXCHAR)
+    key = (spec, radix)
+    size = _SPEC_CACHE.get(key)
+    if size is not None:
+        return size
+
+    # Replace the localized radix character with a .
     if radix != '.':
         spec = spec.replace(radix, '.')
 
-    # The purpose of this regular expression is to distinguish
-    # between the numeric part and the part that specifies the units.
-    # The regular expression that matches the numeric part of the spec
-    # should recognize all valid numbers and should not include any part
-    # of the unit specifier in the string that it recognizes. It may
-    # recognize strings that are not valid numbers as well, if it does
-    # some other part of the implementation is expected to recognize that
-    # the number is invalid and raise an exception.
-    # Specifically, the string "0.9.9 KiB" will be matched, and the numeric
-    # part will match "0.9.9". This is not a valid number, but that will
-    # be detected when an exception is raised during conversion of the numeric
-    # part to a numeric value.
-    spec_re = re.compile(
-       r"""(?P<numeric> # the numeric part consists of three parts, below
-           (-|\+)? # optional sign character
-           (?P<base>([0-9\.]+)) # the base
-           (?P<exp>(e|E)(-|\+)[0-9]+)?) # optional exponent
-           \s* # whitespace
-           (?P<rest>[^\s]*$) # the units specification
-        """,
-        re.VERBOSE
-    )
-    m = re.match(spec_re, spec.strip())
+    m = _SPEC_RE.match(spec.strip())
     if not m:
         raise ValueError("invalid size specification", spec)
 
@@ -223,7 +250,11 @@ def parseSpec(spec):
     else:
         unit = parseUnits(spec_ascii, False)
         if unit is not None:
-            return size * unit.factor
+            size = size * unit.factor
+            if len(_SPEC_CACHE) >= _SPEC_CACHE_SIZE:
+                _SPEC_CACHE.clear()
+            _SPEC_CACHE[key] = size
+            return size
 
     # No English match found, try localized size specs.
     if six.PY2:
@@ -267,6 +298,10 @@ class Size(Decimal):
             If you want to use a spec value to represent a bytes value,
             you can use the letter 'b' or 'B' or omit the size specifier.
         """
+        # fast paths for values that are already a whole number of bytes
+        if type(value) in _INTEGRAL_TYPES:
+            return Decimal.__new__(cls, value=value, context=context)
+
         if isinstance(value, (six.string_types, bytes)):
             size = parseSpec(value)
         elif isinstance(value, (six.integer_types, float, Decimal)):
@@ -295,7 +330,7 @@ class Size(Decimal):
         return "Size('%s')" % self
 
     def __deepcopy__(self, memo):
-        return Size(self.convertTo())
+        return Size(self)
 
     # pickling support for Size
     # see https://docs.python.org/3/library/pickle.html#object.__reduce__
@@ -304,22 +339,30 @@ class Size(Decimal):
 
     def __add__(self, other, context=None):
         # because float is not automatically converted to Decimal type
+        if type(other) in _INTEGRAL_TYPES:
+            return Decimal.__new__(Size, Decimal.__add__(self, other))
         if isinstance(other, float):
             other = Decimal(str(other))
         return Size(Decimal.__add__(self, other))
 
     # needed to make sum() work with Size arguments
     def __radd__(self, other, context=None):
+        if type(other) in _INTEGRAL_TYPES:
+            return Decimal.__new__(Size, Decimal.__radd__(self, other))
         if isinstance(other, float):
             other = Decimal(str(other))
         return Size(Decimal.__radd__(self, other))
 
     def __sub__(self, other, context=None):
+        if type(other) in _INTEGRAL_TYPES:
+            return Decimal.__new__(Size, Decimal.__sub__(self, other))
         if isinstance(other, float):
             other = Decimal(str(other))
         return Size(Decimal.__sub__(self, other))
 
     def __mul__(self, other, context=None):
+        if type(other) in _INTEGRAL_TYPES:
+            return Decimal.__new__(Size, Decimal.__mul__(self, other))
         if isinstance(other, float):
             other = Decimal(str(other))
         return Size(Decimal.__mul__(self, other))
@@ -337,9 +380,13 @@ class Size(Decimal):
         return Size(Decimal.__truediv__(self, other))
 
     def __floordiv__(self, other, context=None):
+        if type(other) in _INTEGRAL_TYPES:
+            return Decimal.__new__(Size, Decimal.__floordiv__(self, other))
         return Size(Decimal.__floordiv__(self, other))
 
     def __mod__(self, other, context=None):
+        if type(other) in _INTEGRAL_TYPES:
+            return Decimal.__new__(Size, Decimal.__mod__(self, other))
         return Size(Decimal.__mod__(self, other))
 
     def convertTo(self, spec=None):
@@ -457,3 +504,6 @@ class Size(Decimal):
 
         rounded = (Decimal(self) / factor).to_integral_value(rounding=rounding)
         return Size(rounded * factor)
+
+# types whose values need no rounding to a whole number of bytes
+_INTEGRAL_TYPES = frozenset(six.integer_types + (Size,))
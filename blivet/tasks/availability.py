@@ -20,8 +20,11 @@
 # Red Hat Author(s): Anne Mulhern <amulhern@redhat.com>
 
 import abc
+import atexit
 from distutils.version import LooseVersion
-import hawkey
+import json
+import os
+import tempfile
 
 from six import add_metaclass
 
@@ -30,6 +33,7 @@ gi.require_version("BlockDev", "1.0")
 
 from gi.repository import BlockDev as blockdev
 
+from .. import initialize_blockdev
 from .. import util
 from ..errors import AvailabilityError
 
@@ -38,6 +42,157 @@ log = logging.getLogger("blivet")
 
 CACHE_AVAILABILITY = True
 
+# file to keep availability information in across processes (eg:
+# $XDG_CACHE_HOME/blivet/availability.json), None to only keep it in memory
+CACHE_FILE = None
+
+# files of the rpm database (bdb and sqlite), which change when packages get
+# installed or removed
+RPMDB_FILES = ["/var/lib/rpm/Packages",
+               "/var/lib/rpm/rpmdb.sqlite",
+               "/var/lib/rpm/rpmdb.sqlite-wal",
+               "/usr/lib/sysimage/rpm/Packages",
+               "/usr/lib/sysimage/rpm/rpmdb.sqlite",
+               "/usr/lib/sysimage/rpm/rpmdb.sqlite-wal"]
+
+# incremented by invalidate_cache() to drop all in-memory information
+_cache_generation = 0
+
+class AvailabilityCache(object):
+    """ Availability information persisted in a file.
+
+        The information is only valid as long as the directories in $PATH and
+        the rpm database have not changed. The modification times of the
+        directories and the modification times and sizes of the rpm database
+        files are stored with the information and if any of them differs
+        from the current one the stored information is discarded.
+
+        New information is written to the file by :meth:`flush`, which is
+        called when the process exits.
+    """
+
+    def __init__(self, path):
+        """ Initializer.
+
+            :param str path: the file to keep the information in
+        """
+        self.path = path
+        self._entries = None
+        self._stamp = None
+        self._dirty = False
+
+    @staticmethod
+    def _currentStamp():
+        """ Return the state of the things the stored information depends on.
+
+            :rtype: dict
+        """
+        def stat(path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+
+            return [st.st_mtime, st.st_size]
+
+        dirs = os.environ.get("PATH", "").split(os.pathsep)
+        return {"path": [[d, (stat(d) or [None])[0]] for d in dirs],
+                "rpmdb": [[f, stat(f)] for f in RPMDB_FILES]}
+
+    def _load(self):
+        if self._entries is not None:
+            return
+
+        self._stamp = self._currentStamp()
+        self._entries = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+
+        if isinstance(data, dict) and data.get("stamp") == self._stamp:
+            self._entries = data.get("entries", {})
+
+    def get(self, key):
+        """ Return the stored information for key.
+
+            :param str key: the key
+            :returns: the stored value or None
+        """
+        self._load()
+        return self._entries.get(key)
+
+    def set(self, key, value):
+        """ Store information for key.
+
+            :param str key: the key
+            :param value: a value that can be stored as JSON
+        """
+        self._load()
+        self._entries[key] = value
+        self._dirty = True
+
+    def flush(self):
+        """ Write the information stored since the last flush to the file. """
+        if not self._dirty:
+            return
+
+        self._dirty = False
+        data = {"stamp": self._stamp, "entries": self._entries}
+        try:
+            util.makedirs(os.path.dirname(self.path))
+            (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                         prefix=".availability.")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as e:
+            log.debug("failed to store availability information: %s", e)
+
+    def invalidate(self):
+        """ Drop all stored information. """
+        self._entries = None
+        self._dirty = False
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+_cache = None
+
+def _persistent_cache():
+    """ Return the cache of availability information shared by processes.
+
+        :rtype: :class:`AvailabilityCache` or NoneType
+    """
+    global _cache # pylint: disable=global-statement
+    if not CACHE_AVAILABILITY or CACHE_FILE is None:
+        return None
+
+    if _cache is None or _cache.path != CACHE_FILE:
+        _flush_cache()
+        _cache = AvailabilityCache(CACHE_FILE)
+
+    return _cache
+
+@atexit.register
+def _flush_cache():
+    if _cache is not None:
+        _cache.flush()
+
+def invalidate_cache():
+    """ Drop all availability information, in memory and on disk.
+
+        Use this after installing or removing external tools.
+    """
+    global _cache_generation # pylint: disable=global-statement
+    _cache_generation += 1
+
+    cache = _persistent_cache()
+    if cache is not None:
+        cache.invalidate()
+
 class ExternalResource(object):
     """ An external resource. """
 
@@ -51,6 +206,7 @@ class ExternalResource(object):
         self._method = method
         self.name = name
         self._availabilityErrors = None
+        self._generation = None
 
     def __str__(self):
         return self.name
@@ -62,8 +218,10 @@ class ExternalResource(object):
             :returns: [] if the resource is available
             :rtype: list of str
         """
-        if self._availabilityErrors is None or not CACHE_AVAILABILITY:
+        if self._availabilityErrors is None or not CACHE_AVAILABILITY or \
+           self._generation != _cache_generation:
             self._availabilityErrors = self._method.availabilityErrors(self)
+            self._generation = _cache_generation
         return self._availabilityErrors[:]
 
     @property
@@ -103,10 +261,20 @@ class Path(Method):
             :returns: [] if the name of the application is in the path
             :rtype: list of str
         """
+        cache = _persistent_cache()
+        key = "path:%s" % resource.name
+        if cache is not None and cache.get(key) is not None:
+            return cache.get(key)[:]
+
         if not util.find_program_in_path(resource.name):
-            return ["application %s is not in $PATH" % resource.name]
+            errors = ["application %s is not in $PATH" % resource.name]
         else:
-            return []
+            errors = []
+
+        if cache is not None:
+            cache.set(key, errors)
+
+        return errors
 
 Path = Path()
 
@@ -135,6 +303,7 @@ class PackageMethod(Method):
         """
         self.package = package
         self._availabilityErrors = None
+        self._generation = None
 
     @property
     def packageVersion(self):
@@ -143,7 +312,17 @@ class PackageMethod(Method):
             :returns: the package version
             :rtype: LooseVersion
             :raises AvailabilityError: on failure to obtain package version
+
+            Versions are stored in the persistent cache, so that other
+            processes do not have to load the rpm database again.
         """
+        cache = _persistent_cache()
+        key = "package:%s" % self.package.package_name
+        if cache is not None and cache.get(key) is not None:
+            return LooseVersion(cache.get(key))
+
+        # hawkey is only needed (and imported) if the version is not cached
+        import hawkey
         sack = hawkey.Sack()
 
         try:
@@ -159,20 +338,26 @@ class PackageMethod(Method):
         if len(packages) != 1:
             raise AvailabilityError("Could not determine package version for %s: unable to obtain package information from repo" % self.package.package_name)
 
+        if cache is not None:
+            cache.set(key, packages[0].version)
+
         return LooseVersion(packages[0].version)
 
     def availabilityErrors(self, resource):
-        if self._availabilityErrors is not None and CACHE_AVAILABILITY:
+        if self._availabilityErrors is not None and CACHE_AVAILABILITY and \
+           self._generation == _cache_generation:
             return self._availabilityErrors[:]
 
         self._availabilityErrors = Path.availabilityErrors(resource)
+        self._generation = _cache_generation
 
         if self.package.required_version is None:
             return self._availabilityErrors[:]
 
         try:
-            if self.packageVersion < self.package.required_version:
-                self._availabilityErrors.append("installed version %s for package %s is less than required version %s" % (self.packageVersion, self.package.package_name, self.package.required_version))
+            version = self.packageVersion
+            if version < self.package.required_version:
+                self._availabilityErrors.append("installed version %s for package %s is less than required version %s" % (version, self.package.package_name, self.package.required_version))
         except AvailabilityError as e:
             # In contexts like the installer, a package may not be available,
             # but the version of the tools is likely to be correct.
@@ -192,6 +377,7 @@ class BlockDevMethod(Method):
             :returns: [] if the name of the plugin is loaded
             :rtype: list of str
         """
+        initialize_blockdev()
         if resource.name in blockdev.get_available_plugin_names():
             return []
         else:
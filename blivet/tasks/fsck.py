@@ -28,6 +28,7 @@ from .. import util
 
 from . import availability
 from . import fstask
+from . import probecache
 from . import task
 
 _UNKNOWN_RC_MSG = "Unknown return code: %d"
@@ -65,6 +66,7 @@ class FSCK(task.BasicApplication, fstask.FSTask):
         """
         return [str(self.ext)] + self.options + [self.fs.device]
 
+    @probecache.cached
     def doTask(self):
         """ Check the filesystem.
 
@@ -28,6 +28,7 @@ from .. import util
 
 from . import availability
 from . import fstask
+from . import probecache
 from . import task
 
 @add_metaclass(abc.ABCMeta)
@@ -48,6 +49,7 @@ class FSInfo(task.BasicApplication, fstask.FSTask):
         """
         return [str(self.ext)] + self.options + [self.fs.device]
 
+    @probecache.cached
     def doTask(self):
         """ Returns information from the command.
 
@@ -29,6 +29,7 @@ from ..size import Size
 
 from . import availability
 from . import fstask
+from . import probecache
 from . import task
 
 @add_metaclass(abc.ABCMeta)
@@ -118,6 +119,7 @@ class Ext2FSMinSize(FSMinSize):
 
         return numBlocks
 
+    @probecache.cached
     def doTask(self):
         error_msgs = self.availabilityErrors
         if error_msgs:
@@ -160,6 +162,7 @@ class NTFSMinSize(FSMinSize):
         return minSize
 
 
+    @probecache.cached
     def doTask(self):
         error_msgs = self.availabilityErrors
         if error_msgs:
@@ -30,6 +30,7 @@ from .. import util
 
 from . import availability
 from . import fstask
+from . import probecache
 from . import task
 
 _tags = ("count", "size")
@@ -55,6 +56,7 @@ class FSSize(fstask.FSTask):
 
     # IMPLEMENTATION methods
 
+    @probecache.cached
     def doTask(self):
         """ Returns the size of the filesystem.
 
@@ -0,0 +1,231 @@
+# probecache.py
+# Caching of the results of filesystem probing tasks.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU General Public License v.2, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY expressed or implied, including the implied warranties of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General
+# Public License for more details.  You should have received a copy of the
+# GNU General Public License along with this program; if not, write to the
+# Free Software Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.  Any Red Hat trademarks that are incorporated in the
+# source code or documentation are not subject to the GNU General Public
+# License and may only be used or replicated with the express permission of
+# Red Hat, Inc.
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import tempfile
+from threading import RLock
+
+from ..devicelibs import superblock
+from ..size import Size
+from .. import util
+
+import logging
+log = logging.getLogger("blivet")
+
+CACHE_PROBES = True
+
+# file to keep probe results in across processes, None to only keep them in
+# memory
+CACHE_FILE = None
+
+# maximum number of results kept, the oldest ones are dropped first
+MAX_ENTRIES = 4096
+
+class ProbeCache(object):
+    """ Results of filesystem probing tasks.
+
+        Results are keyed by the task, the device and the fingerprint of the
+        filesystem's superblock, so they never have to be invalidated: once
+        the filesystem is written to its fingerprint and therefore the key
+        changes.
+    """
+
+    def __init__(self, path=None):
+        """ Initializer.
+
+            :keyword str path: the file to keep the results in or None
+        """
+        self.path = path
+        self._entries = None
+        self._lock = RLock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+
+        self._entries = OrderedDict()
+        if self.path is None:
+            return
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f, object_pairs_hook=OrderedDict)
+        except (IOError, OSError, ValueError):
+            return
+
+        if isinstance(data, dict):
+            self._entries = data.get("entries", OrderedDict())
+
+    def _store(self):
+        if self.path is None:
+            return
+
+        try:
+            util.makedirs(os.path.dirname(self.path))
+            (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                         prefix=".probes.")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"entries": self._entries}, f)
+            os.rename(tmp, self.path)
+        except (IOError, OSError) as e:
+            log.debug("failed to store probe results: %s", e)
+
+    def get(self, key):
+        """ Return the stored result for key.
+
+            :param str key: the key
+            :returns: the stored value or None
+        """
+        with self._lock:
+            self._load()
+            return self._entries.get(key)
+
+    def set(self, key, value):
+        """ Store a result for key.
+
+            :param str key: the key
+            :param value: a value that can be stored as JSON
+        """
+        with self._lock:
+            self._load()
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+            self._store()
+
+    def invalidate(self):
+        """ Drop all stored results. """
+        with self._lock:
+            self._entries = None
+            if self.path is None:
+                return
+
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+_cache = None
+
+def _probe_cache():
+    """ Return the cache of probe results.
+
+        :rtype: :class:`ProbeCache` or NoneType
+    """
+    global _cache # pylint: disable=global-statement
+    if not CACHE_PROBES:
+        return None
+
+    if _cache is None or _cache.path != CACHE_FILE:
+        _cache = ProbeCache(CACHE_FILE)
+
+    return _cache
+
+def invalidate_cache():
+    """ Drop all probe results, in memory and on disk. """
+    cache = _probe_cache()
+    if cache is not None:
+        cache.invalidate()
+
+def _fingerprint(fs):
+    """ Return the fingerprint of a filesystem's superblock or None. """
+    pinned = getattr(fs, "_probeFingerprint", None)
+    if pinned is not None:
+        return pinned[0]
+
+    if not fs.exists or not fs.device:
+        return None
+
+    return superblock.fingerprint(fs.device, fs.type)
+
+def _refreshFingerprint(fs):
+    """ Read the fingerprint of a filesystem after it may have changed. """
+    fingerprint = None
+    if fs.exists and fs.device:
+        fingerprint = superblock.fingerprint(fs.device, fs.type)
+
+    if getattr(fs, "_probeFingerprint", None) is not None:
+        fs._probeFingerprint = (fingerprint,)
+
+    return fingerprint
+
+def _key(task, fingerprint):
+    return json.dumps([task.__class__.__name__, task.fs.device, fingerprint])
+
+@contextmanager
+def probing(fs):
+    """ Read the fingerprint of a filesystem only once in this context.
+
+        :param fs: the filesystem
+        :type fs: :class:`~.formats.fs.FS`
+
+        Use this around a sequence of cached tasks run for the same
+        filesystem, so that a repeated probe of an unchanged filesystem costs
+        a single superblock read. The fingerprint is read again after every
+        task that actually runs, as the task may have written to the
+        filesystem.
+    """
+    fs._probeFingerprint = (_fingerprint(fs),)
+    try:
+        yield
+    finally:
+        fs._probeFingerprint = None
+
+def cached(doTask):
+    """ Decorate a filesystem task's doTask method to cache its result.
+
+        The result is stored under the fingerprint read after the task ran,
+        so that tasks which write to the filesystem (eg: fsck) are cached as
+        well. Failures are not cached. Results of filesystems without a
+        fingerprint (see :func:`~.devicelibs.superblock.fingerprint`) are not
+        cached. Neither are those of mounted filesystems, whose fingerprint
+        does not change while they are written to.
+    """
+    @wraps(doTask)
+    def wrapper(self, *args, **kwargs):
+        cache = _probe_cache()
+        if cache is None or args or kwargs or self.fs.status:
+            return doTask(self, *args, **kwargs)
+
+        fingerprint = _fingerprint(self.fs)
+        if fingerprint is not None:
+            entry = cache.get(_key(self, fingerprint))
+            if entry is not None:
+                log.debug("using cached %s of %s", self.description, self.fs.device)
+                return Size(entry["size"]) if "size" in entry else entry["value"]
+
+        result = doTask(self)
+
+        fingerprint = _refreshFingerprint(self.fs)
+        if fingerprint is not None:
+            if isinstance(result, Size):
+                entry = {"size": int(result)}
+            else:
+                entry = {"value": result}
+            cache.set(_key(self, fingerprint), entry)
+
+        return result
+
+    return wrapper
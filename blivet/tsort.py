@@ -24,67 +24,140 @@ class CyclicGraphError(Exception):
     pass
 
 def tsort(graph):
+    """ Return the items of a graph in topological order.
+
+        :param dict graph: a graph as returned by :func:`create_graph`
+        :returns: the sorted items
+        :rtype: list
+        :raises: :class:`CyclicGraphError` if the graph contains cycles
+
+        Items without incoming edges are kept on a stack, starting with the
+        roots in the order of the graph's items. Each time an item is taken
+        off the stack its outgoing edges are removed and the items that are
+        left without incoming edges are pushed onto the stack, in the order of
+        the item's outgoing edges (or, for a ranked graph, in the order of the
+        graph's items).
+
+        The graph is not modified.
+    """
     order = []  # sorted list of items
 
     if not graph or not graph['items']:
         return order
 
+    incoming = dict(graph['incoming'])
+    outgoing = graph['outgoing']
+    ranks = graph['ranks']
+    position = graph['position']
+
+    # ranked items are implicitly preceded by all items of higher rank, so
+    # instead of counting those edges we keep track of how many items of each
+    # rank are left and park items whose only remaining incoming edges are
+    # implied ones until all items of higher rank have been sorted
+    rank_values = sorted(set(ranks.values()), reverse=True)
+    remaining = dict((r, 0) for r in rank_values)
+    for r in ranks.values():
+        remaining[r] += 1
+
+    lower_rank = dict(zip(rank_values, rank_values[1:]))
+    waiting = dict((r, []) for r in rank_values)
+    top = [rank_values[0]] if rank_values else [None]
+
+    def blocked(item):
+        r = ranks.get(item)
+        return r is not None and r != top[0]
+
     # determine which nodes have no incoming edges
-    roots = [n for n in graph['items'] if graph['incoming'][n] == 0]
+    roots = []
+    for item in graph['items']:
+        if incoming[item] == 0:
+            if blocked(item):
+                waiting[ranks[item]].append(item)
+            else:
+                roots.append(item)
+
     if not roots:
         raise CyclicGraphError("no root nodes")
 
-    visited = []    # list of nodes visited, for cycle detection
     while roots:
         # remove a root, add it to the order
         root = roots.pop()
-        if root in visited:
-            raise CyclicGraphError("graph contains cycles")
-
-        visited.append(root)
         order.append(root)
+
         # remove each edge from the root to another node
-        for (parent, child) in [e for e in graph['edges'] if e[0] == root]:
-            graph['incoming'][child] -= 1
-            graph['edges'].remove((parent, child))
+        freed = []
+        for child in outgoing[root]:
+            incoming[child] -= 1
             # if destination node is now a root, add it to roots
-            if graph['incoming'][child] == 0:
-                roots.append(child)
+            if incoming[child] == 0:
+                if blocked(child):
+                    waiting[ranks[child]].append(child)
+                else:
+                    freed.append(child)
 
-    if len(graph['items']) != len(visited):
-        raise CyclicGraphError("graph contains cycles")
+        r = ranks.get(root)
+        if r is not None:
+            remaining[r] -= 1
+            if remaining[r] == 0 and r in lower_rank:
+                top[0] = lower_rank[r]
+                freed.extend(waiting.pop(top[0]))
 
+        if ranks:
+            freed.sort(key=position.get)
+
+        roots.extend(freed)
+
+    if len(graph['items']) != len(order):
+        raise CyclicGraphError("graph contains cycles")
 
     return order
 
-def create_graph(items, edges):
+def create_graph(items, edges, ranks=None):
     """ Create a graph based on a list of items and a list of edges.
 
         Arguments:
 
             items   -   an iterable containing (hashable) items to sort
             edges   -   an iterable containing (parent, child) edge pair tuples
+            ranks   -   an optional dict of rank values hashed by item; every
+                        ranked item implicitly has an edge to every ranked
+                        item of lower rank
 
         Return Value:
 
             The return value is a dictionary representing the directed graph.
-            It has three keys:
+            It has these keys:
 
                 items is the same as the input argument of the same name
                 edges is the same as the input argument of the same name
+                ranks is the same as the input argument of the same name
                 incoming is a dict of incoming edge count hashed by item
+                outgoing is a dict of lists of child items hashed by item
+                position is a dict of indices into items hashed by item
 
-    """
-    graph = {'items': [],       # the items to sort
-             'edges': [],       # partial order info: (parent, child) pairs
-             'incoming': {}}    # incoming edge count for each item
+            Edges that are implied by the items' ranks are not counted twice.
 
-    graph['items'] = items
-    graph['edges'] = edges
-    for item in items:
+    """
+    items = list(items)
+    edges = list(edges)
+    ranks = ranks or {}
+    graph = {'items': items,    # the items to sort
+             'edges': edges,    # partial order info: (parent, child) pairs
+             'ranks': ranks,    # implicit partial order info
+             'incoming': {},    # incoming edge count for each item
+             'outgoing': {},    # children of each item, in edge order
+             'position': {}}    # index of each item in items
+
+    for (idx, item) in enumerate(items):
         graph['incoming'][item] = 0
+        graph['outgoing'][item] = []
+        graph['position'][item] = idx
+
+    for (parent, child) in edges:
+        if parent in ranks and child in ranks and ranks[parent] > ranks[child]:
+            continue
 
-    for (_parent, child) in edges:
+        graph['outgoing'][parent].append(child)
         graph['incoming'][child] += 1
 
     return graph
@@ -24,6 +24,8 @@
 import os
 import re
 import subprocess
+from contextlib import contextmanager
+from threading import RLock
 
 from . import util
 from .util import open  # pylint: disable=redefined-builtin
@@ -40,6 +42,7 @@ INSTALLER_BLACKLIST = (r'^mtd', r'^mmcblk.+boot', r'^mmcblk.+rpmb', r'^zram')
 """ device name regexes to ignore when flags.installer_mode is True """
 
 def get_device(sysfs_path):
+    settle_manager.flush()
     try:
         dev = pyudev.Device.from_sys_path(global_udev, sysfs_path)
     except pyudev.DeviceNotFoundError as e:
@@ -49,23 +52,131 @@ def get_device(sysfs_path):
     return dev
 
 def get_devices(subsystem="block"):
-    settle()
+    settle_manager.settle(defer=False)
     return [d for d in global_udev.list_devices(subsystem=subsystem)
                         if not __is_blacklisted_blockdev(d.sys_name)]
 
+def get_monitor(subsystem="block"):
+    """ Return a started monitor of udev events.
+
+        :keyword str subsystem: the subsystem to receive events for
+        :rtype: :class:`pyudev.Monitor`
+    """
+    monitor = pyudev.Monitor.from_netlink(global_udev)
+    monitor.filter_by(subsystem)
+    monitor.start()
+    return monitor
+
+class SettleManager(object):
+    """ Runs ``udevadm settle``, leaving out the runs that cannot matter.
+
+        Every uevent the kernel emits bumps /sys/kernel/uevent_seqnum. If
+        that number has not changed since the start of the last settle, udev
+        has no events left to process and the settle is skipped.
+
+        Within :meth:`deferred` settles are postponed and coalesced into a
+        single settle, run at the end of the outermost scope or as soon as
+        the udev database is queried.
+
+        The manager is shared by all threads (eg: actions executed
+        concurrently), so its state is guarded by a lock. Settles run while
+        holding it, so threads asking for a settle while one runs wait for
+        it and skip their own if no uevent was emitted since it started.
+    """
+
+    seqnum_file = "/sys/kernel/uevent_seqnum"
+
+    def __init__(self):
+        self.runs = 0
+        """ number of times udevadm settle has been run """
+
+        self.elided = 0
+        """ number of settles that were skipped or coalesced """
+
+        self._seqnum = None
+        self._depth = 0
+        self._pending = False
+        self._lock = RLock()
+
+    def _getSeqnum(self):
+        try:
+            with open(self.seqnum_file) as f:
+                return f.read().strip()
+        except (IOError, OSError):
+            return None
+
+    def settle(self, quiet=False, defer=True):
+        """ Wait for the udev queue to settle, unless there is no need to.
+
+            :keyword bool quiet: bypass :meth:`blivet.util.run_program`
+            :keyword bool defer: whether the settle may be postponed
+        """
+        with self._lock:
+            if self._depth and defer:
+                if self._pending:
+                    self.elided += 1
+                self._pending = True
+                return
+
+            self._pending = False
+            seqnum = self._getSeqnum()
+            if seqnum is not None and seqnum == self._seqnum:
+                self.elided += 1
+                return
+
+            # wait maximal 300 seconds for udev to be done running blkid, lvm,
+            # mdadm etc. This large timeout is needed when running on machines
+            # with lots of disks, or with slow disks
+            argv = ["udevadm", "settle", "--timeout=300"]
+            if quiet:
+                rc = subprocess.call(argv, close_fds=True)
+            else:
+                rc = util.run_program(argv)
+
+            self.runs += 1
+            # a timed out settle does not cover the events seen so far
+            self._seqnum = seqnum if rc == 0 else None
+
+    def flush(self):
+        """ Run a settle postponed by :meth:`deferred`, if there is one. """
+        with self._lock:
+            if self._pending:
+                self.settle(defer=False)
+
+    @contextmanager
+    def deferred(self):
+        """ Postpone the settles requested within the scope.
+
+            Only use this around code that does not depend on udev having
+            processed its changes (eg: device nodes or symlinks existing).
+            Queries of the udev database in this module still see a settled
+            database.
+        """
+        with self._lock:
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._depth -= 1
+                if not self._depth:
+                    self.flush()
+
+    def invalidate(self):
+        """ Make sure the next settle is run. """
+        with self._lock:
+            self._seqnum = None
+
+settle_manager = SettleManager()
+
 def settle(quiet=False):
     """ Wait for the udev queue to settle.
 
         :keyword bool quiet: bypass :meth:`blivet.util.run_program`
+
+        See :class:`SettleManager` for when this does not run udevadm.
     """
-    # wait maximal 300 seconds for udev to be done running blkid, lvm,
-    # mdadm etc. This large timeout is needed when running on machines with
-    # lots of disks, or with slow disks
-    argv = ["udevadm", "settle", "--timeout=300"]
-    if quiet:
-        subprocess.call(argv, close_fds=True)
-    else:
-        util.run_program(argv)
+    settle_manager.settle(quiet=quiet)
 
 def trigger(subsystem=None, action="add", name=None):
     argv = ["trigger", "--action=%s" % action]
@@ -77,59 +188,125 @@ def trigger(subsystem=None, action="add", name=None):
     util.run_program(["udevadm"] + argv)
     settle()
 
-def resolve_devspec(devspec, sysname=False):
-    if not devspec:
-        return None
+class DeviceSnapshot(object):
+    """ A snapshot of the udev database with lookup tables.
 
-    # import devices locally to avoid cyclic import (devices <-> udev)
-    from . import devices
+        The devices are enumerated once, the first time they are needed, and
+        then only on :meth:`refresh`. Resolving any number of device specs
+        against the same snapshot therefore costs a single enumeration.
+    """
 
-    devname = devices.devicePathToName(devspec)
+    def __init__(self, subsystem="block"):
+        """
+            :keyword str subsystem: the subsystem to take a snapshot of
+        """
+        self.subsystem = subsystem
+        self._devices = None
+        self._maps = None
+
+    def refresh(self):
+        """ Enumerate the devices again and rebuild the lookup tables. """
+        devices = get_devices(subsystem=self.subsystem)
+        maps = dict((key, {}) for key in ("name", "sysname", "label", "uuid", "link"))
+        for (idx, dev) in enumerate(devices):
+            # the first device in enumeration order wins
+            keys = {"name": [device_get_name(dev)],
+                    "sysname": [dev.sys_name],
+                    "label": [device_get_label(dev)],
+                    "uuid": [device_get_uuid(dev)],
+                    "link": device_get_symlinks(dev)}
+            for (key, values) in keys.items():
+                for value in values:
+                    if value is not None:
+                        maps[key].setdefault(value, idx)
+
+        self._devices = devices
+        self._maps = maps
+
+    def invalidate(self):
+        """ Drop the snapshot. The devices will be enumerated on next use. """
+        self._devices = None
+        self._maps = None
+
+    @property
+    def devices(self):
+        """ The devices in the snapshot, in enumeration order. """
+        if self._devices is None:
+            self.refresh()
+
+        return self._devices
+
+    def _find(self, key, value):
+        if self._maps is None:
+            self.refresh()
+
+        return self._maps[key].get(value)
+
+    def resolve_devspec(self, devspec, sysname=False):
+        """ Return the name of the device matching a device specification.
+
+            :param str devspec: a device name, path, symlink, LABEL= or UUID=
+            :keyword bool sysname: return the sysfs name instead
+            :returns: the name of the first matching device, if any
+            :rtype: str or NoneType
+        """
+        if not devspec:
+            return None
+
+        # import devices locally to avoid cyclic import (devices <-> udev)
+        from . import devices
 
-    ret = None
-    for dev in get_devices():
         if devspec.startswith("LABEL="):
-            if device_get_label(dev) == devspec[6:]:
-                ret = dev
-                break
+            idx = self._find("label", devspec[6:])
         elif devspec.startswith("UUID="):
-            if device_get_uuid(dev) == devspec[5:]:
-                ret = dev
-                break
-        elif device_get_name(dev) == devname or dev.sys_name == devname:
-            ret = dev
-            break
+            idx = self._find("uuid", devspec[5:])
         else:
+            devname = devices.devicePathToName(devspec)
             spec = devspec
             if not spec.startswith("/dev/"):
                 spec = os.path.normpath("/dev/" + spec)
 
-            for link in device_get_symlinks(dev):
-                if spec == link:
-                    ret = dev
-                    break
+            matches = [i for i in (self._find("name", devname),
+                                   self._find("sysname", devname),
+                                   self._find("link", spec))
+                       if i is not None]
+            idx = min(matches) if matches else None
 
-    if ret:
-        return ret.sys_name if sysname else device_get_name(ret)
+        if idx is None:
+            return None
 
-def resolve_glob(glob):
-    import fnmatch
-    ret = []
+        dev = self.devices[idx]
+        return dev.sys_name if sysname else device_get_name(dev)
 
-    if not glob:
-        return ret
+    def resolve_glob(self, glob):
+        """ Return the names of the devices matching a glob.
 
-    for dev in get_devices():
-        name = device_get_name(dev)
+            :param str glob: a glob matched against device names and symlinks
+            :rtype: list of str
+        """
+        import fnmatch
+        ret = []
 
-        if fnmatch.fnmatch(name, glob):
-            ret.append(name)
-        else:
-            for link in device_get_symlinks(dev):
-                if fnmatch.fnmatch(link, glob):
-                    ret.append(name)
+        if not glob:
+            return ret
+
+        for dev in self.devices:
+            name = device_get_name(dev)
 
-    return ret
+            if fnmatch.fnmatch(name, glob):
+                ret.append(name)
+            else:
+                for link in device_get_symlinks(dev):
+                    if fnmatch.fnmatch(link, glob):
+                        ret.append(name)
+
+        return ret
+
+def resolve_devspec(devspec, sysname=False):
+    return DeviceSnapshot().resolve_devspec(devspec, sysname=sysname)
+
+def resolve_glob(glob):
+    return DeviceSnapshot().resolve_glob(glob)
 
 def __is_blacklisted_blockdev(dev_name):
     """Is this a blockdev we never want for an install?"""
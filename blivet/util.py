@@ -12,15 +12,11 @@ import tempfile
 import uuid
 import hashlib
 import warnings
+import weakref
 from decimal import Decimal
 from contextlib import contextmanager
 from functools import wraps
 
-import gi
-gi.require_version("BlockDev", "1.0")
-
-from gi.repository import BlockDev as blockdev
-
 import six
 
 import logging
@@ -153,6 +149,13 @@ def get_mount_device(mountpoint):
             break
 
     if mount_device and re.match(r'/dev/loop\d+$', mount_device):
+        # import libblockdev only when needed, it is expensive to initialize
+        from . import initialize_blockdev
+        initialize_blockdev()
+        import gi
+        gi.require_version("BlockDev", "1.0")
+        from gi.repository import BlockDev as blockdev
+
         loop_name = os.path.basename(mount_device)
         mount_device = blockdev.loop.get_backing_file(loop_name)
         log.debug("found backing file %s for loop device %s", mount_device,
@@ -624,6 +627,118 @@ def variable_copy(obj, memo, omit=None, shallow=None, duplicate=None):
 
     return new
 
+class StateSnapshot(object):
+    """ Saved attribute values of a set of objects.
+
+        Unlike a copy, a snapshot puts the saved values back into the very
+        same objects, so references to them stay valid. Lists, dicts and
+        sets (also nested ones) are saved as copies so that they can be
+        modified in place without affecting the snapshot. Objects saved
+        recursively also have the blivet objects they refer to saved, so
+        that changes to eg: an LV's cache request or a device's parent list
+        are undone as well.
+    """
+
+    _containers = (list, dict, set, weakref.WeakSet)
+
+    def __init__(self):
+        self._states = {}
+        """ object id -> (object, attributes, saved values, duplicated) """
+
+    def __contains__(self, obj):
+        return id(obj) in self._states
+
+    def save(self, obj, attrs=None, duplicate=None, recursive=False):
+        """ Save the attribute values of an object.
+
+            :param object obj: the object to save
+            :keyword attrs: names of the attributes to save, default is all
+            :type attrs: iterable of str
+            :keyword duplicate: names of attributes to save using their
+                                duplicate() method
+            :type duplicate: iterable of str
+            :keyword bool recursive: also save the blivet objects referred to
+                                     by the saved values, with the same
+                                     duplicate attributes
+            :returns: False if the object was already saved, else True
+            :rtype: bool
+
+            If attrs is None, restoring the snapshot also removes any
+            attributes set on the object after it was saved.
+        """
+        if obj is None or id(obj) in self._states:
+            return False
+
+        duplicate = duplicate or []
+        pending = [self._save(obj, attrs, duplicate)]
+        while recursive and pending:
+            value = pending.pop()
+            if type(value) in self._containers:
+                pending.extend(value.values() if isinstance(value, dict) else value)
+            elif isinstance(value, tuple):
+                pending.extend(value)
+            elif self._isSaveable(value):
+                pending.append(self._save(value, None, duplicate))
+
+        return True
+
+    def _save(self, obj, attrs, duplicate):
+        """ Save an object's attribute values and return the saved ones.
+
+            Duplicated values are left out of the returned ones, as they are
+            not shared with the object.
+        """
+        values = {}
+        duplicated = set()
+        for (attr, value) in obj.__dict__.items():
+            if attrs is not None and attr not in attrs:
+                continue
+
+            if attr in duplicate and value is not None:
+                value = value.duplicate()
+                duplicated.add(attr)
+            else:
+                value = self._copy(value)
+
+            values[attr] = value
+
+        self._states[id(obj)] = (obj, attrs, values, duplicated)
+        return dict((a, v) for (a, v) in values.items() if a not in duplicated)
+
+    def restore(self):
+        """ Restore the saved attribute values of all saved objects.
+
+            The snapshot can be restored more than once. Duplicated values
+            are duplicated again each time.
+        """
+        for (obj, attrs, values, duplicated) in self._states.values():
+            if attrs is None:
+                obj.__dict__.clear()
+
+            for (attr, value) in values.items():
+                if attr in duplicated:
+                    value = value.duplicate()
+                else:
+                    value = self._copy(value)
+
+                obj.__dict__[attr] = value
+
+    def _isSaveable(self, value):
+        """ Is value a blivet object with attributes of its own? """
+        return (id(value) not in self._states and
+                not isinstance(value, type) and
+                type(value).__module__.startswith("blivet.") and
+                bool(getattr(value, "__dict__", None)))
+
+    def _copy(self, value):
+        if type(value) not in self._containers:
+            return value
+
+        if isinstance(value, dict):
+            return type(value)((k, self._copy(v)) for (k, v) in value.items())
+
+        return type(value)(self._copy(v) for v in value)
+
 def get_current_entropy():
     with open("/proc/sys/kernel/random/entropy_avail", "r") as fobj:
         return int(fobj.readline())
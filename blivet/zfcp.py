@@ -31,6 +31,9 @@ gi.require_version("BlockDev", "1.0")
 
 from gi.repository import BlockDev as blockdev
 
+from . import initialize_blockdev
+initialize_blockdev()
+
 import logging
 log = logging.getLogger("blivet")
 
@@ -1,8 +1,14 @@
 
 import unittest
+import threading
+import mock
 
 from tests.storagetestcase import StorageTestCase
 import blivet
+from blivet.actionlist import ActionList
+from blivet.callbacks import create_new_callbacks_register
+from blivet.errors import DiskLabelCommitError
+from blivet.flags import flags
 from blivet.formats import getFormat
 from blivet.size import Size
 
@@ -12,6 +18,7 @@ from blivet.devices import PartitionDevice
 from blivet.devices import MDRaidArrayDevice
 from blivet.devices import LVMVolumeGroupDevice
 from blivet.devices import LVMLogicalVolumeDevice
+from blivet.devices import LVMSnapShotDevice
 
 # action classes
 from blivet.deviceaction import ActionCreateDevice
@@ -1146,3 +1153,159 @@ class DeviceActionTestCase(StorageTestCase):
     def testActionSorting(self, *args, **kwargs):
         """ Verify correct functioning of action sorting. """
         pass
+
+@unittest.skipIf(LVMSnapShotDevice.unavailableTypeDependencies(), "lvm is not available")
+class ActionListSortTestCase(unittest.TestCase):
+    def testSnapShotOrigin(self):
+        """ Verify that sorting keeps dependencies beyond device parents. """
+        disk = DiskDevice("sda", size=Size("10 GiB"), exists=True,
+                          fmt=getFormat("lvmpv", exists=True))
+        vg = LVMVolumeGroupDevice("vg", parents=[disk], exists=True)
+        origin = LVMLogicalVolumeDevice("orig", parents=[vg], size=Size("1 GiB"),
+                                        exists=True)
+        snapshot = LVMSnapShotDevice("snap", parents=[vg], origin=origin,
+                                     size=Size("1 GiB"), exists=True)
+
+        # the snapshot and its origin are siblings, neither is an ancestor of
+        # the other, but the snapshot has to be destroyed first
+        for devices in ([snapshot, origin], [origin, snapshot]):
+            actions = ActionList()
+            for device in devices:
+                actions.append(ActionDestroyDevice(device))
+            actions.sort()
+            self.assertEqual([a.device for a in actions], [snapshot, origin])
+            self.assertEqual(actions._requirements[actions.find(device=origin)[0]],
+                             actions.find(device=snapshot))
+
+class ActionListProcessTestCase(unittest.TestCase):
+    def setUp(self):
+        self._workers = flags.action_workers
+
+    def tearDown(self):
+        flags.action_workers = self._workers
+
+    def _newAction(self, name, action_type, events, disks=None):
+        action = mock.Mock(isContainer=False, isFormat=False, type=action_type)
+        action.device.partitioned = False
+        action.device.disks = disks if disks is not None else [name.split()[-1][:3]]
+        action.__str__ = mock.Mock(return_value=name)
+
+        def execute(callbacks=None):
+            events.append(("start", name))
+            callbacks.report_progress(name)
+            events.append(("end", name))
+        action.execute.side_effect = execute
+        return action
+
+    def testProcessConcurrently(self):
+        """ Verify that independent actions are executed concurrently. """
+        events = []
+        lock = threading.Lock()
+        def report_progress(msg):
+            # callbacks must not be invoked from several threads at once
+            self.assertTrue(lock.acquire(False))
+            events.append(("progress", msg))
+            lock.release()
+
+        callbacks = create_new_callbacks_register(report_progress=report_progress)
+
+        destroy = self._newAction("destroy", 1000, events)
+        create_sdb1 = self._newAction("create sdb1", 100, events)
+        create_sdc1 = self._newAction("create sdc1", 100, events)
+        format_sdb1 = self._newAction("format sdb1", 100, events)
+        actions = ActionList()
+        actions._actions = [destroy, create_sdb1, create_sdc1, format_sdb1]
+        actions._requirements = {destroy: [], create_sdb1: [],
+                                 create_sdc1: [], format_sdb1: [create_sdb1]}
+
+        flags.action_workers = 4
+        with mock.patch.object(actions, "_preProcess"):
+            with mock.patch.object(actions, "_postProcess"):
+                actions.process(callbacks=callbacks)
+
+        self.assertEqual(actions._actions, [])
+        self.assertEqual(len(actions._completed_actions), 4)
+        self.assertEqual(events[:3], [("start", "destroy"),
+                                      ("progress", "destroy"),
+                                      ("end", "destroy")])
+        self.assertLess(events.index(("end", "create sdb1")),
+                        events.index(("start", "format sdb1")))
+        self.assertEqual(len(events), 12)
+
+        # a failed action stops the execution of the actions requiring it
+        events = []
+        create_sdb1.execute.side_effect = RuntimeError("create failed")
+        actions._actions = [create_sdb1, create_sdc1, format_sdb1]
+        actions._completed_actions = []
+        with mock.patch.object(actions, "_preProcess"):
+            with mock.patch.object(actions, "_postProcess"):
+                with self.assertRaisesRegex(RuntimeError, "create failed"):
+                    actions.process(callbacks=callbacks)
+
+        self.assertEqual(actions._actions, [create_sdb1, format_sdb1])
+        self.assertEqual(actions._completed_actions, [create_sdc1])
+
+    def testConcurrentRequirements(self):
+        """ Verify that only actions on different disks run concurrently. """
+        events = []
+        create_sdb1 = self._newAction("create sdb1", 100, events)
+        create_sdc1 = self._newAction("create sdc1", 100, events)
+        format_sdb2 = self._newAction("format sdb2", 100, events)
+        create_vg = self._newAction("create vg", 100, events, disks=["sdb", "sdc"])
+        create_file = self._newAction("create file", 100, events, disks=[])
+        format_sdd1 = self._newAction("format sdd1", 100, events)
+        actions = ActionList()
+        actions._actions = [create_sdb1, create_sdc1, format_sdb2, create_vg,
+                            create_file, format_sdd1]
+        actions._requirements = dict((a, []) for a in actions._actions)
+
+        requirements = actions._concurrentRequirements()
+        self.assertEqual(requirements[create_sdb1], set())
+        self.assertEqual(requirements[create_sdc1], set())
+        self.assertEqual(requirements[format_sdb2], set([create_sdb1]))
+        self.assertEqual(requirements[create_vg], set([format_sdb2, create_sdc1]))
+        # actions on devices without disks are never run concurrently
+        self.assertEqual(requirements[create_file],
+                         set([create_sdb1, create_sdc1, format_sdb2, create_vg]))
+        self.assertEqual(requirements[format_sdd1], set([create_file]))
+
+    def testProcessConcurrentlyRetry(self):
+        """ Verify that failed disklabel commits are retried on their own. """
+        events = []
+        callbacks = create_new_callbacks_register(report_progress=lambda msg: None)
+        create_sdb1 = self._newAction("create sdb1", 100, events)
+        create_sdc1 = self._newAction("create sdc1", 100, events)
+        format_sdb1 = self._newAction("format sdb1", 100, events)
+
+        def execute(callbacks=None):
+            if ("start", "create sdb1") not in events:
+                events.append(("start", "create sdb1"))
+                raise DiskLabelCommitError("busy")
+            events.append(("end", "create sdb1"))
+        create_sdb1.execute.side_effect = execute
+
+        actions = ActionList()
+        actions._actions = [create_sdb1, create_sdc1, format_sdb1]
+        actions._requirements = {create_sdb1: [], create_sdc1: [],
+                                 format_sdb1: [create_sdb1]}
+
+        flags.action_workers = 4
+        def teardown(action, devices=None):
+            # no other action is running during the teardown
+            self.assertEqual(len([e for e in events if e[0] == "start"]),
+                             len([e for e in events if e[0] == "end"]) + 1)
+            events.append(("teardown", str(action)))
+
+        with mock.patch.object(actions, "_preProcess"), \
+             mock.patch.object(actions, "_postProcess"), \
+             mock.patch.object(actions, "_teardownDiskUsers",
+                               side_effect=teardown) as teardown_users:
+            actions.process(callbacks=callbacks)
+            teardown_users.assert_called_once_with(create_sdb1, [])
+
+        self.assertEqual(actions._actions, [])
+        self.assertEqual(len(actions._completed_actions), 3)
+        self.assertLess(events.index(("end", "create sdc1")),
+                        events.index(("teardown", "create sdb1")))
+        self.assertLess(events.index(("end", "create sdb1")),
+                        events.index(("start", "format sdb1")))
@@ -0,0 +1,515 @@
+#!/usr/bin/python3
+#
+# benchmark.py
+# Timing of device tree operations on large synthetic device trees.
+#
+# Copyright (C) 2016  Red Hat, Inc.
+#
+# This copyrighted material is made available to anyone wishing to use,
+# modify, copy, or redistribute it subject to the terms and conditions of
+# the GNU Lesser General Public License v.2, or (at your option) any later
+# version. This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY expressed or implied, including the implied
+# warranties of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See
+# the GNU Lesser General Public License for more details.  You should have
+# received a copy of the GNU Lesser General Public License along with this
+# program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.  Any Red Hat trademarks
+# that are incorporated in the source code or documentation are not subject
+# to the GNU Lesser General Public License and may only be used or
+# replicated with the express permission of Red Hat, Inc.
+#
+""" Benchmarks for blivet's device tree.
+
+    The device trees are built in memory out of :class:`~.devices.DiskDevice`,
+    :class:`~.devices.PartitionDevice`, :class:`~.devices.MDRaidArrayDevice`,
+    :class:`~.devices.LVMVolumeGroupDevice`,
+    :class:`~.devices.LVMLogicalVolumeDevice` and
+    :class:`~.devices.LUKSDevice` instances that pretend to exist, so no block
+    devices are touched. The only exception is partition allocation, which
+    needs parted, and so runs on sparse disk image files.
+
+    Usage::
+
+        PYTHONPATH=.:tests/ python3 tests/benchmark.py --output results.json
+        PYTHONPATH=.:tests/ python3 tests/benchmark.py --compare results.json
+
+    The results are written as JSON. With --compare the new results are
+    checked against a previous run and the exit status is 1 if any benchmark
+    got slower than the given threshold allows.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import timeit
+import uuid
+
+import parted
+
+import blivet
+from blivet.deviceaction import ActionCreateFormat
+from blivet.deviceaction import ActionDestroyDevice
+from blivet.devices import DiskDevice
+from blivet.devices import DiskFile
+from blivet.devices import LUKSDevice
+from blivet.devices import LVMLogicalVolumeDevice
+from blivet.devices import LVMVolumeGroupDevice
+from blivet.devices import MDRaidArrayDevice
+from blivet.devices import PartitionDevice
+from blivet.formats import getFormat
+from blivet.partitioning import doPartitioning
+from blivet.partitioning import growLVM
+from blivet.size import Size
+from blivet.util import create_sparse_tempfile
+
+# devices in each building block of a synthetic tree, see addUnit()
+UNIT_SIZE = 10
+
+DEFAULT_SCALES = (10, 100, 1000, 10000)
+
+# how many devices each lookup benchmark looks up
+LOOKUP_SAMPLE = 1000
+
+class Synthetic(object):
+    """ Builds synthetic device trees.
+
+        Every device gets a predictable name and, where it has one, a UUID
+        drawn from a seeded random generator, so that two runs build the very
+        same tree.
+    """
+    def __init__(self, devicetree, seed=0):
+        self.devicetree = devicetree
+        self._random = random.Random(seed)
+        self._units = 0
+
+    def uuid(self):
+        return str(uuid.UUID(int=self._random.getrandbits(128)))
+
+    def _add(self, device):
+        self.devicetree._addDevice(device)
+        return device
+
+    def addDisk(self, name, size=Size("100 GiB")):
+        return self._add(DiskDevice(name, size=size, exists=True))
+
+    def addPartition(self, disk, number, fmt, size=Size("50 GiB")):
+        """ Add an existing partition without looking at any disklabel.
+
+            This is the same trick :class:`~.storagetestcase.StorageTestCase`
+            plays: the partition is created as a request and marked as
+            existing afterwards.
+        """
+        part = PartitionDevice("%s%d" % (disk.name, number), size=size,
+                               parents=[disk], fmt=fmt)
+        part.parents = part.req_disks
+        part.exists = True
+        part._partType = parted.PARTITION_NORMAL
+        return self._add(part)
+
+    def addUnit(self):
+        """ Add UNIT_SIZE devices: two disks, with a partition of each in an
+            md array and the other in a volume group whose only logical volume
+            is encrypted.
+
+            :returns: the md array, logical volume and LUKS device
+            :rtype: tuple
+        """
+        n = self._units
+        self._units += 1
+
+        md_name = "md%d" % n
+        vg_name = "vg%d" % n
+        disks = [self.addDisk("sd%da" % n), self.addDisk("sd%db" % n)]
+
+        md_uuid = self.uuid()
+        members = [self.addPartition(d, 1, getFormat("mdmember", exists=True,
+                                                     mdUuid=md_uuid,
+                                                     uuid=self.uuid()))
+                   for d in disks]
+        md = self._add(MDRaidArrayDevice(md_name, level="raid1",
+                                         memberDevices=2, totalDevices=2,
+                                         parents=members, uuid=md_uuid,
+                                         exists=True))
+
+        vg_uuid = self.uuid()
+        pvs = [self.addPartition(d, 2, getFormat("lvmpv", exists=True,
+                                                 vgName=vg_name, vgUuid=vg_uuid,
+                                                 uuid=self.uuid()))
+               for d in disks]
+        vg = self._add(LVMVolumeGroupDevice(vg_name, parents=pvs,
+                                            size=Size("100 GiB"),
+                                            uuid=vg_uuid, exists=True))
+        lv = self._add(LVMLogicalVolumeDevice("lv%d" % n, parents=[vg],
+                                              size=Size("10 GiB"),
+                                              uuid=self.uuid(),
+                                              fmt=getFormat("luks",
+                                                            exists=True,
+                                                            uuid=self.uuid()),
+                                              exists=True))
+        luks = self._add(LUKSDevice("luks-%s" % lv.format.uuid,
+                                    parents=[lv], size=lv.size,
+                                    exists=True))
+        return (md, lv, luks)
+
+    def addUnits(self, count):
+        """ Add roughly count devices.
+
+            :returns: what :meth:`addUnit` returned for each unit
+            :rtype: list
+        """
+        return [self.addUnit() for _i in range(max(1, count // UNIT_SIZE))]
+
+def synthetic_blivet(count):
+    """ Return a Blivet instance and the units of its synthetic tree. """
+    storage = blivet.Blivet()
+    units = Synthetic(storage.devicetree).addUnits(count)
+    return (storage, units)
+
+def unit_actions(units):
+    """ Return a list of actions to schedule on a synthetic tree.
+
+        For each unit the md array is formatted twice (the first action will
+        be pruned) and the LUKS device and its logical volume are destroyed.
+    """
+    actions = []
+    for (md, lv, luks) in units:
+        actions.append(ActionCreateFormat(md, getFormat("swap")))
+        actions.append(ActionCreateFormat(md, getFormat("swap")))
+        actions.append(ActionDestroyDevice(luks))
+        actions.append(ActionDestroyDevice(lv))
+    return actions
+
+class Timer(object):
+    """ Context manager timing its body. """
+    def __init__(self):
+        self.elapsed = None
+        self._start = None
+
+    def __enter__(self):
+        self._start = timeit.default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = timeit.default_timer() - self._start
+
+#
+# The benchmarks. Each is a function taking the number of devices to work with
+# and returning a dict mapping names of the operations it timed to a tuple of
+# (seconds, number of operations). Setup is never part of the timing.
+#
+def bench_lookups(count):
+    (storage, _units) = synthetic_blivet(count)
+    devicetree = storage.devicetree
+    devices = devicetree.devices
+    sample = random.Random(0).sample(devices, min(LOOKUP_SAMPLE, len(devices)))
+    uuids = [d.uuid or d.format.uuid for d in sample
+             if d.uuid or getattr(d.format, "uuid", None)]
+
+    results = {}
+    with Timer() as t:
+        for device in sample:
+            devicetree.getDeviceByName(device.name)
+    results["lookup.name"] = (t.elapsed, len(sample))
+
+    with Timer() as t:
+        for device in sample:
+            devicetree.getDeviceByPath(device.path)
+    results["lookup.path"] = (t.elapsed, len(sample))
+
+    with Timer() as t:
+        for device_uuid in uuids:
+            devicetree.getDeviceByUuid(device_uuid)
+    results["lookup.uuid"] = (t.elapsed, len(uuids))
+
+    with Timer() as t:
+        for device in sample:
+            devicetree.getChildren(device)
+    results["lookup.children"] = (t.elapsed, len(sample))
+
+    with Timer() as t:
+        for device in sample:
+            devicetree.getDependentDevices(device)
+    results["lookup.dependents"] = (t.elapsed, len(sample))
+
+    return results
+
+def bench_registerAction(count):
+    (storage, units) = synthetic_blivet(count)
+    actions = unit_actions(units)
+    with Timer() as t:
+        for action in actions:
+            storage.devicetree.registerAction(action)
+
+    return {"registerAction": (t.elapsed, len(actions))}
+
+def bench_actions(count):
+    (storage, units) = synthetic_blivet(count)
+    for action in unit_actions(units):
+        storage.devicetree.registerAction(action)
+
+    results = {}
+    n_actions = len(storage.devicetree.findActions())
+    with Timer() as t:
+        storage.devicetree.pruneActions()
+    results["ActionList.prune"] = (t.elapsed, n_actions)
+
+    n_actions = len(storage.devicetree.findActions())
+    with Timer() as t:
+        storage.devicetree.sortActions()
+    results["ActionList.sort"] = (t.elapsed, n_actions)
+
+    return results
+
+def bench_copy(count):
+    (storage, _units) = synthetic_blivet(count)
+    with Timer() as t:
+        storage.copy()
+
+    return {"Blivet.copy": (t.elapsed, 1)}
+
+def bench_doPartitioning(count):
+    """ Allocate count partitions over as many gpt disks as they need. """
+    per_disk = 100
+    n_disks = max(1, (count + per_disk - 1) // per_disk)
+    disk_size = Size("4 MiB") * per_disk + Size("64 MiB")
+
+    storage = blivet.Blivet()
+    paths = []
+    try:
+        for i in range(n_disks):
+            path = create_sparse_tempfile("benchmark%d" % i, int(disk_size))
+            paths.append(path)
+            disk = DiskFile(path)
+            storage.devicetree._addDevice(disk)
+            storage.formatDevice(disk, getFormat("disklabel", labelType="gpt",
+                                                 device=disk.path))
+
+        for i in range(count):
+            grow = (i % 4 == 0)
+            part = storage.newPartition(size=Size("1 MiB"), grow=grow,
+                                        maxsize=Size("3 MiB") if grow else None)
+            storage.createDevice(part)
+
+        with Timer() as t:
+            doPartitioning(storage)
+    finally:
+        for path in paths:
+            os.unlink(path)
+
+    return {"doPartitioning": (t.elapsed, count)}
+
+def bench_growLVM(count):
+    """ Grow count logical volumes in groups of 50 per volume group. """
+    per_vg = 50
+    storage = blivet.Blivet()
+    synthetic = Synthetic(storage.devicetree)
+    n_lvs = 0
+    for n in range(max(1, count // (per_vg + 4))):
+        disks = [synthetic.addDisk("sd%da" % n), synthetic.addDisk("sd%db" % n)]
+        pvs = [synthetic.addPartition(d, 1, getFormat("lvmpv"),
+                                      size=Size("99 GiB"))
+               for d in disks]
+        vg = storage.newVG(name="vg%d" % n, parents=pvs)
+        storage.createDevice(vg)
+        for i in range(per_vg):
+            lv = storage.newLV(name="lv%d" % i, parents=[vg],
+                               size=Size("64 MiB"), grow=True,
+                               maxsize=Size("4 GiB") if i % 3 == 0 else None)
+            storage.createDevice(lv)
+            n_lvs += 1
+
+    with Timer() as t:
+        growLVM(storage)
+
+    return {"growLVM": (t.elapsed, n_lvs)}
+
+def bench_size(count):
+    """ Time count of the most common Size operations.
+
+        Constant specs are parsed from the cache and integer arithmetic takes
+        the fast paths; the uncached specs and arithmetic needing rounding
+        are timed for comparison.
+    """
+    a = Size(12345678)
+    b = Size(4096)
+    results = {}
+    with Timer() as t:
+        for _i in range(count):
+            Size("1 MiB")
+    results["Size.spec"] = (t.elapsed, count)
+
+    with Timer() as t:
+        for _i in range(count):
+            blivet.size._SPEC_CACHE.clear()
+            Size("1 MiB")
+    results["Size.spec.uncached"] = (t.elapsed, count)
+
+    with Timer() as t:
+        for _i in range(count):
+            # pylint: disable=pointless-statement
+            a + b; a - b; a * 2; a // b
+    results["Size.arithmetic"] = (t.elapsed, count * 4)
+
+    with Timer() as t:
+        for _i in range(count):
+            # pylint: disable=pointless-statement
+            a + 0.5; a - 0.5; a * 2.0; a / 3
+    results["Size.arithmetic.rounding"] = (t.elapsed, count * 4)
+
+    return results
+
+# device classes the synthetic trees are built out of
+UNIT_CLASSES = (DiskDevice, PartitionDevice, MDRaidArrayDevice,
+                LVMVolumeGroupDevice, LVMLogicalVolumeDevice, LUKSDevice)
+
+# name -> (function, largest number of devices it is run with by default,
+#          device classes it needs)
+BENCHMARKS = {
+    "lookups": (bench_lookups, 10000, UNIT_CLASSES),
+    "registerAction": (bench_registerAction, 10000, UNIT_CLASSES),
+    "actions": (bench_actions, 10000, UNIT_CLASSES),
+    "copy": (bench_copy, 10000, UNIT_CLASSES),
+    "doPartitioning": (bench_doPartitioning, 1000, (DiskFile, PartitionDevice)),
+    "growLVM": (bench_growLVM, 10000,
+                (DiskDevice, PartitionDevice, LVMVolumeGroupDevice,
+                 LVMLogicalVolumeDevice)),
+    "size": (bench_size, 10000, ()),
+}
+
+def unavailable(name):
+    """ Return the external dependencies of a benchmark that are missing.
+
+        :param str name: name of the benchmark
+        :rtype: set of :class:`~.tasks.availability.ExternalResource`
+    """
+    missing = set()
+    for device_class in BENCHMARKS[name][2]:
+        missing.update(device_class.unavailableTypeDependencies())
+    return missing
+
+def run(names, scales, repeat, full=False, out=None):
+    """ Run the benchmarks.
+
+        :param names: names of the benchmarks to run
+        :type names: list of str
+        :param scales: the numbers of devices to run each benchmark with
+        :type scales: list of int
+        :param int repeat: how many times to run each benchmark
+        :keyword bool full: ignore the default largest scale of the benchmarks
+        :keyword out: file to report progress to
+        :returns: one entry per benchmark, operation and scale
+        :rtype: list of dict
+
+        Benchmarks whose external dependencies are missing are skipped.
+    """
+    results = []
+    for name in names:
+        (func, max_scale, _classes) = BENCHMARKS[name]
+        missing = unavailable(name)
+        if missing:
+            if out:
+                print("%-16s skipped, missing %s" % (name, ", ".join(sorted(str(m) for m in missing))),
+                      file=out)
+            continue
+
+        for scale in scales:
+            if scale > max_scale and not full:
+                continue
+
+            samples = {}
+            for _i in range(repeat):
+                for (op, (seconds, ops)) in func(scale).items():
+                    samples.setdefault(op, (ops, []))[1].append(seconds)
+
+            for (op, (ops, times)) in sorted(samples.items()):
+                result = {"benchmark": name, "operation": op, "scale": scale,
+                          "operations": ops, "best": min(times),
+                          "mean": sum(times) / len(times), "samples": times}
+                results.append(result)
+                if out:
+                    print("%-16s %-20s %6d %10.6fs" % (name, op, scale,
+                                                      result["best"]),
+                          file=out)
+
+    return results
+
+def compare(old, new, threshold, noise=0.001):
+    """ Return the results of new that are slower than in old.
+
+        :param old: results of a previous run
+        :type old: list of dict
+        :param new: results of this run
+        :type new: list of dict
+        :param float threshold: the ratio of the best times considered a
+                                regression
+        :keyword float noise: differences below this many seconds are ignored
+        :returns: a list of (old result, new result) pairs
+        :rtype: list of tuple
+    """
+    key = lambda r: (r["benchmark"], r["operation"], r["scale"])
+    baseline = dict((key(r), r) for r in old)
+    regressions = []
+    for result in new:
+        previous = baseline.get(key(result))
+        if previous is None:
+            continue
+
+        if result["best"] > previous["best"] * threshold and \
+           result["best"] - previous["best"] > noise:
+            regressions.append((previous, result))
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark blivet's device tree")
+    parser.add_argument("-b", "--benchmark", action="append",
+                        choices=sorted(BENCHMARKS.keys()),
+                        help="benchmark to run (default: all)")
+    parser.add_argument("-s", "--scales",
+                        default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma-separated numbers of devices")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="runs of each benchmark, the best one counts")
+    parser.add_argument("--full", action="store_true",
+                        help="run every benchmark with every scale")
+    parser.add_argument("-o", "--output", help="file to write the results to")
+    parser.add_argument("-c", "--compare",
+                        help="results of a previous run to compare with")
+    parser.add_argument("-t", "--threshold", type=float, default=1.25,
+                        help="slowdown relative to --compare that fails")
+    args = parser.parse_args(argv)
+
+    names = args.benchmark or sorted(BENCHMARKS.keys())
+    scales = [int(s) for s in args.scales.split(",")]
+    results = run(names, scales, args.repeat, full=args.full, out=sys.stdout)
+
+    report = {"python": platform.python_version(),
+              "machine": platform.machine(),
+              "time": int(time.time()),
+              "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)["results"]
+
+        regressions = compare(old, results, args.threshold)
+        for (previous, result) in regressions:
+            print("REGRESSION %s %s %d: %.6fs -> %.6fs" %
+                  (result["benchmark"], result["operation"], result["scale"],
+                   previous["best"], result["best"]))
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
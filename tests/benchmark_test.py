@@ -0,0 +1,42 @@
+import unittest
+
+import mock
+import six
+
+from tests import benchmark
+
+class BenchmarkTestCase(unittest.TestCase):
+    def testRun(self):
+        """ Verify that every benchmark runs on a small tree. """
+        # partitioning needs parted to write to disk images, which is more
+        # than a unit test should depend on
+        names = sorted(n for n in benchmark.BENCHMARKS.keys()
+                       if n != "doPartitioning" and not benchmark.unavailable(n))
+        results = benchmark.run(names, [10], 1)
+        self.assertEqual(set(r["benchmark"] for r in results), set(names))
+        for result in results:
+            self.assertEqual(result["scale"], 10)
+            self.assertEqual(len(result["samples"]), 1)
+            self.assertGreater(result["operations"], 0)
+            self.assertGreaterEqual(result["best"], 0)
+
+    def testUnavailable(self):
+        """ Verify that benchmarks with missing dependencies are skipped. """
+        with mock.patch.object(benchmark, "unavailable", return_value=set(["mdadm"])):
+            out = six.StringIO()
+            self.assertEqual(benchmark.run(["lookups"], [10], 1, out=out), [])
+            self.assertIn("missing mdadm", out.getvalue())
+
+    def testCompare(self):
+        def result(best, scale=10):
+            return {"benchmark": "copy", "operation": "Blivet.copy",
+                    "scale": scale, "best": best}
+
+        old = [result(1.0), result(2.0, scale=100)]
+        self.assertEqual(benchmark.compare(old, [result(1.2)], 1.25), [])
+        self.assertEqual(benchmark.compare(old, [result(1.3)], 1.25),
+                         [(result(1.0), result(1.3))])
+        # results without a baseline are not regressions
+        self.assertEqual(benchmark.compare(old, [result(5.0, scale=1000)], 1.25), [])
+        # neither are differences lost in the noise
+        self.assertEqual(benchmark.compare([result(0.0001)], [result(0.0005)], 1.25), [])
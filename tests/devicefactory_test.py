@@ -3,6 +3,8 @@ import unittest
 from decimal import Decimal
 import os
 
+import mock
+
 import blivet
 
 from blivet import devicefactory
@@ -14,7 +16,7 @@ from blivet.devices import LVMLogicalVolumeDevice
 from blivet.devices import LVMThinLogicalVolumeDevice
 from blivet.devices import MDRaidArrayDevice
 from blivet.devices import PartitionDevice
-from blivet.errors import RaidError
+from blivet.errors import DeviceFactoryError, RaidError
 from blivet.formats import getFormat
 from blivet.size import Size
 from blivet.util import create_sparse_tempfile
@@ -194,6 +196,27 @@ class DeviceFactoryTestCase(unittest.TestCase):
                                sum(d.size for d in self.b.disks) - device_space,
                                delta=self._getSizeDelta(devices=[device]))
 
+    def testRevert(self):
+        ## a failed configure should leave the devices as they were before
+        kwargs = self._getTestFactoryArgs()
+        devices = self.b.devices
+        disklabels = [(d.format, len(d.format.partitions)) for d in self.b.disks]
+        factory = devicefactory.get_device_factory(self.b,
+                                                   self.device_type,
+                                                   Size("500 MiB"),
+                                                   disks=self.b.disks,
+                                                   **kwargs)
+        with mock.patch.object(factory, "_create_device",
+                               side_effect=DeviceFactoryError("failed")):
+            with self.assertRaises(DeviceFactoryError):
+                factory.configure()
+
+        self.assertEqual(self.b.devices, devices)
+        self.assertEqual(self.b.devicetree.findActions(action_type="create",
+                                                       object_type="device"), [])
+        for (disklabel, count) in disklabels:
+            self.assertEqual(len(disklabel.partitions), count)
+
     def testNormalizeSize(self):
         ## _normalize_size should adjust target size to within the format limits
         fstype = "ext2"
@@ -4,6 +4,7 @@ import os
 import inspect
 import logging
 import copy
+import threading
 
 from blivet.devicelibs import edd
 
@@ -71,9 +72,11 @@ class EddTestCase(unittest.TestCase):
         newlog.error = mock.Mock(name='error',
                         side_effect=self._edd_logger.error)
         edd.log = newlog
+        edd.invalidate_cache()
 
     def tearDown(self):
         edd.log = self._edd_logger
+        edd.invalidate_cache()
         edd.log.setLevel(self._edd_logger_level)
         edd.log.removeHandler(self.log_handler)
         edd.testdata_log.removeHandler(self.td_log_handler)
@@ -191,3 +194,47 @@ class EddTestCase(unittest.TestCase):
             ("edd: interface details: %s", "USB     \tserial_number: 30302e31"),
             ]
         self.checkLogs(debugs=debugs, infos=infos, warnings=warnings)
+
+    def test_collect_mbrs_timeout(self):
+        # a disk that never answers is skipped without holding up the others
+        self._set_fs_root(edd, "sata_usb")
+        devices = (FakeDevice("sda"), FakeDevice("sdb"))
+        read_mbrsig = edd._read_mbrsig
+        hang = threading.Event()
+        def fake_read_mbrsig(path):
+            if path.endswith("/sda"):
+                hang.wait()
+            return read_mbrsig(path)
+
+        try:
+            with mock.patch("blivet.devicelibs.edd._read_mbrsig",
+                            side_effect=fake_read_mbrsig):
+                with mock.patch("blivet.devicelibs.edd.mbr_read_timeout", 0.1):
+                    mbr_dict = edd.collect_mbrs(devices)
+        finally:
+            hang.set()
+
+        self.assertEqual(mbr_dict, {'sdb': '0x96a20d28'})
+        errors = [("edd: timed out reading mbrsig from disk %s", "sda")]
+        infos = [("edd: collected mbr signatures: %s", {'sdb': '0x96a20d28'})]
+        self.checkLogs(infos=infos, errors=errors)
+
+    def test_get_edd_dict_cache(self):
+        self._set_fs_root(edd, "sata_usb")
+        devices = (FakeDevice("sda"), FakeDevice("sdb"))
+        edd_dict = edd.get_edd_dict(devices)
+        self.assertEqual(edd_dict, {"sda": 0x80, "sdb": 0x81})
+
+        # same disks: the mapping is reused without reading anything
+        with mock.patch("blivet.devicelibs.edd._get_edd_dict") as get:
+            self.assertEqual(edd.get_edd_dict(devices), edd_dict)
+            self.assertFalse(get.called)
+
+            # a different set of disks is probed again
+            edd.get_edd_dict(devices[:1])
+            self.assertTrue(get.called)
+
+            get.reset_mock()
+            edd.invalidate_cache()
+            edd.get_edd_dict(devices)
+            self.assertTrue(get.called)
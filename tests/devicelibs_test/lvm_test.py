@@ -0,0 +1,65 @@
+import unittest
+import mock
+
+from blivet.devicelibs import lvm
+
+class FakeLV(object):
+    def __init__(self, vg_name, lv_name, **kwargs):
+        self.vg_name = vg_name
+        self.lv_name = lv_name
+        self.__dict__.update(kwargs)
+
+class LVMReportTestCase(unittest.TestCase):
+    def testVGLVs(self):
+        """ Verify that the LVs are reported once and indexed by VG. """
+        lvs = [FakeLV("vg1", "root"), FakeLV("vg1", "[pool_tdata]"),
+               FakeLV("vg2", "home")]
+        with mock.patch.object(lvm.blockdev.lvm, "lvs", return_value=lvs) as lvs_call:
+            report = lvm.LVMReport()
+            self.assertEqual(report.vgLVs("vg1"), {"vg1-root": lvs[0],
+                                                   "vg1-[pool_tdata]": lvs[1]})
+            self.assertEqual(report.vgLVs("vg2"), {"vg2-home": lvs[2]})
+            self.assertEqual(report.vgLVs("vg3"), {})
+            self.assertEqual(report.lvs["vg2-home"], lvs[2])
+            self.assertEqual(lvs_call.call_count, 1)
+
+    def testRelations(self):
+        """ Verify that relations between LVs are read by a single lvs run. """
+        lvs = [FakeLV("vg", "pool", data_lv="[pool_tdata]", metadata_lv="[pool_tmeta]"),
+               FakeLV("vg", "snap", origin="[snap_vorigin]"),
+               FakeLV("vg", "cached"), FakeLV("vg", "thin")]
+        out = ("  WARNING: something\n"
+               "  vg|cached||cpool||\n"
+               "  vg|thin||pool||\n"
+               "  vg|[cpool]|||[cpool_cdata]|[cpool_cmeta]\n")
+        with mock.patch.object(lvm.blockdev.lvm, "lvs", return_value=lvs):
+            with mock.patch.object(lvm.util, "run_program_and_capture_output",
+                                   return_value=(0, out)) as lvs_run:
+                report = lvm.LVMReport()
+                self.assertEqual(report.dataLV("vg", "pool"), "pool_tdata")
+                self.assertEqual(report.metadataLV("vg", "pool"), "pool_tmeta")
+                self.assertEqual(report.origin("vg", "snap"), "[snap_vorigin]")
+                self.assertFalse(lvs_run.called)
+
+                # the report has no pool_lv field, so lvs is run once for all LVs
+                self.assertEqual(report.cachePoolLV("vg", "cached"), "cpool")
+                self.assertEqual(report.poolLV("vg", "thin"), "pool")
+                self.assertEqual(report.dataLV("vg", "[cpool]"), "cpool_cdata")
+                self.assertEqual(report.metadataLV("vg", "cpool"), "cpool_cmeta")
+                self.assertIsNone(report.origin("vg", "thin"))
+                self.assertIsNone(report.poolLV("vg", "gone"))
+                self.assertEqual(lvs_run.call_count, 1)
+                self.assertIn("pool_lv", lvs_run.call_args[0][0][-1])
+
+    def testRelationsFailure(self):
+        """ Verify that a failed lvs run is reported for every relation. """
+        with mock.patch.object(lvm.blockdev.lvm, "lvs", return_value=[]), \
+             mock.patch.object(lvm.blockdev, "LVMError", RuntimeError), \
+             mock.patch.object(lvm.util, "run_program_and_capture_output",
+                               return_value=(5, "")) as lvs_run:
+            report = lvm.LVMReport()
+            with self.assertRaises(RuntimeError):
+                report.poolLV("vg", "thin")
+            with self.assertRaises(RuntimeError):
+                report.cachePoolLV("vg", "cached")
+            self.assertEqual(lvs_run.call_count, 1)
@@ -0,0 +1,52 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from blivet.devicelibs import superblock
+
+class SuperblockTestCase(unittest.TestCase):
+    def setUp(self):
+        (fd, self.path) = tempfile.mkstemp(prefix="blivet-superblock.")
+        os.close(fd)
+        self.addCleanup(os.unlink, self.path)
+
+    def _write(self, offset, data):
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            f.write(data)
+
+    def _writeExt(self, mnt_count, wtime):
+        sb = bytearray(120)
+        sb[44:58] = struct.pack("<IIHhH", 1000, wtime, mnt_count, -1,
+                                superblock.EXT_MAGIC)
+        sb[104:120] = bytearray(range(16))
+        self._write(superblock.EXT_SUPERBLOCK_OFFSET, bytes(sb))
+
+    def testExt(self):
+        self._writeExt(3, 2000)
+        fingerprint = superblock.fingerprint(self.path, "ext4")
+        self.assertEqual(fingerprint,
+                         ("ext", "000102030405060708090a0b0c0d0e0f", 3, 1000, 2000))
+        self.assertEqual(superblock.fingerprint(self.path, "ext4"), fingerprint)
+
+        self._writeExt(4, 2000)
+        self.assertNotEqual(superblock.fingerprint(self.path, "ext4"), fingerprint)
+
+    def testBtrfs(self):
+        sb = bytearray(0x50)
+        sb[0x20:0x30] = bytearray(range(16))
+        sb[0x40:0x48] = superblock.BTRFS_MAGIC
+        sb[0x48:0x50] = struct.pack("<Q", 42)
+        self._write(superblock.BTRFS_SUPERBLOCK_OFFSET, bytes(sb))
+        self.assertEqual(superblock.fingerprint(self.path, "btrfs"),
+                         ("btrfs", "000102030405060708090a0b0c0d0e0f", 42))
+
+    def testUnknown(self):
+        # no magic, unsupported type or missing device: no fingerprint
+        self._write(0, bytes(bytearray(0x10050)))
+        self.assertIsNone(superblock.fingerprint(self.path, "ext4"))
+        self.assertIsNone(superblock.fingerprint(self.path, "xfs"))
+        self.assertIsNone(superblock.fingerprint(self.path, "btrfs"))
+        self.assertIsNone(superblock.fingerprint(self.path, "vfat"))
+        self.assertIsNone(superblock.fingerprint(self.path + ".missing", "ext4"))
@@ -1,3 +1,5 @@
+import copy
+import mock
 import unittest
 
 from tests.imagebackedtestcase import ImageBackedTestCase
@@ -6,11 +8,17 @@ from blivet.size import Size
 from blivet import devicelibs
 from blivet import devicefactory
 from blivet import util
+from blivet.callbacks import attribute_changed
+from blivet.errors import DeviceError
 from blivet.udev import trigger
 from blivet.devices import LVMSnapShotDevice, LVMThinSnapShotDevice
 from blivet.devices import StorageDevice
+from blivet.devices import LVMLogicalVolumeDevice, LVMVolumeGroupDevice
+from blivet.devices.lvm import LVMCacheRequest
 from blivet.devicetree import DeviceTree
+from blivet.flags import flags
 from blivet.formats import getFormat
+from blivet.formats.fs import Ext4FS
 
 """
     TODO:
@@ -53,6 +61,384 @@ class DeviceTreeTestCase(unittest.TestCase):
 
         self.assertEqual(dt.resolveDevice(dev3.name), dev3)
 
+    def testResolveDeviceNodes(self):
+        """ Verify resolution of device node paths. """
+        dt = DeviceTree()
+
+        dev1 = StorageDevice("dev1", exists=True)
+        dt._addDevice(dev1)
+        dev2 = StorageDevice("dev2", exists=True,
+                             sysfsPath="/sys/devices/virtual/block/dm-3")
+        dt._addDevice(dev2)
+
+        links = {"/dev/disk/by-id/dev1-id": "/dev/dev1",
+                 "/dev/disk/by-partuuid/1234abcd-01": "/dev/dev1"}
+        with mock.patch("blivet.devicetree.blockdev") as blockdev:
+            with mock.patch("os.path.realpath", side_effect=links.get) as realpath:
+                # nodes of devices in the tree are found via their sysfs paths
+                self.assertEqual(dt.resolveDevice("/dev/dm-3"), dev2)
+                self.assertFalse(blockdev.dm.name_from_node.called)
+
+                self.assertEqual(dt.resolveDevice("PARTUUID=1234abcd-01"), dev1)
+                self.assertEqual(dt.resolveDevice("/dev/disk/by-id/dev1-id"), dev1)
+                self.assertEqual(realpath.call_count, 2)
+
+                # nodes are resolved again for every lookup
+                self.assertEqual(dt.resolveDevice("/dev/disk/by-id/dev1-id"), dev1)
+                self.assertEqual(realpath.call_count, 3)
+
+                # unless they are looked up in the same pass
+                nodeCache = {}
+                for _i in range(2):
+                    self.assertEqual(dt.resolveDevice("/dev/disk/by-id/dev1-id",
+                                                      nodeCache=nodeCache), dev1)
+                self.assertEqual(realpath.call_count, 4)
+
+    def testDeviceLookups(self):
+        """ Verify that the lookup indexes follow changes to the devices. """
+        dt = DeviceTree()
+
+        fmt1 = getFormat("ext4", label="label1", uuid="1111-1111")
+        dev1 = StorageDevice("dev1", exists=True, fmt=fmt1, uuid="dev1-uuid",
+                             sysfsPath="/devices/virtual/block/dev1")
+        dt._addDevice(dev1)
+
+        dev2 = StorageDevice("dev2", exists=True)
+        dt._addDevice(dev2)
+
+        self.assertEqual(dt.getDeviceByName("dev1"), dev1)
+        self.assertEqual(dt.getDeviceByPath("/dev/dev1"), dev1)
+        self.assertEqual(dt.getDeviceByUuid("dev1-uuid"), dev1)
+        self.assertEqual(dt.getDeviceByUuid("1111-1111"), dev1)
+        self.assertEqual(dt.getDeviceByLabel("label1"), dev1)
+        self.assertEqual(dt.getDeviceBySysfsPath("/devices/virtual/block/dev1"), dev1)
+        self.assertEqual(dt.getDeviceByID(dev2.id), dev2)
+
+        # attribute changes made directly on the devices are picked up
+        dev1.name = "dev3"
+        self.assertEqual(dt.getDeviceByName("dev1"), None)
+        self.assertEqual(dt.getDeviceByName("dev3"), dev1)
+        self.assertEqual(dt.getDeviceByPath("/dev/dev3"), dev1)
+
+        dev2.uuid = "dev2-uuid"
+        dev2.sysfsPath = "/devices/virtual/block/dev2"
+        self.assertEqual(dt.getDeviceByUuid("dev2-uuid"), dev2)
+        self.assertEqual(dt.getDeviceBySysfsPath("/devices/virtual/block/dev2"), dev2)
+
+        fmt1.label = "label2"
+        fmt1.uuid = "2222-2222"
+        self.assertEqual(dt.getDeviceByLabel("label1"), None)
+        self.assertEqual(dt.getDeviceByLabel("label2"), dev1)
+        self.assertEqual(dt.getDeviceByUuid("1111-1111"), None)
+        self.assertEqual(dt.getDeviceByUuid("2222-2222"), dev1)
+
+        dev2.format = getFormat("ext4", label="label1")
+        self.assertEqual(dt.getDeviceByLabel("label1"), dev2)
+
+        # hidden devices are only found on request
+        dt.hide(dev2)
+        self.assertEqual(dt.getDeviceByName("dev2"), None)
+        self.assertEqual(dt.getDeviceByName("dev2", hidden=True), dev2)
+        self.assertEqual(dt.getDeviceByID(dev2.id), None)
+        self.assertEqual(dt.getDeviceByID(dev2.id, hidden=True), dev2)
+
+        dt.unhide(dev2)
+        self.assertEqual(dt.getDeviceByName("dev2"), dev2)
+
+        dt._removeDevice(dev2)
+        self.assertEqual(dt.getDeviceByName("dev2", hidden=True), None)
+        self.assertEqual(dt.getDeviceByLabel("label1"), None)
+
+        with self.assertRaisesRegex(ValueError, "already in tree"):
+            dt._addDevice(StorageDevice("dev4", exists=True, uuid="dev1-uuid"))
+
+    def testDeviceRelations(self):
+        """ Verify children and dependent device queries. """
+        dt = DeviceTree()
+
+        disk = StorageDevice("disk", exists=True)
+        dt._addDevice(disk)
+        dev1 = StorageDevice("dev1", exists=True, parents=[disk])
+        dt._addDevice(dev1)
+        dev2 = StorageDevice("dev2", exists=True, parents=[dev1])
+        dt._addDevice(dev2)
+        dev3 = StorageDevice("dev3", exists=True, parents=[disk])
+        dt._addDevice(dev3)
+
+        self.assertEqual(dt.getChildren(disk), [dev1, dev3])
+        self.assertEqual(dt.getChildren(dev1), [dev2])
+        self.assertEqual(dt.getChildren(dev2), [])
+        self.assertEqual(dt.getDependentDevices(disk), [dev1, dev2, dev3])
+        self.assertEqual(dt.getDependentDevices(dev1), [dev2])
+
+        # hidden devices are only included on request
+        dt.hide(dev2)
+        self.assertEqual(dt.getChildren(dev1), [])
+        self.assertEqual(dt.getDependentDevices(disk), [dev1, dev3])
+        self.assertEqual(dt.getDependentDevices(disk, hidden=True),
+                         [dev1, dev3, dev2])
+        dt.unhide(dev2)
+
+        # the relations are copied along with the tree
+        dt_copy = copy.deepcopy(dt)
+        disk_copy = dt_copy.getDeviceByName("disk")
+        self.assertEqual([d.name for d in dt_copy.getDependentDevices(disk_copy)],
+                         ["dev1", "dev3", "dev2"])
+        self.assertTrue(all(d is dt_copy.getDeviceByID(d.id)
+                            for d in dt_copy.getDependentDevices(disk_copy)))
+        self.assertEqual(dt.getDependentDevices(disk), [dev1, dev3, dev2])
+
+        # relations follow changes to the parents
+        disk2 = StorageDevice("disk2", exists=True)
+        dt._addDevice(disk2)
+        dev1.parents.replace(disk, disk2)
+        dev3.parents.remove(disk)
+        self.assertEqual(dt.getChildren(disk), [])
+        self.assertEqual(dt.getDependentDevices(disk2), [dev1, dev2])
+
+    def testViews(self):
+        """ Verify that the uuids, labels and leaves views follow changes. """
+        dt = DeviceTree()
+
+        disk = StorageDevice("disk", exists=True, uuid="disk-uuid")
+        dt._addDevice(disk)
+        fmt1 = getFormat("ext4", label="root", uuid="fs1-uuid")
+        dev1 = StorageDevice("dev1", exists=True, parents=[disk], fmt=fmt1)
+        dt._addDevice(dev1)
+
+        self.assertEqual(dt.uuids, {"disk-uuid": disk, "fs1-uuid": dev1})
+        self.assertEqual(dt.labels, {"root": dev1})
+        self.assertEqual(dt.leaves, [dev1])
+
+        # the views are copies
+        dt.uuids.clear()
+        self.assertEqual(len(dt.uuids), 2)
+
+        # the device listed last wins
+        fmt2 = getFormat("ext4", label="root", uuid="fs2-uuid")
+        dev2 = StorageDevice("dev2", exists=True, fmt=fmt2)
+        dt._addDevice(dev2)
+        self.assertEqual(dt.labels, {"root": dev2})
+        self.assertEqual(dt.resolveDevice("LABEL=root"), dev2)
+        self.assertEqual(dt.leaves, [dev1, dev2])
+
+        fmt2.label = "home"
+        self.assertEqual(dt.labels, {"root": dev1, "home": dev2})
+
+        dev1.format = getFormat("swap", uuid="swap-uuid")
+        self.assertEqual(dt.uuids, {"disk-uuid": disk, "swap-uuid": dev1,
+                                    "fs2-uuid": dev2})
+        self.assertEqual(dt.labels, {"home": dev2})
+
+        dt.hide(dev2)
+        self.assertEqual(dt.labels, {})
+        self.assertEqual(dt.resolveDevice("UUID=fs2-uuid"), None)
+        self.assertEqual(dt.leaves, [dev1])
+
+        dt.unhide(dev2)
+        self.assertEqual(dt.resolveDevice("UUID=fs2-uuid"), dev2)
+
+        dt._removeDevice(dev1)
+        self.assertEqual(dt.leaves, [disk, dev2])
+        self.assertEqual(dt.uuids, {"disk-uuid": disk, "fs2-uuid": dev2})
+
+    def testRevision(self):
+        """ Verify that changes to the tree change its revision. """
+        dt = DeviceTree()
+        revisions = [dt.revision]
+        def assertChanged():
+            self.assertNotIn(dt.revision, revisions)
+            revisions.append(dt.revision)
+
+        disk = StorageDevice("disk", exists=True)
+        dt._addDevice(disk)
+        assertChanged()
+        dev = StorageDevice("dev", exists=True, parents=[disk])
+        dt._addDevice(dev)
+        assertChanged()
+
+        # lookups do not change the tree
+        self.assertEqual(dt.getDeviceByName("dev"), dev)
+        self.assertEqual(dt.getChildren(disk), [dev])
+        self.assertEqual(dt.getPartitionsByDisk(disk), [])
+        self.assertEqual(dt.revision, revisions[-1])
+
+        dt.hide(dev)
+        assertChanged()
+        dt.unhide(dev)
+        assertChanged()
+
+        snapshot = dt.snapshot()
+        dt.recursiveRemove(dev)
+        assertChanged()
+        dt.restore(snapshot)
+        assertChanged()
+
+        # the revisions of different trees never match
+        self.assertNotIn(DeviceTree().revision, revisions)
+
+    def testPrefetchSizeInfo(self):
+        """ Verify that filesystem size info is gathered on demand. """
+        dt = DeviceTree()
+        for name in ("sda1", "sdb1"):
+            fmt = getFormat("ext4", device="/dev/" + name, exists=True)
+            fmt._sizeInfoPending = True
+            fmt._resize = mock.Mock(available=True)
+            dt._addDevice(StorageDevice(name, fmt=fmt, exists=True,
+                                        size=Size("1 GiB")))
+        (sda1, sdb1) = dt.devices
+
+        active = set([sda1.path])
+        def updateSizeInfo(fs):
+            fs._size = Size("1 GiB")
+            fs._resizable = True
+
+        with mock.patch.object(Ext4FS, "_updateSizeInfo", autospec=True,
+                               side_effect=updateSizeInfo) as update, \
+             mock.patch("blivet.formats.fs.os.path.exists",
+                        side_effect=lambda path: path in active), \
+             mock.patch.object(StorageDevice, "status",
+                               property(lambda d: d.path in active)), \
+             mock.patch.object(StorageDevice, "setup", autospec=True,
+                               side_effect=lambda d, **kw: active.add(d.path)) as setup, \
+             mock.patch.object(StorageDevice, "teardown", autospec=True,
+                               side_effect=lambda d, **kw: active.discard(d.path)) as teardown:
+            # describing a filesystem does not probe it
+            self.assertTrue(sda1.format.dict["sizeInfoPending"])
+            self.assertFalse(update.called)
+
+            # an active filesystem is probed when its size is first needed
+            self.assertEqual(sda1.format.currentSize, Size("1 GiB"))
+            self.assertEqual(sda1.format.targetSize, Size("1 GiB"))
+            self.assertTrue(sda1.format.resizable)
+            self.assertEqual(update.call_count, 1)
+
+            # an inactive one is not where devices must not be set up,
+            # which is logged once
+            with mock.patch("blivet.formats.fs.log") as log, \
+                 dt.noSizeInfoSetup():
+                self.assertEqual(sdb1.format.currentSize, Size(0))
+                self.assertFalse(sdb1.format.resizable)
+            self.assertTrue(sdb1.format.sizeInfoPending)
+            self.assertEqual(log.warning.call_count, 1)
+            self.assertFalse(setup.called)
+
+            # otherwise its device is set up and torn down again for it
+            self.assertTrue(sdb1.format.resizable)
+            self.assertEqual(update.call_count, 2)
+            self.assertFalse(sdb1.format.sizeInfoPending)
+            self.assertEqual(sdb1.format.currentSize, Size("1 GiB"))
+            setup.assert_called_once_with(sdb1)
+            teardown.assert_called_once_with(sdb1, recursive=True)
+            self.assertEqual(active, set([sda1.path]))
+
+            # prefetching probes many filesystems at once, also concurrently
+            sda1.format._sizeInfoPending = True
+            sdb1.format._sizeInfoPending = True
+            with mock.patch.object(flags, "size_info_workers", 2):
+                dt.prefetchSizeInfo()
+            self.assertEqual(update.call_count, 4)
+            self.assertFalse(any(d.format.sizeInfoPending for d in dt.devices))
+            self.assertEqual(setup.call_count, 2)
+            self.assertEqual(active, set([sda1.path]))
+
+            # devices that fail to set up are not tried again
+            sdb1.format._sizeInfoPending = True
+            setup.reset_mock()
+            setup.side_effect = DeviceError("failed")
+            sdb1.format.minSize # pylint: disable=pointless-statement
+            dt.prefetchSizeInfo()
+            sdb1.format.currentSize # pylint: disable=pointless-statement
+            setup.assert_called_once_with(sdb1)
+            self.assertTrue(sdb1.format.sizeInfoPending)
+
+    def testSetupDoesNotProbe(self):
+        """ Verify that setting up a device does not probe its filesystem. """
+        fmt = getFormat("ext4", device="/dev/sda1", exists=True)
+        fmt._sizeInfoPending = True
+        device = StorageDevice("sda1", fmt=fmt, exists=True, size=Size("1 GiB"))
+        with mock.patch.object(Ext4FS, "_updateSizeInfo") as update, \
+             mock.patch("blivet.devices.storage.udev"), \
+             mock.patch.object(StorageDevice, "updateSysfsPath"):
+            device._postSetup()
+        self.assertFalse(update.called)
+        self.assertTrue(fmt.sizeInfoPending)
+
+    def testSnapshot(self):
+        """ Verify that a restored snapshot undoes changes to the tree. """
+        dt = DeviceTree()
+
+        disk = StorageDevice("disk", exists=True)
+        dt._addDevice(disk)
+        dev1 = StorageDevice("dev1", exists=True, parents=[disk],
+                             fmt=getFormat("ext4", label="label1", exists=True))
+        dt._addDevice(dev1)
+        dev2 = StorageDevice("dev2", exists=True, parents=[disk])
+        dt._addDevice(dev2)
+        # objects below the devices are saved too
+        dev1.cacheRequest = LVMCacheRequest(Size("1 GiB"), [disk])
+        callbacks = len(attribute_changed._cb_list)
+
+        snapshot = dt.snapshot()
+
+        dt.recursiveRemove(dev2)
+        dev3 = StorageDevice("dev3", exists=True, parents=[dev1])
+        dt._addDevice(dev3)
+        dev1.format.label = "label2"
+        dev1.parents.remove(disk)
+        dev1.cacheRequest._size = Size("2 GiB")
+        dev1.cacheRequest._fast_pvs.append(dev2)
+        self.assertEqual(dt.devices, [disk, dev1, dev3])
+        self.assertNotEqual(dt.findActions(), [])
+
+        dt.restore(snapshot)
+        self.assertEqual(dt.devices, [disk, dev1, dev2])
+        self.assertEqual(dt.names, ["disk", "dev1", "dev2"])
+        self.assertEqual(dt.findActions(), [])
+        self.assertEqual(list(dev1.parents), [disk])
+        self.assertEqual(dev1.format.label, "label1")
+        self.assertEqual(dt.getChildren(disk), [dev1, dev2])
+        self.assertEqual(dt.getChildren(dev1), [])
+        self.assertEqual(dt.getDependentDevices(disk), [dev1, dev2])
+        self.assertEqual(dt.getDeviceByLabel("label1"), dev1)
+        self.assertIsNone(dt.getDeviceByLabel("label2"))
+        self.assertIsNone(dt.getDeviceByName("dev3"))
+        self.assertEqual(dev1.cacheRequest.size, Size("1 GiB"))
+        self.assertEqual(dev1.cacheRequest.fast_devs, [disk])
+
+        # the replaced index no longer follows changes to the devices
+        self.assertEqual(len(attribute_changed._cb_list), callbacks)
+
+        # a snapshot can be restored more than once
+        dt._removeDevice(dev2)
+        dt.restore(snapshot)
+        self.assertEqual(dt.devices, [disk, dev1, dev2])
+
+    @unittest.skipUnless(not any(x.unavailableTypeDependencies() for x in [LVMLogicalVolumeDevice, LVMVolumeGroupDevice]), "some unsupported device classes required for this test")
+    def testLVMDeviceLookups(self):
+        """ Verify lookups of lvm devices by name and path. """
+        dt = DeviceTree()
+
+        pv = StorageDevice("pv1", exists=True, fmt=getFormat("lvmpv"),
+                           size=Size("1 GiB"))
+        dt._addDevice(pv)
+        vg = LVMVolumeGroupDevice("my-vg", parents=[pv], exists=True)
+        dt._addDevice(vg)
+        lv = LVMLogicalVolumeDevice("my-lv", parents=[vg], exists=True,
+                                    size=Size("512 MiB"))
+        dt._addDevice(lv)
+
+        self.assertEqual(dt.getDeviceByName("my-vg-my-lv"), lv)
+        self.assertEqual(dt.getDeviceByName("my--vg-my--lv"), lv)
+        self.assertEqual(dt.getDeviceByPath("/dev/mapper/my--vg-my--lv"), lv)
+        self.assertEqual(dt.getDeviceByName("my--vg"), vg)
+
+        # renaming the vg renames the lv as well
+        vg.name = "vg2"
+        self.assertEqual(dt.getDeviceByName("my-vg-my-lv"), None)
+        self.assertEqual(dt.getDeviceByName("vg2-my-lv"), lv)
+        self.assertEqual(dt.getDeviceByPath("/dev/mapper/vg2-my--lv"), lv)
+
 def recursive_getattr(x, attr, default=None):
     """ Resolve a possibly-dot-containing attribute name. """
     val = x
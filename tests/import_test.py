@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# modules that are expensive to import or initialize and that a plain
+# "import blivet" must not pull in
+HEAVY_MODULES = ["gi.repository.BlockDev", "hawkey", "parted", "pyudev",
+                 "blivet.formats", "blivet.devices", "blivet.iscsi",
+                 "blivet.fcoe", "blivet.zfcp"]
+
+@unittest.skipUnless(sys.version_info >= (3, 7), "-X importtime requires python 3.7")
+class ImportTimeTestCase(unittest.TestCase):
+    def _importTimes(self, statement):
+        """ Return the cumulative import times (in us) of all modules imported. """
+        env = dict(os.environ)
+        paths = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        if env.get("PYTHONPATH"):
+            paths.append(env["PYTHONPATH"])
+        env["PYTHONPATH"] = os.pathsep.join(paths)
+        proc = subprocess.Popen([sys.executable, "-X", "importtime", "-c", statement],
+                                stderr=subprocess.PIPE, env=env)
+        (_out, err) = proc.communicate()
+        self.assertEqual(proc.returncode, 0, err)
+
+        times = {}
+        for line in err.decode("utf-8").splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+
+            (_self, cumulative, name) = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative)
+
+        return times
+
+    def testImportBlivet(self):
+        """ Verify that importing blivet does not import heavy subsystems. """
+        times = self._importTimes("import blivet")
+        self.assertIn("blivet", times)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, times)
+
+    def testImportDevices(self):
+        """ Verify that the device classes do not need installation support. """
+        times = self._importTimes("import blivet.devices")
+        self.assertIn("blivet.devices", times)
+        for module in ("hawkey", "blivet.iscsi", "blivet.zfcp"):
+            self.assertNotIn(module, times)
+
+    def testImportBlivetClass(self):
+        """ Verify that the Blivet class defers the installation support.
+
+            The class needs the device and format classes, and with them
+            parted, right away. Those are not deferred.
+        """
+        times = self._importTimes("import blivet.blivet")
+        self.assertIn("blivet.blivet", times)
+        for module in ("hawkey", "blivet.iscsi", "blivet.zfcp"):
+            self.assertNotIn(module, times)
@@ -0,0 +1,101 @@
+import io
+import threading
+import unittest
+import mock
+
+from blivet.mounts import MountsCache
+
+MOUNTINFO = u"""\
+22 1 253:0 / / rw,relatime shared:1 - ext4 /dev/mapper/root rw,seclabel
+40 22 8:1 / /boot rw,relatime shared:27 - ext4 /dev/sda1 rw,seclabel
+41 22 8:2 /home /home rw,relatime shared:28 - btrfs /dev/sda2 rw,subvol=/home
+42 22 8:2 / /mnt/btrfs rw,relatime shared:29 - btrfs /dev/sda2 rw,subvol=/
+43 22 8:1 / /mnt/boot rw,relatime shared:30 - ext4 /dev/sda1 rw,seclabel
+44 22 0:40 / /tmp rw,nosuid,nodev shared:31 - tmpfs tmpfs rw,seclabel
+"""
+
+class MountsCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = MountsCache()
+        self.cache._mountinfo = io.StringIO(MOUNTINFO)
+        self.cache._poller = mock.Mock()
+        self.cache._poller.poll.return_value = [(3, 10)]
+
+        names = {"/dev/mapper/root": "dm-0", "/dev/sda1": "sda1",
+                 "/dev/sda2": "sda2"}
+        snapshot = mock.Mock()
+        snapshot.return_value.resolve_devspec.side_effect = lambda spec, sysname: names.get(spec)
+        patcher = mock.patch("blivet.mounts.DeviceSnapshot", snapshot)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("blivet.mounts.resolve_devspec", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def testMountpoints(self):
+        """ Verify that the mountpoints are read from mountinfo. """
+        self.assertEqual(self.cache.getMountpoints("/dev/sda1"), ["/boot", "/mnt/boot"])
+        self.assertEqual(self.cache.getMountpoints("/dev/mapper/root"), ["/"])
+        self.assertEqual(self.cache.getMountpoints("/dev/sda2", "home"), ["/home"])
+        self.assertEqual(self.cache.getMountpoints("/dev/sda2", 5), ["/mnt/btrfs"])
+        self.assertEqual(self.cache.getMountpoints("/dev/sda2"), [])
+        self.assertEqual(self.cache.getMountpoints("tmpfs"), [])
+
+        self.assertTrue(self.cache.isMountpoint("/mnt/boot"))
+        self.assertTrue(self.cache.isMountpoint("/tmp"))
+        self.assertFalse(self.cache.isMountpoint("/mnt"))
+
+    def testChanges(self):
+        """ Verify that mountinfo is only parsed after it changed. """
+        with mock.patch.object(self.cache, "_getActiveMounts",
+                               wraps=self.cache._getActiveMounts) as get_mounts:
+            self.assertTrue(self.cache.isMountpoint("/boot"))
+            self.assertEqual(get_mounts.call_count, 1)
+
+            self.cache._poller.poll.return_value = []
+            self.assertTrue(self.cache.isMountpoint("/boot"))
+            self.assertEqual(self.cache.getMountpoints("/dev/sda1"), ["/boot", "/mnt/boot"])
+            self.assertEqual(get_mounts.call_count, 1)
+
+            self.cache._mountinfo = io.StringIO(MOUNTINFO.replace("/boot", "/efi"))
+            self.cache._poller.poll.return_value = [(3, 10)]
+            self.assertFalse(self.cache.isMountpoint("/boot"))
+            self.cache._poller.poll.return_value = []
+            self.assertTrue(self.cache.isMountpoint("/efi"))
+            self.assertEqual(get_mounts.call_count, 2)
+
+    def testConcurrentChanges(self):
+        """ Verify that threads wait for a change to be read by another one. """
+        self.assertTrue(self.cache.isMountpoint("/boot"))
+
+        reading = threading.Event()
+        release = threading.Event()
+        get_active_mounts = self.cache._getActiveMounts
+        def slowGetActiveMounts():
+            reading.set()
+            release.wait()
+            get_active_mounts()
+
+        # the change is only reported to the first thread polling
+        self.cache._mountinfo = io.StringIO(MOUNTINFO.replace("/boot", "/efi"))
+        self.cache._poller.poll.side_effect = [[(3, 10)], [], []]
+        results = {}
+        def check(path):
+            results[path] = self.cache.isMountpoint(path)
+
+        with mock.patch.object(self.cache, "_getActiveMounts",
+                               side_effect=slowGetActiveMounts):
+            first = threading.Thread(target=check, args=("/efi",))
+            first.start()
+            reading.wait()
+            second = threading.Thread(target=check, args=("/mnt/efi",))
+            second.start()
+            try:
+                second.join(0.1)
+                self.assertTrue(second.is_alive())
+            finally:
+                release.set()
+                first.join()
+                second.join()
+
+        self.assertEqual(results, {"/efi": True, "/mnt/efi": True})
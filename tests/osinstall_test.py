@@ -0,0 +1,163 @@
+import os
+import unittest
+import mock
+
+from blivet import osinstall
+from blivet import getSysroot
+from blivet.flags import flags
+
+class FindExistingInstallationsTestCase(unittest.TestCase):
+    def setUp(self):
+        osinstall.invalidate_cache()
+        self.addCleanup(osinstall.invalidate_cache)
+
+        self.fstabs = []
+        self.nodeCaches = []
+        def parseFSTab(_devicetree, chroot=None, nodeCache=None):
+            with open(os.path.join(chroot, "etc/fstab")) as f:
+                self.fstabs.append(f.read())
+            self.nodeCaches.append(nodeCache)
+            return ({"/": mock.sentinel.root}, [])
+
+        patcher = mock.patch.multiple(osinstall,
+                                      _probeInstallation=mock.DEFAULT,
+                                      parseFSTab=mock.Mock(side_effect=parseFSTab),
+                                      superblock=mock.DEFAULT,
+                                      CACHE_INSTALLATIONS=True)
+        self.patched = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.fingerprints = {}
+        self.patched["superblock"].fingerprint.side_effect = \
+            lambda path, fstype: self.fingerprints.get(path)
+
+        self.devicetree = mock.Mock()
+        self.devicetree.leaves = [self._device("sda1"), self._device("sdb1")]
+
+    def _device(self, name):
+        device = mock.Mock(name=name, id=len(self.fingerprints), path="/dev/" + name,
+                           controllable=True)
+        device.name = name
+        device.format.configure_mock(linuxNative=True, mountable=True,
+                                     uuid=name + "-uuid", type="ext4",
+                                     options="defaults", systemMountpoint=None)
+        self.fingerprints[device.path] = (name, 1)
+        return device
+
+    def _probe(self, device, _mountpoint):
+        if device.name == "sdb1":
+            # no /etc/fstab
+            return (True, None)
+
+        release = ("x86_64", "Fedora", "23")
+        return (True, (release, {"etc/fstab": "/dev/sda1 / ext4 defaults 1 1\n",
+                                 "etc/crypttab": None}))
+
+    def testFind(self):
+        probe = self.patched["_probeInstallation"]
+        probe.side_effect = self._probe
+
+        roots = osinstall._findExistingInstallations(self.devicetree)
+        self.assertEqual(len(roots), 1)
+        self.assertEqual(roots[0].name, "Fedora Linux 23 for x86_64")
+        self.assertEqual(roots[0].mounts, {"/": mock.sentinel.root})
+        self.assertEqual(self.fstabs, ["/dev/sda1 / ext4 defaults 1 1\n"])
+        self.assertEqual([c[0][1] for c in probe.call_args_list],
+                         [getSysroot(), getSysroot()])
+        self.devicetree.leaves[1].teardown.assert_called_once_with(recursive=True)
+
+        # unchanged filesystems are not mounted again
+        probe.reset_mock()
+        roots = osinstall._findExistingInstallations(self.devicetree)
+        self.assertEqual(len(roots), 1)
+        self.assertFalse(probe.called)
+        self.assertEqual(self.devicetree.leaves[1].teardown.call_count, 2)
+
+        # changed ones are
+        self.fingerprints["/dev/sda1"] = ("sda1", 2)
+        osinstall._findExistingInstallations(self.devicetree)
+        self.assertEqual(probe.call_count, 1)
+        self.assertEqual(probe.call_args[0][0], self.devicetree.leaves[0])
+
+        # so are mounted ones
+        probe.reset_mock()
+        self.devicetree.leaves[0].format.systemMountpoint = "/mnt/sda1"
+        osinstall._findExistingInstallations(self.devicetree)
+        osinstall._findExistingInstallations(self.devicetree)
+        self.assertEqual(probe.call_count, 2)
+
+        # and everything once the cache is dropped
+        probe.reset_mock()
+        osinstall.invalidate_cache()
+        osinstall._findExistingInstallations(self.devicetree)
+        self.assertEqual(probe.call_count, 2)
+
+    def testCacheDisabled(self):
+        probe = self.patched["_probeInstallation"]
+        probe.side_effect = self._probe
+
+        with mock.patch.object(osinstall, "CACHE_INSTALLATIONS", False):
+            osinstall._findExistingInstallations(self.devicetree)
+            osinstall._findExistingInstallations(self.devicetree)
+
+        self.assertEqual(probe.call_count, 4)
+        self.assertFalse(self.patched["superblock"].fingerprint.called)
+
+    def testFindSerially(self):
+        calls = []
+        for device in self.devicetree.leaves:
+            device.setup.side_effect = lambda d=device: calls.append(("setup", d.name))
+            device.teardown.side_effect = lambda recursive, d=device: calls.append(("teardown", d.name))
+
+        def probe(device, mountpoint):
+            calls.append(("probe", device.name))
+            return self._probe(device, mountpoint)
+
+        self.patched["_probeInstallation"].side_effect = probe
+        osinstall._findExistingInstallations(self.devicetree)
+        self.assertEqual(calls, [("setup", "sda1"), ("probe", "sda1"),
+                                 ("setup", "sdb1"), ("probe", "sdb1"),
+                                 ("teardown", "sdb1")])
+
+    def testNodeCache(self):
+        self.patched["_probeInstallation"].side_effect = \
+            lambda device, _mountpoint: self._probe(self.devicetree.leaves[0], None)
+
+        def setup(device):
+            # the fstabs are only parsed once all devices are set up
+            self.assertEqual(self.fstabs, [])
+
+        for device in self.devicetree.leaves:
+            device.setup.side_effect = lambda d=device: setup(d)
+
+        roots = osinstall._findExistingInstallations(self.devicetree)
+        self.assertEqual(len(roots), 2)
+
+        # the device nodes are resolved once for all installations, but not
+        # across calls
+        self.assertIs(self.nodeCaches[0], self.nodeCaches[1])
+        self.fstabs = []
+        osinstall._findExistingInstallations(self.devicetree)
+        self.assertIsNot(self.nodeCaches[2], self.nodeCaches[0])
+        self.assertIs(self.nodeCaches[2], self.nodeCaches[3])
+
+    def testFindConcurrently(self):
+        probe = self.patched["_probeInstallation"]
+        probe.side_effect = self._probe
+
+        with mock.patch.object(flags, "installation_workers", 2):
+            roots = osinstall._findExistingInstallations(self.devicetree)
+
+        self.assertEqual(len(roots), 1)
+        self.assertEqual(roots[0].name, "Fedora Linux 23 for x86_64")
+        mountpoints = [c[0][1] for c in probe.call_args_list]
+        self.assertEqual(len(set(mountpoints)), 2)
+        for mountpoint in mountpoints:
+            self.assertNotEqual(mountpoint, getSysroot())
+            self.assertFalse(os.path.exists(mountpoint))
+
+    def testMountFailure(self):
+        self.patched["_probeInstallation"].return_value = (False, None)
+        self.assertEqual(osinstall._findExistingInstallations(self.devicetree), [])
+        for device in self.devicetree.leaves:
+            self.assertFalse(device.teardown.called)
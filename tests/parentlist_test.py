@@ -76,3 +76,64 @@ class ParentListTestCase(unittest.TestCase):
 
         dev3.parents = []
         self.assertEqual(len(dev3.parents), 0)
+
+    def testDeviceAncestors(self):
+        """ Verify that dependsOn and ancestors follow changes to parents. """
+        disk1 = Device("disk1")
+        disk2 = Device("disk2")
+        md = Device("md", [disk1])
+        luks = Device("luks", [md])
+        pv = Device("pv", [luks])
+
+        self.assertTrue(pv.dependsOn(disk1))
+        self.assertTrue(pv.dependsOn(md))
+        self.assertFalse(pv.dependsOn(disk2))
+        self.assertFalse(pv.dependsOn(pv))
+        self.assertFalse(disk1.dependsOn(pv))
+        self.assertEqual(set(pv.ancestors), set([pv, luks, md, disk1]))
+
+        # changes to the parents of unrelated devices keep the cached ancestors
+        cache = pv._ancestorCache
+        other = Device("other", [disk2])
+        other.parents.append(disk1)
+        self.assertFalse(other.dependsOn(pv))
+        self.assertIs(pv._ancestorCache, cache)
+
+        # changes to the parents of an ancestor are seen by all descendants
+        md.parents.append(disk2)
+        self.assertTrue(pv.dependsOn(disk2))
+        self.assertEqual(set(pv.ancestors), set([pv, luks, md, disk1, disk2]))
+
+        md.parents.remove(disk1)
+        self.assertFalse(pv.dependsOn(disk1))
+        self.assertFalse(luks.dependsOn(disk1))
+
+        disk3 = Device("disk3")
+        md.parents.replace(disk2, disk3)
+        self.assertFalse(pv.dependsOn(disk2))
+        self.assertTrue(pv.dependsOn(disk3))
+
+        luks.parents = []
+        self.assertFalse(pv.dependsOn(md))
+        self.assertEqual(set(pv.ancestors), set([pv, luks]))
+
+    def testDeviceChildren(self):
+        """ Verify that Device.children follows changes to parents. """
+        dev1 = Device("dev1")
+        dev2 = Device("dev2")
+        dev3 = Device("dev3", [dev1])
+        self.assertEqual(dev1.children, [dev3])
+        self.assertEqual(dev2.children, [])
+
+        dev3.parents.append(dev2)
+        self.assertEqual(dev2.children, [dev3])
+
+        dev3.parents.remove(dev1)
+        self.assertEqual(dev1.children, [])
+
+        dev3.parents.replace(dev2, dev1)
+        self.assertEqual(dev1.children, [dev3])
+        self.assertEqual(dev2.children, [])
+
+        dev3.parents = []
+        self.assertEqual(dev1.children, [])
@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from blivet import populator
+from blivet.devices import DiskDevice, StorageDevice
+from blivet.devicetree import DeviceTree
+from blivet.flags import flags
+
+class FakeUdevDevice(dict):
+    sys_name = "sda"
+    sys_path = "/sys/devices/virtual/block/sda"
+
+class PopulatorProbeTestCase(unittest.TestCase):
+    def setUp(self):
+        self._workers = flags.populate_workers
+
+    def tearDown(self):
+        flags.populate_workers = self._workers
+
+    def testPrefetchProbes(self):
+        """ Verify that concurrently run probes are used by the populator. """
+        info = FakeUdevDevice({"DEVNAME": "/dev/sda", "DEVTYPE": "disk"})
+        sysfs_attr = mock.Mock(return_value="1")
+        mpath_member = mock.Mock(side_effect=RuntimeError("no multipath"))
+        probes = {"sysfs_attr": sysfs_attr, "mpath_member": mpath_member}
+
+        with mock.patch.dict(populator._PROBES, probes):
+            p = populator.Populator()
+
+            # without workers probes are run when their results are needed
+            flags.populate_workers = 0
+            p._prefetchProbes([info])
+            self.assertFalse(sysfs_attr.called)
+            self.assertEqual(p._probe("sysfs_attr", info.sys_path, "ro"), "1")
+            self.assertEqual(sysfs_attr.call_count, 1)
+
+            flags.populate_workers = 4
+            p._prefetchProbes([info])
+            self.assertEqual(sysfs_attr.call_count, 4)
+            self.assertEqual(mpath_member.call_count, 1)
+
+            # results and errors are reported from the prefetched probes
+            self.assertEqual(p._probe("sysfs_attr", info.sys_path, "ro"), "1")
+            with self.assertRaisesRegex(RuntimeError, "no multipath"):
+                p._probe("mpath_member", "/dev/sda")
+
+            self.assertEqual(sysfs_attr.call_count, 4)
+            self.assertEqual(mpath_member.call_count, 1)
+
+    def testPlannedProbes(self):
+        """ Verify that format probes are planned for raid members. """
+        info = FakeUdevDevice({"DEVNAME": "/dev/sda", "DEVTYPE": "disk",
+                               "ID_FS_TYPE": "via_raid_member",
+                               "ID_FS_UUID": "uuid", "MAJOR": "8", "MINOR": "0"})
+        with mock.patch.object(flags, "dmraid", True):
+            self.assertIn(("dmraid_sets", ("uuid", "sda", 8, 0)),
+                          populator._plannedProbes(info))
+
+        with mock.patch.object(flags, "dmraid", False):
+            self.assertNotIn("dmraid_sets",
+                             [n for (n, _a) in populator._plannedProbes(info)])
+
+    def testRelatedSysfsPaths(self):
+        """ Verify that partitions and holders of a device are found. """
+        root = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        disk = os.path.join(root, "sda")
+        for path in ("sda/sda1", "sda/holders", "sda/queue", "dm-0"):
+            os.makedirs(os.path.join(root, path))
+        for path in ("sda/dev", "sda/sda1/dev", "dm-0/dev"):
+            open(os.path.join(root, path), "w").close()
+        os.symlink(os.path.join(root, "dm-0"), os.path.join(disk, "holders", "dm-0"))
+
+        self.assertEqual(populator._relatedSysfsPaths(disk),
+                         [os.path.join(disk, "sda1"), os.path.join(root, "dm-0")])
+        self.assertEqual(populator._relatedSysfsPaths(os.path.join(root, "gone")), [])
+
+class PopulatorUpdateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dt = DeviceTree()
+        self.disk = DiskDevice("disk", exists=True,
+                               sysfsPath="/sys/devices/virtual/block/disk")
+        self.dt._addDevice(self.disk)
+        self.part = StorageDevice("part", exists=True, parents=[self.disk],
+                                  sysfsPath="/sys/devices/virtual/block/disk/part")
+        self.dt._addDevice(self.part)
+        self.other = DiskDevice("other", exists=True,
+                                sysfsPath="/sys/devices/virtual/block/other")
+        self.dt._addDevice(self.other)
+
+    @mock.patch("blivet.populator.udev")
+    def testUpdateRemoved(self, udev):
+        """ Verify that removed devices are dropped with their dependents. """
+        udev.get_device.return_value = None
+        self.dt._populator.update([self.disk.sysfsPath])
+        self.assertEqual(self.dt.devices, [self.other])
+        self.assertFalse(udev.get_devices.called)
+
+    @mock.patch("blivet.populator.udev")
+    def testUpdateChanged(self, udev):
+        """ Verify that changed devices are scanned again. """
+        info = FakeUdevDevice()
+        udev.get_device.return_value = info
+        udev.device_get_name.return_value = "disk"
+        udev.device_get_sysfs_path.return_value = self.disk.sysfsPath
+        with mock.patch.object(self.dt._populator, "addUdevDevice") as add, \
+             mock.patch.object(self.disk, "updateSize") as update_size, \
+             mock.patch("blivet.populator._relatedSysfsPaths", return_value=[]):
+            self.dt._populator.update([self.disk.sysfsPath])
+            add.assert_called_once_with(info, updateOrigFmt=True)
+            self.assertTrue(update_size.called)
+
+        self.assertEqual(self.dt.devices, [self.disk, self.other])
+        self.assertIsNone(self.disk.format.type)
+        self.assertFalse(udev.get_devices.called)
+
+    @mock.patch("blivet.populator.udev")
+    def testUpdateNewPartition(self, udev):
+        """ Verify that only new devices below the changed one are added. """
+        disk_info = FakeUdevDevice({"name": "disk"})
+        part_info = FakeUdevDevice({"name": "part2"})
+        sysfs_path = self.disk.sysfsPath + "/part2"
+        infos = {self.disk.sysfsPath: disk_info, sysfs_path: part_info}
+        udev.get_device.side_effect = infos.get
+        udev.device_get_name.side_effect = lambda i: i["name"]
+        udev.device_get_sysfs_path.side_effect = \
+            lambda i: [p for (p, v) in infos.items() if v is i][0]
+        related = {self.disk.sysfsPath: [sysfs_path]}
+        with mock.patch.object(self.dt._populator, "addUdevDevice") as add, \
+             mock.patch.object(self.disk, "updateSize"), \
+             mock.patch("blivet.populator._relatedSysfsPaths",
+                        side_effect=lambda p: related.get(p, [])):
+            self.dt._populator.update([self.disk.sysfsPath])
+            self.assertEqual(add.call_args_list,
+                             [mock.call(disk_info, updateOrigFmt=True),
+                              mock.call(part_info)])
+
+        self.assertFalse(udev.get_devices.called)
+
+    def testUpdateWithActions(self):
+        """ Verify that updates are refused while actions are scheduled. """
+        self.dt.recursiveRemove(self.part)
+        with self.assertRaisesRegex(populator.DeviceTreeError, "actions"):
+            self.dt._populator.update([self.disk.sysfsPath])
+
+    def testProcessUdevEvents(self):
+        """ Verify that udev events are collected into a single update. """
+        events = [mock.Mock(subsystem="block", sys_path=self.disk.sysfsPath),
+                  mock.Mock(subsystem="net", sys_path="/sys/class/net/eth0"),
+                  mock.Mock(subsystem="block", sys_path=self.disk.sysfsPath),
+                  mock.Mock(subsystem="block", sys_path=self.other.sysfsPath),
+                  None]
+        monitor = mock.Mock()
+        monitor.poll.side_effect = events
+        with mock.patch.object(self.dt, "updateDevices") as update:
+            self.assertEqual(self.dt.processUdevEvents(monitor), 2)
+            update.assert_called_once_with([self.disk.sysfsPath,
+                                            self.other.sysfsPath])
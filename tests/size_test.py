@@ -28,6 +28,8 @@ import locale
 import os
 import unittest
 
+import mock
+
 from six.moves import cPickle # pylint: disable=import-error
 
 from decimal import Decimal
@@ -458,3 +460,65 @@ class UtilityMethodsTestCase(unittest.TestCase):
         self.assertIsInstance(2/s, Decimal)
         self.assertIsInstance(2**Size(2), Decimal)
         self.assertIsInstance(1024 % Size(127), Decimal)
+
+    def testFastPaths(self):
+        """ Verify that the fast paths give the same results as Decimal. """
+        s = Size(1025)
+        for other in (1, Size(7), -3, 2 ** 70):
+            self.assertEqual(s + other, Size(Decimal(s) + other))
+            self.assertEqual(other + s, Size(other + Decimal(s)))
+            self.assertEqual(s - other, Size(Decimal(s) - other))
+            self.assertEqual(s * other, Size(Decimal(s) * other))
+            self.assertEqual(s // other, Size(Decimal(s) // other))
+            self.assertEqual(s % other, Size(Decimal(s) % other))
+            self.assertIsInstance(s + other, Size)
+
+        self.assertEqual(Size(Size("1.5 KiB")), Size(1536))
+        self.assertEqual(Size(True), Size(1))
+        self.assertEqual(s * 0.5, Size(512))
+        self.assertEqual(sum([s, s, s]), Size(3075))
+
+    def testParseSpecCache(self):
+        """ Verify that cached size specs give the same results. """
+        size._SPEC_CACHE.clear()
+        self.assertEqual(Size("1.5 KiB"), Size(1536))
+        self.assertEqual(Size("1.5 KiB"), Size(1536))
+        self.assertEqual(len(size._SPEC_CACHE), 1)
+        self.assertEqual(size.parseSpec("1 mebibytes"), Decimal(1024 ** 2))
+        self.assertEqual(size.parseUnits("KiB", False), KiB)
+        self.assertEqual(size.parseUnits("kilobyte", False), size.KB)
+
+        # a full cache is simply dropped
+        for i in range(size._SPEC_CACHE_SIZE + 1):
+            Size("%d KiB" % i)
+        self.assertLessEqual(len(size._SPEC_CACHE), size._SPEC_CACHE_SIZE)
+
+class SizeFastPathTestCase(unittest.TestCase):
+    """ Verify that the common Size operations take their fast paths.
+
+        The timing of these operations is covered by tests/benchmark.py.
+    """
+
+    def testConstantSpecs(self):
+        """ Verify that constant specs are only parsed once. """
+        size._SPEC_CACHE.clear()
+        with mock.patch.object(size, "_SPEC_RE", mock.Mock(wraps=size._SPEC_RE)) as regex:
+            for _i in range(3):
+                self.assertEqual(Size("1 MiB"), MiB.factor)
+            self.assertEqual(regex.match.call_count, 1)
+
+    def testArithmetic(self):
+        """ Verify that integer arithmetic skips the conversion of its result. """
+        a = Size(12345678)
+        b = Size(4096)
+        with mock.patch.object(Size, "__new__", side_effect=Size.__new__) as new:
+            self.assertEqual(a + b, Size(12349774))
+            self.assertEqual(a - b, Size(12341582))
+            self.assertEqual(a * 2, Size(24691356))
+            self.assertEqual(a // b, Size(3014))
+            # only the expected values above were converted
+            self.assertEqual(new.call_count, 4)
+
+            new.reset_mock()
+            self.assertEqual(a + 0.5, Size(12345678))
+            self.assertEqual(new.call_count, 2)
@@ -0,0 +1,55 @@
+import logging
+import unittest
+import mock
+
+from blivet import storage_log
+
+class FakeDevice(object):
+    def traced(self):
+        storage_log.log_method_call(self, "arg", key="value")
+        return storage_log.function_name_and_depth()
+
+    spanned = storage_log.log_method_span(traced)
+
+class StorageLogTestCase(unittest.TestCase):
+    def setUp(self):
+        self._level = storage_log.log.level
+        self._trace_level = storage_log.trace_log.level
+
+    def tearDown(self):
+        storage_log.log.setLevel(self._level)
+        storage_log.trace_log.setLevel(self._trace_level)
+
+    def testLogMethodCall(self):
+        """ Verify that method calls are only inspected if they get logged. """
+        device = FakeDevice()
+        storage_log.log.setLevel(logging.INFO)
+        with mock.patch.object(storage_log, "function_name_and_depth") as name_and_depth:
+            storage_log.log_method_call(device, "arg", key="value")
+            storage_log.log_method_return(device, None)
+            self.assertFalse(name_and_depth.called)
+
+        storage_log.log.setLevel(logging.DEBUG)
+        with mock.patch.object(storage_log.log, "debug") as debug:
+            (name, depth) = device.traced()
+            self.assertEqual(name, "traced")
+            debug.assert_called_once_with("%s%s.%s: %s ; %s: %s ;", depth * ' ',
+                                          "FakeDevice", "traced", "arg",
+                                          "key", "value")
+
+    def testLogMethodSpan(self):
+        """ Verify that spans are logged with their wall time. """
+        device = FakeDevice()
+        storage_log.log.setLevel(logging.INFO)
+        with mock.patch.object(storage_log.trace_log, "debug") as debug:
+            device.spanned()
+            self.assertFalse(debug.called)
+
+            storage_log.trace_log.setLevel(logging.DEBUG)
+            (_name, depth) = device.spanned()
+            self.assertEqual(debug.call_count, 1)
+            span = debug.call_args[1]["extra"]["span"]
+            self.assertEqual(span["class"], "FakeDevice")
+            self.assertEqual(span["method"], "traced")
+            self.assertEqual(span["depth"], depth - 1)
+            self.assertGreaterEqual(span["duration"], 0)
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+import blivet.tasks.availability as availability
+
+class AvailabilityCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="blivet-availability-")
+        self._cache_file = availability.CACHE_FILE
+        self._cache_availability = availability.CACHE_AVAILABILITY
+        availability.CACHE_FILE = os.path.join(self.tmpdir, "cache", "availability.json")
+        availability.CACHE_AVAILABILITY = True
+
+    def tearDown(self):
+        availability.CACHE_FILE = self._cache_file
+        availability.CACHE_AVAILABILITY = self._cache_availability
+        availability._cache = None
+        shutil.rmtree(self.tmpdir)
+
+    def testPersistentCache(self):
+        """ Verify that availability is stored across processes. """
+        with mock.patch("blivet.tasks.availability.util.find_program_in_path",
+                        return_value=None) as find_program:
+            app = availability.application("no-such-app")
+            self.assertFalse(app.available)
+            self.assertEqual(find_program.call_count, 1)
+
+            # the information is written in one go, not on every change
+            self.assertFalse(os.path.exists(availability.CACHE_FILE))
+            availability._flush_cache()
+            self.assertTrue(os.path.exists(availability.CACHE_FILE))
+
+            # a new process uses the information stored by the first one
+            availability._cache = None
+            app = availability.application("no-such-app")
+            self.assertFalse(app.available)
+            self.assertEqual(find_program.call_count, 1)
+
+            # a change of $PATH makes the stored information outdated
+            availability._cache = None
+            with mock.patch.dict(os.environ, {"PATH": self.tmpdir}):
+                app = availability.application("no-such-app")
+                self.assertFalse(app.available)
+                self.assertEqual(find_program.call_count, 2)
+
+    def testDefaultCacheFile(self):
+        """ Verify that nothing is stored in a file unless asked to. """
+        self.assertIsNone(self._cache_file)
+        availability.CACHE_FILE = None
+        self.assertIsNone(availability._persistent_cache())
+
+    def testRpmdbChange(self):
+        """ Verify that a change of the rpm database outdates the information. """
+        rpmdb = os.path.join(self.tmpdir, "rpmdb.sqlite")
+        with open(rpmdb, "w") as f:
+            f.write("1")
+
+        with mock.patch.object(availability, "RPMDB_FILES", [rpmdb]), \
+             mock.patch("blivet.tasks.availability.util.find_program_in_path",
+                        return_value=None) as find_program:
+            self.assertFalse(availability.application("no-such-app").available)
+            availability._flush_cache()
+
+            availability._cache = None
+            self.assertFalse(availability.application("no-such-app").available)
+            self.assertEqual(find_program.call_count, 1)
+
+            # same modification time, but a different size
+            stat = os.stat(rpmdb)
+            with open(rpmdb, "w") as f:
+                f.write("12")
+            os.utime(rpmdb, (stat.st_atime, stat.st_mtime))
+
+            availability._cache = None
+            self.assertFalse(availability.application("no-such-app").available)
+            self.assertEqual(find_program.call_count, 2)
+
+    def testInvalidateCache(self):
+        """ Verify that invalidating the cache drops all information. """
+        with mock.patch("blivet.tasks.availability.util.find_program_in_path",
+                        return_value=None) as find_program:
+            app = availability.application("no-such-app")
+            self.assertFalse(app.available)
+
+            find_program.return_value = "/usr/bin/no-such-app"
+            self.assertFalse(app.available)
+
+            availability.invalidate_cache()
+            self.assertFalse(os.path.exists(availability.CACHE_FILE))
+            self.assertTrue(app.available)
+            self.assertEqual(find_program.call_count, 2)
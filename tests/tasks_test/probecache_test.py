@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from blivet.errors import FSError
+from blivet.size import Size
+import blivet.tasks.probecache as probecache
+
+class SizeTask(object):
+    description = "size"
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.run = mock.Mock(return_value=Size("1 GiB"))
+
+    @probecache.cached
+    def doTask(self):
+        return self.run()
+
+class ProbeCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="blivet-probecache-")
+        self._cache_file = probecache.CACHE_FILE
+        self._cache_probes = probecache.CACHE_PROBES
+        probecache.CACHE_FILE = None
+        probecache.CACHE_PROBES = True
+        probecache._cache = None
+
+        patcher = mock.patch.object(probecache.superblock, "fingerprint")
+        self.fingerprint = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fingerprint.return_value = ("ext", "uuid", 1, 1000, 1000)
+
+        self.fs = mock.Mock(exists=True, device="/dev/sda1", type="ext4",
+                            status=False, _probeFingerprint=None)
+
+    def tearDown(self):
+        probecache.CACHE_FILE = self._cache_file
+        probecache.CACHE_PROBES = self._cache_probes
+        probecache._cache = None
+        shutil.rmtree(self.tmpdir)
+
+    def testCached(self):
+        task = SizeTask(self.fs)
+        self.assertEqual(task.doTask(), Size("1 GiB"))
+        self.assertEqual(task.doTask(), Size("1 GiB"))
+        self.assertEqual(task.run.call_count, 1)
+
+        # a write to the filesystem changes its fingerprint
+        self.fingerprint.return_value = ("ext", "uuid", 1, 1000, 1001)
+        self.assertEqual(task.doTask(), Size("1 GiB"))
+        self.assertEqual(task.run.call_count, 2)
+
+        # failures are not cached
+        task = SizeTask(mock.Mock(exists=True, device="/dev/sdb1", type="ext4",
+                                  status=False, _probeFingerprint=None))
+        task.run.side_effect = FSError("failed")
+        self.assertRaises(FSError, task.doTask)
+        self.assertRaises(FSError, task.doTask)
+        self.assertEqual(task.run.call_count, 2)
+
+        # neither are results for mounted filesystems
+        task = SizeTask(self.fs)
+        self.fs.status = True
+        task.doTask()
+        task.doTask()
+        self.assertEqual(task.run.call_count, 2)
+        self.fs.status = False
+
+        # nor results for filesystems without a fingerprint
+        self.fingerprint.return_value = None
+        task = SizeTask(self.fs)
+        task.doTask()
+        task.doTask()
+        self.assertEqual(task.run.call_count, 2)
+
+    def testProbing(self):
+        task = SizeTask(self.fs)
+        task.doTask()
+        self.fingerprint.reset_mock()
+
+        # an unchanged filesystem costs a single superblock read
+        with probecache.probing(self.fs):
+            self.assertEqual(task.doTask(), Size("1 GiB"))
+            self.assertEqual(task.doTask(), Size("1 GiB"))
+        self.assertEqual(self.fingerprint.call_count, 1)
+        self.assertEqual(task.run.call_count, 1)
+        self.assertIsNone(self.fs._probeFingerprint)
+
+    def testPersistentCache(self):
+        probecache.CACHE_FILE = os.path.join(self.tmpdir, "cache", "probes.json")
+        task = SizeTask(self.fs)
+        task.doTask()
+        self.assertTrue(os.path.exists(probecache.CACHE_FILE))
+
+        # a new process uses the results stored by the first one
+        probecache._cache = None
+        task = SizeTask(self.fs)
+        self.assertEqual(task.doTask(), Size("1 GiB"))
+        self.assertFalse(task.run.called)
+
+        probecache.invalidate_cache()
+        self.assertFalse(os.path.exists(probecache.CACHE_FILE))
+        task.doTask()
+        self.assertEqual(task.run.call_count, 1)
@@ -1,4 +1,5 @@
 
+import random
 import unittest
 import blivet.tsort
 
@@ -49,3 +50,62 @@ class TopologicalSortTestCase(unittest.TestCase):
         # verify that all ordering constraints are satisfied
         self.assertTrue(check_order(order, graph),
                         "ordering constraints not satisfied")
+
+def _reference_tsort(items, edges):
+    """ The original quadratic implementation, used as a reference. """
+    incoming = dict((item, 0) for item in items)
+    for (_parent, child) in edges:
+        incoming[child] += 1
+
+    edges = list(edges)
+    order = []
+    roots = [n for n in items if incoming[n] == 0]
+    while roots:
+        root = roots.pop()
+        order.append(root)
+        for (parent, child) in [e for e in edges if e[0] == root]:
+            incoming[child] -= 1
+            edges.remove((parent, child))
+            if incoming[child] == 0:
+                roots.append(child)
+
+    return order
+
+class RankedTopologicalSortTestCase(unittest.TestCase):
+    def testRanks(self):
+        items = [1, 2, 3, 4, 5]
+        ranks = {1: 10, 2: 100, 4: 100, 5: 50}
+        graph = blivet.tsort.create_graph(items, [(1, 3)], ranks=ranks)
+        order = blivet.tsort.tsort(graph)
+        self.assertEqual(order, [4, 2, 5, 1, 3])
+
+        # an explicit edge against the ranks is a cycle
+        graph = blivet.tsort.create_graph(items, [(1, 2)], ranks=ranks)
+        with self.assertRaises(blivet.tsort.CyclicGraphError):
+            blivet.tsort.tsort(graph)
+
+    def testReferenceOrder(self):
+        """ Verify that the order matches that of the original algorithm. """
+        rand = random.Random(42)
+        for _i in range(200):
+            n = rand.randint(1, 30)
+            items = list(range(n))
+            ranks = dict((i, rand.choice((10, 50, 100, 500, 1000)))
+                         for i in items if rand.random() < 0.7)
+
+            # explicit edges go from lower to higher index to avoid cycles
+            explicit = set((p, c) for p in items for c in items
+                           if p < c and rand.random() < 0.05)
+            implied = set((p, c) for p in ranks for c in ranks
+                          if ranks[p] > ranks[c])
+            # edges in the order ActionList.sort creates them
+            edges = sorted(explicit | implied)
+
+            graph = blivet.tsort.create_graph(items, sorted(explicit),
+                                              ranks=ranks)
+            reference = _reference_tsort(items, edges)
+            if len(reference) != len(items):
+                with self.assertRaises(blivet.tsort.CyclicGraphError):
+                    blivet.tsort.tsort(graph)
+            else:
+                self.assertEqual(blivet.tsort.tsort(graph), reference)
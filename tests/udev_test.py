@@ -34,3 +34,89 @@ class UdevTest(unittest.TestCase):
         import blivet.udev
         blivet.udev.trigger()
         self.assertTrue(blivet.udev.util.run_program.called)
+
+class FakeUdevDevice(dict):
+    def __init__(self, sys_name, **kwargs):
+        dict.__init__(self, **kwargs)
+        self.sys_name = sys_name
+
+class DeviceSnapshotTest(unittest.TestCase):
+
+    def test_resolve(self):
+        import blivet.udev
+        devices = [FakeUdevDevice("sda"),
+                   FakeUdevDevice("sda1", ID_FS_UUID="1234", ID_FS_LABEL="root",
+                                  DEVLINKS="/dev/disk/by-uuid/1234 /dev/disk/by-label/root"),
+                   FakeUdevDevice("dm-0", DM_NAME="vg-lv", ID_FS_LABEL="root",
+                                  DEVLINKS="/dev/mapper/vg-lv /dev/vg/lv"),
+                   FakeUdevDevice("sdb", DEVLINKS="/dev/dm-0")]
+
+        with mock.patch("blivet.udev.get_devices", return_value=devices) as get_devices:
+            snapshot = blivet.udev.DeviceSnapshot()
+            self.assertEqual(snapshot.resolve_devspec("sda1"), "sda1")
+            self.assertEqual(snapshot.resolve_devspec("/dev/sda1"), "sda1")
+            self.assertEqual(snapshot.resolve_devspec("UUID=1234"), "sda1")
+            self.assertEqual(snapshot.resolve_devspec("LABEL=root"), "sda1")
+            self.assertEqual(snapshot.resolve_devspec("/dev/mapper/vg-lv"), "vg-lv")
+            self.assertEqual(snapshot.resolve_devspec("/dev/vg/lv"), "vg-lv")
+            self.assertEqual(snapshot.resolve_devspec("/dev/vg/lv", sysname=True), "dm-0")
+            # the first matching device wins, whatever it matched on
+            self.assertEqual(snapshot.resolve_devspec("dm-0"), "vg-lv")
+            self.assertEqual(snapshot.resolve_devspec("UUID=5678"), None)
+            self.assertEqual(snapshot.resolve_devspec(""), None)
+            self.assertEqual(snapshot.resolve_glob("sd*"), ["sda", "sda1", "sdb"])
+            self.assertEqual(snapshot.resolve_glob("/dev/vg/*"), ["vg-lv"])
+            self.assertEqual(get_devices.call_count, 1)
+
+            snapshot.invalidate()
+            self.assertEqual(snapshot.resolve_devspec("sdb"), "sdb")
+            self.assertEqual(get_devices.call_count, 2)
+
+            self.assertEqual(blivet.udev.resolve_devspec("LABEL=root"), "sda1")
+            self.assertEqual(get_devices.call_count, 3)
+
+class SettleManagerTest(unittest.TestCase):
+
+    @mock.patch("blivet.udev.util.run_program", return_value=0)
+    def test_settle(self, run_program):
+        import blivet.udev
+        manager = blivet.udev.SettleManager()
+        seqnum = ["1"]
+        with mock.patch.object(manager, "_getSeqnum", side_effect=lambda: seqnum[0]):
+            manager.settle()
+            self.assertEqual(run_program.call_count, 1)
+
+            # no new uevents, nothing to wait for
+            manager.settle()
+            manager.settle()
+            self.assertEqual(run_program.call_count, 1)
+            self.assertEqual((manager.runs, manager.elided), (1, 2))
+
+            seqnum[0] = "2"
+            manager.settle()
+            self.assertEqual(run_program.call_count, 2)
+
+            # settles within a deferred scope are coalesced
+            seqnum[0] = "3"
+            with manager.deferred():
+                manager.settle()
+                with manager.deferred():
+                    manager.settle()
+                self.assertEqual(run_program.call_count, 2)
+                manager.settle()
+
+            self.assertEqual(run_program.call_count, 3)
+            self.assertEqual((manager.runs, manager.elided), (3, 4))
+
+            # a deferred settle is run before the udev database is queried
+            seqnum[0] = "4"
+            with manager.deferred():
+                manager.settle()
+                manager.flush()
+                self.assertEqual(run_program.call_count, 4)
+
+            self.assertEqual(run_program.call_count, 4)
+
+            manager.invalidate()
+            manager.settle()
+            self.assertEqual(run_program.call_count, 5)